@@ -0,0 +1,305 @@
+# benchmarks/fake_bluez.py
+
+"""
+A stand-in BlueZ on a private dbus-daemon, for exercising the monitor
+without Bluetooth hardware.
+
+FakeBlueZ exports org.bluez.Adapter1, org.bluez.Device1 and
+org.bluez.Battery1 objects under /org/bluez and owns the org.bluez name.
+GetManagedObjects, InterfacesAdded and InterfacesRemoved come from
+dbus_next's built-in ObjectManager support, so adding or removing a device
+emits the same signals BlueZ does.
+
+    async with PrivateBus() as address:
+        bluez = FakeBlueZ(address)
+        await bluez.start()
+        bluez.add_device("AA:BB:CC:DD:EE:FF", connected=True, battery=80)
+        bluez.set_connected("AA:BB:CC:DD:EE:FF", False)
+"""
+
+import asyncio
+import os
+import shutil
+import signal
+import tempfile
+
+from dbus_next import DBusError
+from dbus_next.aio import MessageBus
+from dbus_next.service import ServiceInterface, PropertyAccess, dbus_property, method
+
+BLUEZ_SERVICE_NAME = "org.bluez"
+
+# Exports between writer flushes when publishing many objects at once
+DRAIN_EVERY = 32
+
+
+class PrivateBus:
+    """
+    Runs a throwaway dbus-daemon and yields its address.
+
+    The daemon listens on a socket in a private directory, so restart()
+    brings it back on the same address, as if the system bus restarted.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.address = None
+        self._tempdir = None
+
+    async def __aenter__(self) -> str:
+        if shutil.which("dbus-daemon") is None:
+            raise RuntimeError("dbus-daemon is required to run a private bus")
+        self._tempdir = tempfile.TemporaryDirectory(prefix="bluelight-bus-")
+        await self._spawn()
+        return self.address
+
+    async def __aexit__(self, *exc_info):
+        await self._terminate()
+        self._tempdir.cleanup()
+
+    async def restart(self):
+        """
+        Kills the daemon, dropping every connection, and starts a new one on
+        the same address.
+        """
+        await self._terminate()
+        await self._spawn()
+
+    async def _spawn(self):
+        socket_path = os.path.join(self._tempdir.name, "bus")
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.process = await asyncio.create_subprocess_exec(
+            "dbus-daemon", "--session", "--nofork", "--nopidfile", "--print-address=1",
+            f"--address=unix:path={socket_path}",
+            stdout=asyncio.subprocess.PIPE,
+            # Unprivileged daemons warn that they cannot raise the fd limit
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self.address = (await self.process.stdout.readline()).decode().strip()
+
+    async def _terminate(self):
+        if self.process.returncode is None:
+            self.process.send_signal(signal.SIGTERM)
+            await self.process.wait()
+
+
+class FakeAdapter(ServiceInterface):
+    def __init__(self, bluez, name: str, address: str):
+        super().__init__("org.bluez.Adapter1")
+        self._bluez = bluez
+        self.adapter_name = name
+        self._address = address
+        self._powered = True
+        self._discovering = False
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Address(self) -> "s":
+        return self._address
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Powered(self) -> "b":
+        return self._powered
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Discovering(self) -> "b":
+        return self._discovering
+
+    @method()
+    def RemoveDevice(self, path: "o"):
+        device = self._bluez.devices.get(path)
+        if device is None:
+            raise DBusError("org.bluez.Error.DoesNotExist", "Does Not Exist")
+        self._bluez.remove_device(device._address, self.adapter_name)
+
+    def set_powered(self, powered: bool):
+        """
+        Powers the adapter on or off. Like BlueZ, powering off disconnects
+        every device on it first.
+        """
+        if not powered:
+            for device in self._bluez.devices.values():
+                if device._adapter == f"/org/bluez/{self.adapter_name}" and device._connected:
+                    self._bluez.set_connected(device._address, False, self.adapter_name)
+        self._powered = powered
+        self.emit_properties_changed({"Powered": powered})
+
+    def set_discovering(self, discovering: bool):
+        self._discovering = discovering
+        self.emit_properties_changed({"Discovering": discovering})
+
+
+class FakeDevice(ServiceInterface):
+    def __init__(self, path: str, adapter_path: str, address: str, name: str, connected: bool):
+        super().__init__("org.bluez.Device1")
+        self.path = path
+        self._adapter = adapter_path
+        self._address = address
+        self._name = name
+        self._connected = connected
+        self._trusted = False
+        self._rssi = -60
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Address(self) -> "s":
+        return self._address
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Name(self) -> "s":
+        return self._name
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Adapter(self) -> "o":
+        return self._adapter
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Connected(self) -> "b":
+        return self._connected
+
+    @dbus_property(access=PropertyAccess.READ)
+    def RSSI(self) -> "n":
+        return self._rssi
+
+    @dbus_property()
+    def Trusted(self) -> "b":
+        return self._trusted
+
+    @Trusted.setter
+    def Trusted(self, trusted: "b"):
+        self._trusted = trusted
+
+
+class FakeBattery(ServiceInterface):
+    def __init__(self, percentage: int):
+        super().__init__("org.bluez.Battery1")
+        self._percentage = percentage
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Percentage(self) -> "y":
+        return self._percentage
+
+
+class FakeBlueZ:
+    """
+    Scriptable BlueZ stand-in. Every setter emits PropertiesChanged exactly
+    like bluetoothd would.
+
+    Devices are keyed by object path, since the same address can be known to
+    several adapters; setters take the address and the adapter name.
+    """
+
+    def __init__(self, bus_address: str):
+        self.bus_address = bus_address
+        self.bus = None
+        self.adapters = {}
+        self.devices = {}
+        self.batteries = {}
+
+    async def start(self, adapters=("hci0",)):
+        """
+        Connects, exports the adapters and takes the org.bluez name.
+        """
+        for idx, name in enumerate(adapters):
+            if name not in self.adapters:
+                self.add_adapter(name, f"00:00:00:00:00:{idx:02X}")
+        self.bus = await MessageBus(bus_address=self.bus_address).connect()
+        for name, adapter in self.adapters.items():
+            self.bus.export(f"/org/bluez/{name}", adapter)
+        for idx, (path, device) in enumerate(self.devices.items()):
+            self.bus.export(path, device)
+            if path in self.batteries:
+                self.bus.export(path, self.batteries[path])
+            if idx % DRAIN_EVERY == 0:
+                await self.drain()
+        await self.bus.request_name(BLUEZ_SERVICE_NAME)
+
+    async def drain(self, limit: int = 0):
+        """
+        Waits until at most ``limit`` outgoing messages are queued.
+
+        dbus_next's writer treats a full socket buffer as a fatal error, so
+        callers emitting large bursts must give it a chance to flush.
+        """
+        writer = self.bus._writer
+        while writer.messages.qsize() > limit or writer.buf is not None:
+            await asyncio.sleep(0)
+
+    async def stop(self):
+        """
+        Drops the connection, as if bluetoothd had exited. Devices are kept
+        so start() can bring the same objects back.
+        """
+        bus, self.bus = self.bus, None
+        if bus.connected:
+            bus.disconnect()
+        try:
+            await bus.wait_for_disconnect()
+        except Exception:
+            # The bus itself went away first
+            pass
+
+    def add_adapter(self, name: str, address: str) -> FakeAdapter:
+        adapter = FakeAdapter(self, name, address)
+        self.adapters[name] = adapter
+        if self.bus is not None:
+            self.bus.export(f"/org/bluez/{name}", adapter)
+        return adapter
+
+    def add_device(self, address: str, connected: bool = False, battery: int = None,
+                   adapter: str = "hci0", name: str = "Fake Controller") -> str:
+        """
+        Adds a device, emitting InterfacesAdded if the service is running.
+        Returns its object path.
+        """
+        path = device_path(address, adapter)
+        device = FakeDevice(path, f"/org/bluez/{adapter}", address, name, connected)
+        self.devices[path] = device
+        if battery is not None:
+            self.batteries[path] = FakeBattery(battery)
+        if self.bus is not None:
+            self.bus.export(path, device)
+            if battery is not None:
+                self.bus.export(path, self.batteries[path])
+        return path
+
+    def device(self, address: str, adapter: str = "hci0") -> FakeDevice:
+        return self.devices[device_path(address, adapter)]
+
+    def remove_device(self, address: str, adapter: str = "hci0"):
+        path = device_path(address, adapter)
+        del self.devices[path]
+        self.batteries.pop(path, None)
+        if self.bus is not None:
+            self.bus.unexport(path)
+
+    def set_connected(self, address: str, connected: bool, adapter: str = "hci0"):
+        device = self.device(address, adapter)
+        device._connected = connected
+        device.emit_properties_changed({"Connected": connected})
+
+    def set_rssi(self, address: str, rssi: int, adapter: str = "hci0"):
+        device = self.device(address, adapter)
+        device._rssi = rssi
+        device.emit_properties_changed({"RSSI": rssi})
+
+    def set_battery(self, address: str, percentage: int, adapter: str = "hci0"):
+        path = device_path(address, adapter)
+        battery = self.batteries.get(path)
+        if battery is None:
+            battery = self.batteries[path] = FakeBattery(percentage)
+            if self.bus is not None:
+                self.bus.export(path, battery)
+            return
+        battery._percentage = percentage
+        battery.emit_properties_changed({"Percentage": percentage})
+
+
+def device_path(address: str, adapter: str = "hci0") -> str:
+    return f"/org/bluez/{adapter}/dev_{address.replace(':', '_')}"
+
+
+def fake_address(idx: int) -> str:
+    """
+    Returns a deterministic MAC address for the idx-th fake device.
+    """
+    return ":".join(f"{byte:02X}" for byte in (0xFA, 0xCE) + tuple(idx.to_bytes(4, "big")))
@@ -0,0 +1,148 @@
+# benchmarks/memory.py
+
+"""
+Resident memory benchmark for the monitor daemon.
+
+Spawns `python -m bluelight.daemon` against a stand-in BlueZ on a private
+bus with N allowed controllers, all connected, waits for READY=1, then
+feeds every controller battery and RSSI changes for a while and reads the
+process's VmRSS. The per-device overhead is the slope of RSS over N.
+Fails if the RSS with the fewest devices or the per-device overhead goes
+over budget, or if RSS keeps growing between rounds of the same load.
+
+With --compare it also measures `bluelight run`, which loads the CLI.
+
+    python benchmarks/memory.py [--devices 0 50 200] [--rounds 20]
+                                [--rss-budget-mb 32] [--per-device-budget-kb 48] [--compare]
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_bluez import FakeBlueZ, PrivateBus, fake_address
+from readiness import Notifications, monitor_env
+
+ENTRY_POINTS = {
+    "daemon": ["-m", "bluelight.daemon"],
+    "run": ["-m", "bluelight.main", "run"],
+}
+
+# Signals queued on the fake's connection before letting it flush
+SIGNAL_BATCH = 32
+
+# Allowed growth between the last two rounds of the same load, in KiB
+STEADY_STATE_SLACK_KB = 256
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    raise RuntimeError(f"no VmRSS for pid {pid}")
+
+
+async def measure(entry: str, devices: int, rounds: int) -> tuple:
+    """
+    Returns the RSS in KiB after the first and after the last half of the
+    load rounds.
+    """
+    with tempfile.TemporaryDirectory(prefix="bluelight-memory-") as workdir:
+        workdir = Path(workdir)
+        async with PrivateBus() as address:
+            bluez = FakeBlueZ(address)
+            addresses = [fake_address(idx) for idx in range(devices)]
+            for mac_address in addresses:
+                bluez.add_device(mac_address, connected=True, battery=100)
+            await bluez.start()
+            notifications = Notifications(workdir / "notify")
+            env = monitor_env(workdir, notifications.path)
+            env.pop("WATCHDOG_USEC")
+            allowed = ", ".join(f'"{mac_address}": {{}}' for mac_address in addresses)
+            (workdir / ".bluelight_config.json").write_text(f'{{"allowed_devices": {{{allowed}}}, "timeout": 300}}')
+
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, *ENTRY_POINTS[entry], "--bus-address", address, "--no-journald",
+                env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                await notifications.wait_for("READY=1", 30)
+                samples = []
+                for n in range(rounds):
+                    for idx, mac_address in enumerate(addresses):
+                        bluez.set_rssi(mac_address, -40 - (n + idx) % 50)
+                        bluez.set_battery(mac_address, 100 - n % 100)
+                        if idx % SIGNAL_BATCH == 0:
+                            await bluez.drain(SIGNAL_BATCH)
+                    await asyncio.sleep(0.05)
+                    if n + 1 in (rounds // 2, rounds):
+                        # Let the monitor drain its queue before reading RSS
+                        await asyncio.sleep(0.5)
+                        samples.append(rss_kb(process.pid))
+            finally:
+                if process.returncode is None:
+                    process.terminate()
+                await process.wait()
+                notifications.close()
+                await bluez.stop()
+    return samples[0], samples[1]
+
+
+def slope(points) -> float:
+    """
+    Least-squares slope of (x, y) points.
+    """
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else 0.0
+
+
+async def run(options) -> dict:
+    results = {}
+    for entry in (("daemon", "run") if options.compare else ("daemon",)):
+        results[entry] = [(devices, *await measure(entry, devices, options.rounds)) for devices in options.devices]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, nargs="+", default=[0, 50, 200], help="allowed, connected controllers per run")
+    parser.add_argument("--rounds", type=int, default=20, help="rounds of battery and RSSI changes per run")
+    parser.add_argument("--rss-budget-mb", type=float, default=32, help="fail if RSS with the fewest devices exceeds this")
+    parser.add_argument("--per-device-budget-kb", type=float, default=48, help="fail if RSS per device exceeds this")
+    parser.add_argument("--compare", action="store_true", help="also measure `bluelight run`")
+    options = parser.parse_args()
+    options.devices.sort()
+
+    results = asyncio.run(run(options))
+    for entry, rows in results.items():
+        print(entry)
+        for devices, first, last in rows:
+            print(f"  {devices:5d} devices  RSS {last / 1024:7.1f} MiB  (half way {first / 1024:7.1f} MiB)")
+        if len(rows) > 1:
+            print(f"  per device  {slope([(devices, last) for devices, _, last in rows]):7.1f} KiB")
+
+    rows = results["daemon"]
+    failures = []
+    baseline = rows[0][2] / 1024
+    if baseline > options.rss_budget_mb:
+        failures.append(f"RSS with {rows[0][0]} devices is {baseline:.1f} MiB, budget {options.rss_budget_mb:g} MiB")
+    per_device = slope([(devices, last) for devices, _, last in rows]) if len(rows) > 1 else 0.0
+    if per_device > options.per_device_budget_kb:
+        failures.append(f"{per_device:.1f} KiB per device, budget {options.per_device_budget_kb:g} KiB")
+    for devices, first, last in rows:
+        if last - first > STEADY_STATE_SLACK_KB:
+            failures.append(f"RSS grew by {last - first} KiB under a steady load with {devices} devices")
+    if failures:
+        raise SystemExit("FAIL: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# benchmarks/monitor.py
+
+"""
+Monitor throughput benchmark against a stand-in BlueZ.
+
+Starts a private dbus-daemon with FakeBlueZ, points monitor_bluetooth at it
+and reports:
+
+  * startup time for N known devices (until the initial sync is done)
+  * events/sec for a burst of Connected changes
+  * per-event latency, from the fake emitting a change to the monitor
+    dispatching it, with one event in flight at a time
+  * recovery time after bluetoothd or the bus daemon restarts, while some
+    devices change state during the outage
+
+The fake and the monitor share one process and event loop, so numbers
+include the cost of emitting the signals. Requires dbus-daemon.
+
+    python benchmarks/monitor.py [--devices 10 100 1000] [--events 5000] [--restarts 10] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Keep the monitor's config, metrics and moonlight-qt away from the real ones
+# before any bluelight module reads HOME or PATH.
+_workdir = tempfile.TemporaryDirectory(prefix="bluelight-bench-")
+os.environ["HOME"] = _workdir.name
+_bindir = Path(_workdir.name) / "bin"
+_bindir.mkdir()
+(_bindir / "moonlight-qt").write_text("#!/bin/sh\nexec sleep 3600\n")
+(_bindir / "moonlight-qt").chmod(0o755)
+os.environ["PATH"] = f"{_bindir}{os.pathsep}{os.environ['PATH']}"
+# Keep the control socket away from a real running monitor
+os.environ["XDG_RUNTIME_DIR"] = _workdir.name
+
+# Run against this checkout even when bluelight is not installed
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import logging
+
+from fake_bluez import FakeBlueZ, PrivateBus, fake_address
+from bluelight import control, dbus_backend
+from bluelight.bluetooth_monitor import monitor_bluetooth
+from bluelight.config import save_config
+from bluelight.metrics import MonitorMetrics
+
+
+# Events queued on the fake's connection before letting it flush
+BURST_BATCH = 32
+
+
+class TimedMetrics(MonitorMetrics):
+    """
+    Records the time of every dispatch so the benchmark can line them up
+    with the events it emitted.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.dispatched = []
+        self.dispatch_event = asyncio.Event()
+        observe = self.signal_dispatch.observe
+
+        def timed_observe(seconds):
+            self.dispatched.append(time.perf_counter())
+            self.dispatch_event.set()
+            observe(seconds)
+
+        self.signal_dispatch.observe = timed_observe
+
+        self.recoveries = []
+        self.recovered = asyncio.Event()
+        observe_recovery = self.recovery.observe
+
+        def timed_observe_recovery(seconds):
+            self.recoveries.append(seconds)
+            self.recovered.set()
+            observe_recovery(seconds)
+
+        self.recovery.observe = timed_observe_recovery
+
+    async def wait_for(self, count: int):
+        while len(self.dispatched) < count:
+            self.dispatch_event.clear()
+            await self.dispatch_event.wait()
+
+
+async def start_monitor(bus_address: str, devices: int, metrics=None):
+    save_config({
+        "allowed_devices": {fake_address(idx): {"name": "Fake Controller", "manufacturer": "Fake", "nickname": "No nickname"}
+                            for idx in range(devices)},
+        "timeout": 300,
+    })
+    ready = asyncio.Event()
+    started = time.perf_counter()
+    task = asyncio.create_task(monitor_bluetooth(bus_address=bus_address, metrics=metrics, ready=ready))
+    await asyncio.wait_for(ready.wait(), 60)
+    return task, time.perf_counter() - started
+
+
+async def stop_monitor(task, bus_address: str):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # The monitor shares its connection through the backend; close it
+    # before the private bus goes away
+    bus = await dbus_backend.get_bus(bus_address)
+    bus.disconnect()
+    await bus.wait_for_disconnect()
+
+
+async def bench_startup(devices: int) -> float:
+    async with PrivateBus() as address:
+        bluez = FakeBlueZ(address)
+        for idx in range(devices):
+            bluez.add_device(fake_address(idx))
+        await bluez.start()
+        task, elapsed = await start_monitor(address, devices)
+        await stop_monitor(task, address)
+        await bluez.stop()
+    return elapsed
+
+
+async def bench_events(devices: int, events: int, samples: int) -> dict:
+    async with PrivateBus() as address:
+        bluez = FakeBlueZ(address)
+        for idx in range(devices):
+            bluez.add_device(fake_address(idx))
+        await bluez.start()
+        metrics = TimedMetrics()
+        task, _ = await start_monitor(address, devices, metrics)
+        state = [False] * devices
+
+        def emit(n):
+            idx = n % devices
+            state[idx] = not state[idx]
+            bluez.set_connected(fake_address(idx), state[idx])
+
+        # Burst: emit as fast as the fake's writer allows, then wait for the
+        # monitor to catch up
+        started = time.perf_counter()
+        for n in range(events):
+            emit(n)
+            if n % BURST_BATCH == 0:
+                await bluez.drain(BURST_BATCH)
+        await metrics.wait_for(events)
+        throughput = events / (time.perf_counter() - started)
+
+        # Paced: one event in flight at a time
+        latencies = []
+        for n in range(events, events + samples):
+            emitted = time.perf_counter()
+            emit(n)
+            await metrics.wait_for(n + 1)
+            latencies.append(metrics.dispatched[n] - emitted)
+
+        await stop_monitor(task, address)
+        await bluez.stop()
+
+    latencies.sort()
+    return {
+        "events_per_second": throughput,
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "latency_ms_max": latencies[-1] * 1000,
+    }
+
+
+async def bench_recovery(devices: int, restarts: int) -> dict:
+    """
+    Restarts the fake BlueZ, and then the bus daemon, flipping a quarter of
+    the devices while each is down. Reports the outage-to-resync time the
+    monitor records and the time from the service being back to the
+    monitor being in sync, and checks the resulting state.
+    """
+    private_bus = PrivateBus()
+    results = {"bluez": [], "bus": []}
+    async with private_bus as address:
+        bluez = FakeBlueZ(address)
+        for idx in range(devices):
+            bluez.add_device(fake_address(idx), connected=idx % 2 == 0)
+        await bluez.start()
+        metrics = TimedMetrics()
+        task, _ = await start_monitor(address, devices, metrics)
+
+        for kind in ("bluez", "bus"):
+            for restart in range(restarts):
+                metrics.recovered.clear()
+                if kind == "bluez":
+                    await bluez.stop()
+                else:
+                    await private_bus.restart()
+                    await bluez.stop()
+                for idx in range(restart % 4, devices, 4):
+                    address_ = fake_address(idx)
+                    bluez.set_connected(address_, not bluez.device(address_)._connected)
+                back = time.perf_counter()
+                await bluez.start()
+                await asyncio.wait_for(metrics.recovered.wait(), 60)
+                after_return = time.perf_counter() - back
+
+                expected = {device._address for device in bluez.devices.values() if device._connected}
+                live = await asyncio.to_thread(control.request, "status")
+                if set(live["connected"]) != expected:
+                    raise AssertionError(f"monitor out of sync after {kind} restart {restart}")
+                results[kind].append({"outage": metrics.recoveries[-1], "after_return": after_return})
+
+        await stop_monitor(task, address)
+        await bluez.stop()
+
+    return {
+        kind: {
+            "recovery_ms_max": max(sample["outage"] for sample in samples) * 1000,
+            "after_return_ms_p50": statistics.median(sample["after_return"] for sample in samples) * 1000,
+            "after_return_ms_max": max(sample["after_return"] for sample in samples) * 1000,
+        }
+        for kind, samples in results.items()
+    }
+
+
+async def run(options) -> dict:
+    results = {"startup_seconds": {}, "events": {}}
+    for devices in options.devices:
+        results["startup_seconds"][devices] = await bench_startup(devices)
+    results["events"] = await bench_events(options.event_devices, options.events, options.samples)
+    results["recovery"] = await bench_recovery(options.recovery_devices, options.restarts)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100, 1000], help="device counts for the startup benchmark")
+    parser.add_argument("--event-devices", type=int, default=50, help="devices to spread the event benchmark over")
+    parser.add_argument("--events", type=int, default=5000, help="events in the burst")
+    parser.add_argument("--samples", type=int, default=500, help="paced events for the latency measurement")
+    parser.add_argument("--recovery-devices", type=int, default=100, help="devices known to BlueZ in the recovery benchmark")
+    parser.add_argument("--restarts", type=int, default=10, help="restarts of BlueZ, then of the bus, to time")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    options = parser.parse_args()
+
+    # The monitor logs every connect and disconnect; keep the report readable
+    logging.disable(logging.INFO)
+    results = asyncio.run(run(options))
+
+    if options.json:
+        print(json.dumps(results, indent=4))
+        return
+    print("startup")
+    for devices, seconds in results["startup_seconds"].items():
+        print(f"  {devices:>6} devices  {seconds * 1000:9.1f} ms")
+    events = results["events"]
+    print(f"events ({options.event_devices} devices)")
+    print(f"  burst of {options.events}  {events['events_per_second']:9.0f} events/s")
+    print(f"  latency p50  {events['latency_ms_p50']:9.3f} ms")
+    print(f"  latency p99  {events['latency_ms_p99']:9.3f} ms")
+    print(f"  latency max  {events['latency_ms_max']:9.3f} ms")
+    print(f"recovery ({options.recovery_devices} devices, {options.restarts} restarts each)")
+    for kind, label in (("bluez", "bluetoothd"), ("bus", "bus daemon")):
+        recovery = results["recovery"][kind]
+        print(f"  {label:<11} resync after return p50 {recovery['after_return_ms_p50']:7.1f} ms  "
+              f"max {recovery['after_return_ms_max']:7.1f} ms  outage max {recovery['recovery_ms_max']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/readiness.py
+
+"""
+Unit start to READY=1 benchmark.
+
+Plays the part of systemd for a `Type=notify` unit: binds a notification
+socket, spawns `python -m bluelight.daemon` as the unit does, against a
+stand-in BlueZ on a private bus with NOTIFY_SOCKET and WATCHDOG_USEC set,
+and times the spawn to READY=1.
+It also checks that the watchdog is pinged and that STOPPING=1 is sent
+on SIGTERM. A second scenario starts BlueZ only after the monitor, as
+can happen at boot, and times BlueZ appearing to READY=1.
+
+    python benchmarks/readiness.py [--runs 5] [--devices 20] [--budget-ms 1500]
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_bluez import FakeBlueZ, PrivateBus, fake_address
+
+# WatchdogSec for the spawned monitor; it should ping every half of this
+WATCHDOG_SECONDS = 1.0
+
+
+class Notifications:
+    """
+    A notification socket collecting sd_notify messages with their arrival time.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(str(path))
+        self.sock.setblocking(False)
+        self.messages = []
+        self.received = asyncio.Event()
+        asyncio.get_running_loop().add_reader(self.sock.fileno(), self._read)
+
+    def _read(self):
+        try:
+            data = self.sock.recv(4096)
+        except BlockingIOError:
+            return
+        now = time.perf_counter()
+        for assignment in data.decode().split("\n"):
+            self.messages.append((now, assignment))
+        self.received.set()
+
+    async def wait_for(self, assignment: str, timeout: float) -> float:
+        """
+        Returns when ``assignment`` first arrived, waiting for it if needed.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            for when, message in self.messages:
+                if message == assignment:
+                    return when
+            self.received.clear()
+            await asyncio.wait_for(self.received.wait(), max(0.0, deadline - time.perf_counter()))
+
+    def count(self, assignment: str) -> int:
+        return sum(1 for _, message in self.messages if message == assignment)
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+def monitor_env(workdir: Path, notify_socket: Path) -> dict:
+    bindir = workdir / "bin"
+    bindir.mkdir(exist_ok=True)
+    (bindir / "moonlight-qt").write_text("#!/bin/sh\nexec sleep 3600\n")
+    (bindir / "moonlight-qt").chmod(0o755)
+    (workdir / ".bluelight_config.json").write_text(
+        '{"allowed_devices": {"' + fake_address(0) + '": {}}, "timeout": 300}')
+    env = dict(os.environ)
+    env.update({
+        "HOME": str(workdir),
+        "XDG_RUNTIME_DIR": str(workdir),
+        "PATH": f"{bindir}{os.pathsep}{env['PATH']}",
+        "PYTHONPATH": f"{REPO}{os.pathsep}{env.get('PYTHONPATH', '')}",
+        "NOTIFY_SOCKET": str(notify_socket),
+        "WATCHDOG_USEC": str(int(WATCHDOG_SECONDS * 1e6)),
+    })
+    return env
+
+
+async def run_once(devices: int, late_bluez: bool) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bluelight-ready-") as workdir:
+        workdir = Path(workdir)
+        async with PrivateBus() as address:
+            bluez = FakeBlueZ(address)
+            for idx in range(devices):
+                bluez.add_device(fake_address(idx), connected=idx == 0)
+            if not late_bluez:
+                await bluez.start()
+            notifications = Notifications(workdir / "notify")
+
+            spawned = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "bluelight.daemon", "--bus-address", address, "--no-journald",
+                env=monitor_env(workdir, notifications.path),
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                if late_bluez:
+                    await asyncio.sleep(0.5)
+                    if notifications.count("READY=1"):
+                        raise AssertionError("READY=1 sent before BlueZ was running")
+                    bluez_started = time.perf_counter()
+                    await bluez.start()
+                ready = await notifications.wait_for("READY=1", 30)
+                # Two pings within a watchdog period, counting the one sent at startup
+                await asyncio.sleep(WATCHDOG_SECONDS)
+                pings = notifications.count("WATCHDOG=1")
+                process.send_signal(signal.SIGTERM)
+                await notifications.wait_for("STOPPING=1", 10)
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+                notifications.close()
+                await bluez.stop()
+
+    if pings < 2:
+        raise AssertionError(f"only {pings} watchdog ping(s) in {WATCHDOG_SECONDS}s")
+    result = {"spawn_to_ready": ready - spawned}
+    if late_bluez:
+        result["bluez_to_ready"] = ready - bluez_started
+    return result
+
+
+async def run(options) -> dict:
+    normal = [await run_once(options.devices, False) for _ in range(options.runs)]
+    late = [await run_once(options.devices, True) for _ in range(options.runs)]
+    return {
+        "spawn_to_ready": [sample["spawn_to_ready"] for sample in normal],
+        "bluez_to_ready": [sample["bluez_to_ready"] for sample in late],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="monitor starts per scenario")
+    parser.add_argument("--devices", type=int, default=20, help="devices known to the stand-in BlueZ")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="fail if the median spawn to READY=1 exceeds this")
+    options = parser.parse_args()
+
+    results = asyncio.run(run(options))
+    for name, label in (("spawn_to_ready", "spawn to READY=1"), ("bluez_to_ready", "late BlueZ to READY=1")):
+        samples = results[name]
+        print(f"{label:<24} median {statistics.median(samples) * 1000:8.1f} ms  "
+              f"min {min(samples) * 1000:8.1f} ms  max {max(samples) * 1000:8.1f} ms")
+    median_ms = statistics.median(results["spawn_to_ready"]) * 1000
+    if median_ms > options.budget_ms:
+        raise SystemExit(f"FAIL: spawn to READY=1 took {median_ms:.0f} ms, budget {options.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
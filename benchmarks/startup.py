@@ -0,0 +1,85 @@
+# benchmarks/startup.py
+
+"""
+CLI startup benchmark.
+
+Runs each short bluelight command in a fresh interpreter and reports its
+wall time and the number of modules it imported, failing if either is over
+budget or if the command loaded the Bluetooth stack.
+
+    python benchmarks/startup.py [--runs N] [--wall-budget MS] [--import-budget N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Commands that must start without the Bluetooth stack
+COMMANDS = {
+    "list": ["list"],
+    "timeout": ["timeout", "300"],
+}
+
+# Modules only the pairing and monitor commands should load
+HEAVY_MODULES = ["bleak", "dbus_next", "bluelight.bluetooth_monitor", "bluelight.pairing"]
+
+# Runs the CLI in-process and reports what it imported on the last line
+RUNNER = """
+import json, sys
+from bluelight.main import app
+try:
+    app(sys.argv[1:], standalone_mode=False)
+finally:
+    sys.stdout.flush()
+    print("\\n" + json.dumps({"modules": len(sys.modules), "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def run_command(args, env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", RUNNER, *args], capture_output=True, text=True, env=env)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"bluelight {' '.join(args)} failed:\n{result.stderr}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--wall-budget", type=float, default=300.0, help="median wall time budget per command in ms")
+    parser.add_argument("--import-budget", type=int, default=200, help="module count budget per command")
+    options = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as home:
+        # Keep the benchmark away from the real config file
+        env = dict(os.environ, HOME=home)
+        print(f"{'command':<10} {'median ms':>10} {'min ms':>8} {'modules':>8}")
+        for name, args in COMMANDS.items():
+            timings = []
+            for _ in range(options.runs):
+                elapsed, report = run_command(args, env)
+                timings.append(elapsed)
+            median = statistics.median(timings)
+            print(f"{name:<10} {median:>10.1f} {min(timings):>8.1f} {report['modules']:>8}")
+            if median > options.wall_budget:
+                failures.append(f"{name}: {median:.1f} ms over the {options.wall_budget:.0f} ms budget")
+            if report["modules"] > options.import_budget:
+                failures.append(f"{name}: {report['modules']} modules over the {options.import_budget} module budget")
+            if report["heavy"]:
+                failures.append(f"{name}: imported {', '.join(report['heavy'])}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/telemetry.py
+
+"""
+Controller history benchmark.
+
+Feeds simulated battery and RSSI samples into bluelight.telemetry and
+reports the cost per sample, the size of the saved file and the time to
+save and load it. Fails if memory grows once every ring has filled, since
+the history must stay the same size however long the monitor runs.
+
+    python benchmarks/telemetry.py [--devices 4] [--samples 200000]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Run against this checkout even when bluelight is not installed
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bluelight.telemetry import Telemetry
+
+# Allowed growth once the rings are full, in bytes
+GROWTH_BUDGET = 4096
+
+
+def feed(telemetry: Telemetry, devices: int, samples: int, start: int) -> int:
+    """
+    Records ``samples`` battery and RSSI readings per device, one every 10
+    simulated seconds, and returns the simulated time reached.
+    """
+    timestamp = start
+    for n in range(samples):
+        timestamp += 10
+        for idx in range(devices):
+            mac_address = f"FA:CE:00:00:00:{idx:02X}"
+            telemetry.record_battery(mac_address, 100 - (n // 50) % 100, timestamp)
+            telemetry.record_rssi(mac_address, -40 - n % 50, timestamp)
+            if n % 500 == 0:
+                telemetry.record_event(mac_address, n % 1000 == 0, timestamp)
+    return timestamp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=4, help="controllers to record")
+    parser.add_argument("--samples", type=int, default=200000, help="samples per device and series")
+    options = parser.parse_args()
+
+    telemetry = Telemetry()
+    # More than enough simulated time to fill even the hourly rings
+    timestamp = feed(telemetry, options.devices, 300000, 1_700_000_000)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    feed(telemetry, options.devices, options.samples, timestamp)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    growth = current - baseline
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = Path(workdir) / "telemetry.bin"
+        telemetry.dirty = True
+        started = time.perf_counter()
+        telemetry.save(path)
+        save_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        loaded = Telemetry.load(path)
+        load_ms = (time.perf_counter() - started) * 1000
+        size = path.stat().st_size
+        if loaded.dump() != telemetry.dump():
+            raise SystemExit("FAIL: saved history does not load back identically")
+
+    recorded = options.devices * options.samples * 2
+    print(f"record     {elapsed / recorded * 1e6:8.2f} us/sample ({recorded} samples)")
+    print(f"growth     {growth:8d} bytes after the rings filled (budget {GROWTH_BUDGET})")
+    print(f"file       {size:8d} bytes for {options.devices} devices ({size // options.devices} per device)")
+    print(f"save       {save_ms:8.2f} ms")
+    print(f"load       {load_ms:8.2f} ms")
+    if growth > GROWTH_BUDGET:
+        raise SystemExit(f"FAIL: memory grew by {growth} bytes")
+
+
+if __name__ == "__main__":
+    main()
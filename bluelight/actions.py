@@ -0,0 +1,203 @@
+# bluelight/actions.py
+
+"""
+Per-controller actions run when a controller connects or disconnects.
+
+Actions come from the config file, globally under "actions" and per
+controller in its "allowed_devices" entry:
+
+    "actions": {"on_connect": ["cec-ctl --to 0 --image-view-on"]},
+    "allowed_devices": {
+        "AA:BB:CC:DD:EE:FF": {
+            "on_connect": [{"command": ["powerprofilesctl", "set", "performance"], "timeout": 5}],
+            "on_disconnect": [{"call": "mypackage.hooks:controller_left"}]
+        }
+    }
+
+An action is a shell command string, a dict with "command" (a string for
+the shell or a list run directly) or "call" ("module:function", a plain or
+async function taking the MAC address, the event and the device's config
+entry), and an optional "timeout" in seconds.
+
+Actions never run inside the D-Bus callback. Each controller has its own
+queue, so its actions run one at a time in the order the events happened,
+while different controllers proceed side by side, at most
+MAX_CONCURRENCY actions at once.
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import time
+from collections import deque
+
+# Longest an action may run unless it sets its own timeout, in seconds
+DEFAULT_TIMEOUT = 30.0
+
+# Actions running at once across all controllers
+MAX_CONCURRENCY = 4
+
+# Events waiting per controller; a controller flapping faster than its
+# actions finish loses its oldest waiting events
+MAX_PENDING = 16
+
+logger = logging.getLogger(__name__)
+
+
+class Action:
+    """
+    One configured action.
+
+    Raises:
+        ValueError: If the spec is not a valid action.
+    """
+
+    __slots__ = ("command", "call", "timeout", "_function")
+
+    def __init__(self, spec):
+        if isinstance(spec, str):
+            spec = {"command": spec}
+        if not isinstance(spec, dict) or ("command" in spec) == ("call" in spec):
+            raise ValueError(f"Action {spec!r} needs exactly one of 'command' or 'call'")
+        self.command = spec.get("command")
+        self.call = spec.get("call")
+        if self.command is not None and not (isinstance(self.command, str) or
+                                             (isinstance(self.command, list) and self.command and
+                                              all(isinstance(arg, str) for arg in self.command))):
+            raise ValueError(f"Action command {self.command!r} must be a string or a list of strings")
+        if self.call is not None and (not isinstance(self.call, str) or ":" not in self.call):
+            raise ValueError(f"Action call {self.call!r} must look like 'module:function'")
+        self.timeout = float(spec.get("timeout", DEFAULT_TIMEOUT))
+        self._function = None
+
+    def __str__(self):
+        if self.call is not None:
+            return self.call
+        return self.command if isinstance(self.command, str) else " ".join(self.command)
+
+    async def run(self, mac_address: str, event: str, device: dict, env: dict):
+        """
+        Runs the action to completion, killing it after its timeout.
+
+        Raises:
+            asyncio.TimeoutError: If the action ran out of time.
+            Exception: Whatever the action raised, or RuntimeError if a
+                command exited unsuccessfully.
+        """
+        if self.call is not None:
+            await self._run_call(mac_address, event, device)
+            return
+        if isinstance(self.command, str):
+            process = await asyncio.create_subprocess_shell(self.command, env=env)
+        else:
+            process = await asyncio.create_subprocess_exec(*self.command, env=env)
+        try:
+            returncode = await asyncio.wait_for(process.wait(), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            process.kill()
+            await process.wait()
+            raise
+        if returncode != 0:
+            raise RuntimeError(f"exited with code {returncode}")
+
+    async def _run_call(self, mac_address: str, event: str, device: dict):
+        if self._function is None:
+            module_name, _, function_name = self.call.partition(":")
+            self._function = getattr(importlib.import_module(module_name), function_name)
+        if asyncio.iscoroutinefunction(self._function):
+            await asyncio.wait_for(self._function(mac_address, event, device), self.timeout)
+        else:
+            # A blocking function runs on a worker thread; on timeout it is
+            # abandoned, as threads cannot be killed
+            loop = asyncio.get_running_loop()
+            await asyncio.wait_for(loop.run_in_executor(None, self._function, mac_address, event, device), self.timeout)
+
+
+def parse_actions(specs) -> list:
+    """
+    Builds Actions from a list of specs.
+
+    Raises:
+        ValueError: If any spec is invalid.
+    """
+    if isinstance(specs, (str, dict)):
+        specs = [specs]
+    return [Action(spec) for spec in specs]
+
+
+class ActionPipeline:
+    """
+    Runs actions on per-controller queues with a shared concurrency limit.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_pending: int = MAX_PENDING, metrics=None):
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # MAC address -> deque of (event, actions, device, env) not yet started
+        self._queues = {}
+        self._workers = {}
+        self._running = 0
+
+    def submit(self, mac_address: str, event: str, actions: list, device: dict = None, env: dict = None):
+        """
+        Queues a controller's actions for an event and returns immediately.
+        """
+        if not actions:
+            return
+        queue = self._queues.setdefault(mac_address, deque())
+        if len(queue) >= self.max_pending:
+            dropped_event, *_ = queue.popleft()
+            logger.warning(f"Dropping queued {dropped_event} actions for {mac_address}; its actions are falling behind",
+                           extra={"mac": mac_address, "event": "actions_dropped"})
+        run_env = dict(os.environ, BLUELIGHT_ADDRESS=mac_address, BLUELIGHT_EVENT=event, **(env or {}))
+        queue.append((event, actions, device or {}, run_env))
+        if mac_address not in self._workers:
+            self._workers[mac_address] = asyncio.create_task(self._drain(mac_address))
+
+    async def _drain(self, mac_address: str):
+        queue = self._queues[mac_address]
+        try:
+            while queue:
+                event, actions, device, env = queue.popleft()
+                for action in actions:
+                    await self._run(action, mac_address, event, device, env)
+        finally:
+            del self._workers[mac_address]
+            if not queue:
+                self._queues.pop(mac_address, None)
+
+    async def _run(self, action: Action, mac_address: str, event: str, device: dict, env: dict):
+        async with self._slots:
+            self._running += 1
+            started = time.monotonic()
+            try:
+                await action.run(mac_address, event, device, env)
+            except asyncio.TimeoutError:
+                logger.warning(f"{event} action '{action}' for {mac_address} timed out after {action.timeout:g}s",
+                               extra={"mac": mac_address, "event": "action_timeout"})
+            except Exception as e:
+                logger.warning(f"{event} action '{action}' for {mac_address} failed: {e}",
+                               extra={"mac": mac_address, "event": "action_failed"})
+            else:
+                elapsed = time.monotonic() - started
+                logger.info(f"Ran {event} action '{action}' for {mac_address}",
+                            extra={"mac": mac_address, "event": "action", "latency": elapsed})
+            finally:
+                self._running -= 1
+                if self.metrics is not None:
+                    self.metrics.action_duration.observe(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {"running": self._running, "queued": sum(len(queue) for queue in self._queues.values())}
+
+    async def close(self):
+        """
+        Cancels running actions and drops queued ones.
+        """
+        workers = list(self._workers.values())
+        self._queues.clear()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -1,235 +1,1081 @@
 # bluelight/bluetooth_monitor.py
 
 import asyncio
-import subprocess
 import logging
-from bluelight.config import load_config, update_allowed_devices
-from dbus_next.aio import MessageBus
-from dbus_next import BusType
-import typer
-from rich.prompt import Prompt
-from rich.console import Console
-from bluelight.config import load_config, update_allowed_devices
-from bleak import BleakClient, BleakScanner, BleakError
-import json
-from importlib import resources
-
-BLUEZ_SERVICE_NAME = "org.bluez"
-ADAPTER_INTERFACE = "org.bluez.Adapter1"
-DEVICE_INTERFACE = "org.bluez.Device1"
-OBJECT_MANAGER_INTERFACE = "org.freedesktop.DBus.ObjectManager"
-DBUS_PROPERTIES = "org.freedesktop.DBus.Properties"
-
-console = Console()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+import shlex
+import time
+from bluelight.config import get_store
+from dbus_next import MessageType
+from bluelight import dbus_backend
+from bluelight.dbus_backend import get_managed_objects, add_match, get_device_property, name_has_owner
+from bluelight.controllers import classify_properties
+from bluelight.metrics import MonitorMetrics, EXPORT_INTERVAL
+from bluelight.control import ControlServer
+from bluelight.telemetry import Telemetry, SAVE_INTERVAL, TIER_NAMES, save_snapshot
+from bluelight.actions import ActionPipeline, parse_actions
+from bluelight import systemd
+
+from bluelight.dbus_backend import (
+    BLUEZ_SERVICE_NAME,
+    ADAPTER_INTERFACE,
+    DEVICE_INTERFACE,
+    BATTERY_INTERFACE,
+    OBJECT_MANAGER_INTERFACE,
+    DBUS_PROPERTIES,
+    DBUS_SERVICE_NAME,
+    DBUS_INTERFACE,
+)
+BLUEZ_ROOT_PATH = "/org/bluez"
+
+# Configured by the caller; see bluelight.log.setup_logging
 logger = logging.getLogger(__name__)
 
-async def get_managed_objects(bus):
-    """Returns all managed objects."""
-    introspection = await bus.introspect('org.bluez', '/')
-    proxy = bus.get_proxy_object(BLUEZ_SERVICE_NAME, "/", introspection)
-    managed_objects = await proxy.get_interface(OBJECT_MANAGER_INTERFACE).call_get_managed_objects()
-    return managed_objects
+# One subscription for every BlueZ object instead of one proxy per device.
+# The ObjectManager signals are emitted from "/", so they are filtered by
+# the object path carried in their first argument instead.
+BLUEZ_MATCH_RULES = [
+    f"type='signal',sender='{BLUEZ_SERVICE_NAME}',interface='{DBUS_PROPERTIES}',"
+    f"member='PropertiesChanged',path_namespace='{BLUEZ_ROOT_PATH}'",
+    f"type='signal',sender='{BLUEZ_SERVICE_NAME}',interface='{OBJECT_MANAGER_INTERFACE}',"
+    f"member='InterfacesAdded',arg0path='{BLUEZ_ROOT_PATH}/'",
+    f"type='signal',sender='{BLUEZ_SERVICE_NAME}',interface='{OBJECT_MANAGER_INTERFACE}',"
+    f"member='InterfacesRemoved',arg0path='{BLUEZ_ROOT_PATH}/'",
+    # bluetoothd exiting, restarting or being replaced
+    f"type='signal',sender='{DBUS_SERVICE_NAME}',interface='{DBUS_INTERFACE}',"
+    f"member='NameOwnerChanged',arg0='{BLUEZ_SERVICE_NAME}'",
+]
+
+# A controller must charge this many points above the low-battery threshold
+# before dropping below it warns again
+LOW_BATTERY_HYSTERESIS = 5
+
+# Backoff between attempts to reach the bus and BlueZ again, in seconds.
+# The cap bounds how long recovery takes once both are back.
+RECONNECT_INITIAL_DELAY = 0.1
+RECONNECT_MAX_DELAY = 5.0
+
+# How long a prewarmed moonlight-qt waits for its controller to connect
+# before it is stopped again, in seconds
+PREWARM_WINDOW = 20.0
+
+# After a prewarm goes unused, the same controller cannot trigger another
+# for this long, so an idle controller that keeps advertising does not
+# start and stop the client over and over. The wait doubles with each
+# unused prewarm in a row, up to PREWARM_MAX_COOLDOWN, and starts over
+# once the controller connects.
+PREWARM_COOLDOWN = 120.0
+PREWARM_MAX_COOLDOWN = 3600.0
 
 
-async def monitor_bluetooth():
+def prewarm_cooldown(misses: int) -> float:
     """
-    Monitor Bluetooth device connections and disconnections using D-Bus
-    PropertiesChanged signals on org.bluez.Device1 interfaces.
+    Returns how long a controller waits to prewarm again after ``misses``
+    unused prewarms in a row, in seconds.
     """
-    # Load configuration settings
-    config = load_config()
+    # The exponent is bounded so a controller idle for weeks cannot overflow it
+    return min(PREWARM_COOLDOWN * 2 ** min(misses - 1, 32), PREWARM_MAX_COOLDOWN)
 
-    # Connect to the system bus
-    bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
 
-    # Keep track of connected devices
-    connected_devices = set()
+class MoonlightSupervisor:
+    """
+    Owns the single moonlight-qt child process.
+
+    Every connected allowed controller holds a reference. The client is
+    started when the first reference is taken and stopped, by PID, once the
+    last one is released. The child is reaped by a background task so it
+    never lingers as a zombie.
+    """
 
-    # Get all managed objects
-    introspection = await bus.introspect('org.bluez', '/')
-    obj = bus.get_proxy_object('org.bluez', '/', introspection)
-    obj_manager = obj.get_interface('org.freedesktop.DBus.ObjectManager')
+    def __init__(self, command=("moonlight-qt",), stop_grace: float = 5.0, metrics: MonitorMetrics = None):
+        self.command = command
+        self.stop_grace = stop_grace
+        self.metrics = metrics
+        self._process = None
+        self._reaper = None
+        self._holders = set()
+        self._lock = asyncio.Lock()
+        # (MAC address, time.monotonic()) of a start not yet claimed by a connection
+        self._prewarmed = None
+        self._prewarm_expiry = None
+        # MAC address -> (time.monotonic() its last prewarm went unused,
+        # unused prewarms in a row)
+        self._prewarm_misses = {}
 
-    managed_objects = await obj_manager.call_get_managed_objects()
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
 
-    # Function to create controller_status callback with mac_address closure
-    def make_controller_status(mac_address):
-        async def controller_status(interface_name, changed_properties, invalidated_properties):
-            if interface_name != 'org.bluez.Device1':
+    @property
+    def pid(self):
+        return self._process.pid if self.is_running else None
+
+    @property
+    def holders(self) -> frozenset:
+        return frozenset(self._holders)
+
+    @property
+    def prewarmed_for(self):
+        return self._prewarmed[0] if self._prewarmed is not None else None
+
+    def can_prewarm(self, mac_address: str) -> bool:
+        """
+        Cheap check, safe to make on every RSSI update, of whether a
+        prewarm for this controller would start anything.
+        """
+        if self._holders or self.is_running or self._lock.locked():
+            return False
+        missed = self._prewarm_misses.get(mac_address)
+        return missed is None or time.monotonic() - missed[0] >= prewarm_cooldown(missed[1])
+
+    async def prewarm(self, mac_address: str, window: float = PREWARM_WINDOW, command=None, reason: str = None):
+        """
+        Starts moonlight-qt ahead of an expected connection, so its cold
+        start overlaps with the controller connecting. If no controller
+        takes a reference within ``window`` seconds it is stopped again.
+
+        Returns:
+            bool: True if moonlight-qt was started.
+        """
+        async with self._lock:
+            if self._holders or self.is_running:
+                return False
+            try:
+                self._process = await asyncio.create_subprocess_exec(*(command or self.command))
+            except Exception as e:
+                logger.warning(f"Failed to prewarm moonlight-qt: {e}")
+                return False
+            self._reaper = asyncio.create_task(self._reap(self._process))
+            self._prewarmed = (mac_address, time.monotonic())
+            self._prewarm_expiry = asyncio.create_task(self._expire_prewarm(self._process, window))
+            logger.info(f"Prewarmed moonlight-qt (pid {self._process.pid}) for device {mac_address}"
+                        f"{' on ' + reason if reason else ''}",
+                        extra={"mac": mac_address, "event": "moonlight_prewarmed"})
+            return True
+
+    async def _expire_prewarm(self, process, window: float):
+        await asyncio.sleep(window)
+        async with self._lock:
+            if self._prewarmed is None or self._process is not process or self._holders:
                 return
-            # Check if 'Connected' property has changed
-            if 'Connected' in changed_properties:
-                connected = changed_properties['Connected'].value
-                if connected:
-                    # Device connected
-                    if mac_address not in connected_devices:
-                        connected_devices.add(mac_address)
-                        logger.info(f"Device connected: {mac_address}")
-                        try:
-                            subprocess.Popen(f"moonlight-qt")#, shell=True)
-                            logger.info(f"Started moonlight-qt for device {mac_address}")
-                        except Exception as e:
-                            logger.exception(f"Failed to start moonlight-qt: {e}")
-                else:
-                    # Device disconnected
-                    if mac_address in connected_devices:
-                        connected_devices.remove(mac_address)
-                        logger.info(f"Device disconnected: {mac_address}")
-                        # Wait for the optional timeout before closing moonlight-qt
-                        timeout = config.get('timeout', 0)
-                        asyncio.create_task(disconnect_device(mac_address, timeout))
-            else:
-                # If only other properties (e.g., Battery) changed, do nothing
-                pass
-        return controller_status
-
-    # Initialize connected devices and set up signal handlers
-    for path, interfaces in managed_objects.items():
-        # Look for any type of Bluetooth interface device
-        device_props = interfaces.get('org.bluez.Device1')
-        if device_props:
-            mac_address = device_props.get('Address').value
-            if mac_address in config['allowed_devices']:
-                # Introspect the device
-                device_introspection = await bus.introspect('org.bluez', path)
-                # Create proxy object for the device
-                device_obj = bus.get_proxy_object('org.bluez', path, device_introspection)
-                # Get the Properties interface
-                device_props_interface = device_obj.get_interface('org.freedesktop.DBus.Properties')
-                # Add the controller_status callback to on_properties_changed signal
-                device_props_interface.on_properties_changed(make_controller_status(mac_address))
-                # Check if device is already connected
-                connected = device_props.get('Connected').value
-                if connected:
-                    # Device is already connected
-                    connected_devices.add(mac_address)
-                    logger.info(f"Device already connected: {mac_address}")
-                    # Start moonlight-qt for the already connected device
-                    try:
-                        subprocess.Popen(f"moonlight-qt")
-                        logger.info(f"Started moonlight-qt for device {mac_address}")
-                    except Exception as e:
-                        logger.exception(f"Failed to start moonlight-qt: {e}")
-
-    async def disconnect_device(mac_address, timeout):
-        """
-        Waits for the specified timeout and then kills moonlight-qt.
-        """
-        await asyncio.sleep(timeout)
+            mac_address, started = self._prewarmed
+            self._prewarmed = None
+            self._prewarm_expiry = None
+            misses = self._prewarm_misses.get(mac_address, (None, 0))[1] + 1
+            self._prewarm_misses[mac_address] = (time.monotonic(), misses)
+            await self._stop()
+            if self.metrics is not None:
+                self.metrics.prewarm_wasted.observe(time.monotonic() - started)
+            logger.info(f"Stopped prewarmed moonlight-qt; device {mac_address} did not connect within {window:g}s, "
+                        f"not prewarming it again for {prewarm_cooldown(misses):g}s",
+                        extra={"mac": mac_address, "event": "prewarm_expired"})
+
+    def _claim_prewarm(self, mac_address: str, requested_at: float):
+        """
+        Hands a prewarmed client to the first connection and reports how
+        much earlier than the connection it was started.
+
+        Returns:
+            bool: True if the prewarmed client is still running.
+        """
+        prewarmed_for, started = self._prewarmed
+        self._prewarmed = None
+        if self._prewarm_expiry is not None:
+            self._prewarm_expiry.cancel()
+            self._prewarm_expiry = None
+        if not self.is_running:
+            return False
+        self._prewarm_misses.pop(prewarmed_for, None)
+        # The client got this much of a head start, which is the launch
+        # latency saved up to its cold start time
+        saved = max(0.0, (requested_at or time.monotonic()) - started)
+        if self.metrics is not None:
+            self.metrics.prewarm_saved.observe(saved)
+        logger.info(f"Using moonlight-qt (pid {self._process.pid}) prewarmed {saved:.2f}s before device {mac_address} connected",
+                    extra={"mac": mac_address, "event": "prewarm_used", "latency": saved})
+        return True
+
+    async def acquire(self, mac_address: str, requested_at: float = None, command=None):
+        """
+        Takes a reference for a connected controller, starting moonlight-qt if
+        it is not already running.
+
+        Args:
+            mac_address (str): The controller taking the reference.
+            requested_at (float): time.monotonic() when the connection was
+                seen, used to record launch latency.
+            command (list): The controller's own moonlight-qt command line,
+                used instead of the default if this starts the client.
+        """
+        async with self._lock:
+            self._holders.add(mac_address)
+            # A controller that connects is in use again
+            self._prewarm_misses.pop(mac_address, None)
+            if self._prewarmed is not None and self._claim_prewarm(mac_address, requested_at):
+                return
+            if self.is_running:
+                logger.info(f"moonlight-qt already running (pid {self._process.pid}) for device {mac_address}")
+                return
+            try:
+                self._process = await asyncio.create_subprocess_exec(*(command or self.command))
+            except Exception as e:
+                logger.exception(f"Failed to start moonlight-qt: {e}")
+                return
+            latency = None
+            if requested_at is not None:
+                latency = time.monotonic() - requested_at
+                if self.metrics is not None:
+                    self.metrics.launch_latency.observe(latency)
+            self._reaper = asyncio.create_task(self._reap(self._process))
+            logger.info(f"Started moonlight-qt (pid {self._process.pid}) for device {mac_address}",
+                        extra={"mac": mac_address, "event": "moonlight_started", "latency": latency})
+
+    async def release(self, mac_address: str):
+        """
+        Drops the reference held by a controller and stops moonlight-qt when
+        no controller holds one any more.
+        """
+        async with self._lock:
+            self._holders.discard(mac_address)
+            if self._holders:
+                logger.info(f"moonlight-qt kept running for {len(self._holders)} other device(s)")
+                return
+            await self._stop()
+            logger.info(f"Stopped moonlight-qt after device {mac_address} disconnected",
+                        extra={"mac": mac_address, "event": "moonlight_stopped"})
+
+    async def shutdown(self):
+        """
+        Stops moonlight-qt regardless of how many references are held.
+        """
+        async with self._lock:
+            self._holders.clear()
+            if self._prewarm_expiry is not None:
+                self._prewarm_expiry.cancel()
+            self._prewarmed = self._prewarm_expiry = None
+            await self._stop()
+
+    async def _stop(self):
+        process = self._process
+        if process is None or process.returncode is not None:
+            return
+        stop_started = time.monotonic()
         try:
-            subprocess.Popen("pkill moonlight-qt", shell=True)
-            logger.info(f"Stopped moonlight-qt after device {mac_address} disconnected")
-        except Exception as e:
-            logger.exception(f"Failed to kill moonlight-qt: {e}")
+            process.terminate()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._reaper), self.stop_grace)
+            except asyncio.TimeoutError:
+                logger.warning(f"moonlight-qt (pid {process.pid}) ignored SIGTERM, sending SIGKILL")
+                process.kill()
+                await self._reaper
+        except ProcessLookupError:
+            # The process exited between the returncode check and the signal
+            return
+        if self.metrics is not None:
+            self.metrics.stop_duration.observe(time.monotonic() - stop_started)
 
-    logger.info("Bluetooth monitor started, waiting for device connections...")
-    # Keep the program running indefinitely
-    await asyncio.Future()  # Run forever
+    async def _reap(self, process):
+        returncode = await process.wait()
+        logger.info(f"moonlight-qt (pid {process.pid}) exited with code {returncode}")
+        if self._process is process:
+            self._process = None
+            self._prewarmed = None
+
+
+# Shortest delay between a disconnect and the shutdown it triggers, so a
+# Connected true/false flap never restarts moonlight-qt even with timeout 0.
+DISCONNECT_DEBOUNCE = 1.0
 
 
-async def pair_new_controller():
+class DisconnectScheduler:
     """
-    Connect to a wireless Bluetooth controller using Bleak and set the device as trusted.
+    Keeps at most one pending, cancellable shutdown per device.
+
+    A disconnect arms (or rearms) a deadline for the device; a reconnect
+    before the deadline cancels it. When a deadline passes, ``callback`` is
+    awaited with the device's MAC address.
     """
-    # Load company identifiers for manufacturer data
-    with resources.open_text("bluelight", "company_identifiers.json") as file:
-        COMPANY_IDENTIFIERS = json.load(file)
-    # Convert keys to integers for proper comparison
-    COMPANY_IDENTIFIERS = {int(k): COMPANY_IDENTIFIERS[k] for k in COMPANY_IDENTIFIERS}
-    async def connect():
-        # Start Bluetooth scanning
-        console.print("[bold green]Scanning for Bluetooth devices...[/bold green]")
-        devices = await BleakScanner.discover(return_adv=True)
-
-        if not devices:
-            console.print("[bold red]No Bluetooth devices found. Please ensure the device is in pairing mode.[/bold red]")
-            raise typer.Exit()
-
-        # Create a list of devices with more context using metadata or address as fallback
-        device_list = {}
-        idx = 1
-        for mac_address, (device, advertisement_data) in devices.items():
-            # Extract manufacturer data if available
-            manufacturer_name = "Unknown Manufacturer"
-            if advertisement_data.manufacturer_data:
-                for manufacturer_id in advertisement_data.manufacturer_data:
-                    manufacturer_name = COMPANY_IDENTIFIERS.get(manufacturer_id, "Unknown Manufacturer")
-
-            # Set device name or use "Unknown Device" if name is not available
-            device_name = device.name or "Unknown Device"
-            
-            # Check if device name is the same as the MAC address, which indicates an unknown device
-            if str.join(":",device_name.split("-")) == mac_address:
-                device_name = "Unknown Device"
-
-            # Highlight potential controllers based on device name
-            if "controller" in device_name.lower():
-                display_name = f"[bold green]{device_name}[/bold green]"
+
+    def __init__(self, callback, debounce: float = DISCONNECT_DEBOUNCE):
+        self._callback = callback
+        self.debounce = debounce
+        self._pending = {}
+        self._running = set()
+
+    def schedule(self, mac_address: str, delay: float):
+        """
+        Arms the shutdown for a device ``delay`` seconds from now, replacing
+        any shutdown already pending for it.
+        """
+        self.cancel(mac_address)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(delay, self.debounce)
+        handle = loop.call_at(deadline, self._fire, mac_address)
+        self._pending[mac_address] = (deadline, handle)
+        return deadline
+
+    def cancel(self, mac_address: str) -> bool:
+        """
+        Cancels the pending shutdown for a device. Returns True if one was pending.
+        """
+        entry = self._pending.pop(mac_address, None)
+        if entry is None:
+            return False
+        entry[1].cancel()
+        return True
+
+    def cancel_all(self):
+        for mac_address in list(self._pending):
+            self.cancel(mac_address)
+
+    def pending(self) -> dict:
+        """
+        Returns the pending shutdowns as a mapping of MAC address to the
+        number of seconds left before it fires.
+        """
+        now = asyncio.get_running_loop().time()
+        return {mac: max(0.0, deadline - now) for mac, (deadline, _) in self._pending.items()}
+
+    def deadlines(self) -> dict:
+        """
+        Returns the pending shutdowns as a mapping of MAC address to their
+        absolute deadline on the event loop clock.
+        """
+        return {mac: deadline for mac, (deadline, _) in self._pending.items()}
+
+    def _fire(self, mac_address: str):
+        self._pending.pop(mac_address, None)
+        task = asyncio.create_task(self._callback(mac_address))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+
+async def monitor_bluetooth(bus_address: str = None, metrics: MonitorMetrics = None, ready: asyncio.Event = None):
+    """
+    Monitor Bluetooth device connections and disconnections using D-Bus
+    PropertiesChanged signals on org.bluez.Device1 interfaces.
+
+    A single bus-wide subscription covers every object under /org/bluez.
+    Signals are routed to a device through an object path -> (adapter, MAC
+    address) index, which is kept up to date from InterfacesAdded/
+    InterfacesRemoved so devices paired after startup are picked up live.
+    Connections are tracked per adapter; an adapter powering off or going
+    away takes its connections down with it. If the config names an
+    adapter, devices on other adapters are ignored.
+
+    Args:
+        bus_address (str): D-Bus address to monitor instead of the system bus.
+        metrics (MonitorMetrics): Histograms to record latency into.
+        ready (asyncio.Event): Set once the initial device sync is done.
+    """
+    # Load configuration settings. The store pushes later edits to
+    # config_changed, so the hot paths below never touch the file.
+    store = get_store()
+    config = store.get()
+
+    # Connect to the system bus through the shared backend connection
+    bus = await dbus_backend.get_bus(bus_address)
+
+    # Allowed controllers connected on at least one monitored adapter
+    connected_devices = set()
+
+    # MAC address -> names of the adapters it is connected on. The same
+    # controller can be paired with, and connect through, several adapters.
+    connections = {}
+
+    # Latency histograms, exported periodically for `bluelight stats`
+    metrics = metrics or MonitorMetrics()
+
+    # Fixed-size battery, RSSI and connection history for `bluelight history`
+    try:
+        telemetry = Telemetry.load()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Discarding unreadable controller history: {e}")
+        telemetry = Telemetry()
+
+    # Controllers whose low battery has been reported, until they recharge
+    low_battery = set()
+
+    # Configured per-controller actions, run off the signal path
+    pipeline = ActionPipeline(metrics=metrics)
+
+    # Single moonlight-qt instance shared by every connected controller
+    supervisor = MoonlightSupervisor(metrics=metrics)
+
+    # Pending moonlight-qt shutdowns, one per disconnected device
+    scheduler = DisconnectScheduler(supervisor.release)
+
+    # Object path -> (adapter name, MAC address) for every known org.bluez.Device1
+    device_paths = {}
+
+    # Adapter name -> {"path", "address", "powered", "discovering"}
+    adapters = {}
+
+    def adapter_selected(adapter):
+        """
+        Returns True if the configured adapter, if any, is this one. The
+        config may name it ("hci1") or give its address.
+        """
+        selected = config.get('adapter')
+        if not selected:
+            return True
+        if selected == adapter:
+            return True
+        address = adapters.get(adapter, {}).get('address')
+        return address is not None and address.upper() == selected.upper()
+
+    def is_tracked(adapter, mac_address):
+        return mac_address in config['allowed_devices'] and adapter_selected(adapter)
+
+    def device_name(mac_address):
+        device_info = config['allowed_devices'].get(mac_address, {})
+        return device_info.get('nickname') or device_info.get('name') or mac_address
+
+    def run_actions(mac_address, event, specs, **env):
+        """
+        Queues the configured actions for a controller event without waiting
+        for them.
+        """
+        device_info = config['allowed_devices'].get(mac_address, {})
+        try:
+            actions = parse_actions(specs)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Ignoring invalid {event} actions for {mac_address}: {e}")
+            return
+        pipeline.submit(mac_address, event, actions, device_info,
+                        dict(env, BLUELIGHT_NAME=device_name(mac_address)))
+
+    def configured_actions(mac_address, event):
+        """
+        Returns the actions for an event: the global ones, then the
+        controller's own.
+        """
+        key = f"on_{event}"
+        device_info = config['allowed_devices'].get(mac_address, {})
+        return list(config.get('actions', {}).get(key, [])) + list(device_info.get(key, []))
+
+    def moonlight_command(mac_address):
+        """
+        Returns the controller's moonlight-qt command line, None for the
+        default one, or False if the controller does not start moonlight-qt.
+        """
+        command = config['allowed_devices'].get(mac_address, {}).get('moonlight', True)
+        if command is True or command is None:
+            return None
+        if command is False:
+            return False
+        if isinstance(command, str):
+            command = shlex.split(command)
+        if not isinstance(command, list) or not command or not all(isinstance(arg, str) for arg in command):
+            logger.warning(f"Ignoring invalid moonlight command for {mac_address}: {command!r}")
+            return None
+        return command
+
+    def maybe_prewarm(mac_address, reason):
+        """
+        Starts moonlight-qt early for an allowed controller that was seen
+        advertising, if prewarming is enabled.
+        """
+        if not config.get('prewarm') or mac_address in connected_devices or not supervisor.can_prewarm(mac_address):
+            return
+        command = moonlight_command(mac_address)
+        if command is False:
+            return
+        window = config.get('prewarm_window', PREWARM_WINDOW)
+        asyncio.create_task(supervisor.prewarm(mac_address, window, command, reason))
+
+    def device_connected(mac_address, received=None):
+        # A reconnect within the timeout keeps moonlight-qt running
+        if scheduler.cancel(mac_address):
+            logger.info(f"Cancelled pending shutdown for reconnected device {mac_address}")
+        if mac_address in connected_devices:
+            return
+        connected_devices.add(mac_address)
+        telemetry.record_event(mac_address, True)
+        logger.info(f"Device connected: {mac_address}", extra={"mac": mac_address, "event": "connected"})
+        command = moonlight_command(mac_address)
+        if command is not False:
+            asyncio.create_task(supervisor.acquire(mac_address, received, command))
+        run_actions(mac_address, "connect", configured_actions(mac_address, "connect"))
+
+    def device_disconnected(mac_address, received=None):
+        if mac_address not in connected_devices:
+            return
+        connected_devices.remove(mac_address)
+        telemetry.record_event(mac_address, False)
+        logger.info(f"Device disconnected: {mac_address}", extra={"mac": mac_address, "event": "disconnected"})
+        # Wait for the optional timeout before closing moonlight-qt
+        if moonlight_command(mac_address) is not False:
+            timeout = config.get('timeout', 0)
+            scheduler.schedule(mac_address, timeout)
+        run_actions(mac_address, "disconnect", configured_actions(mac_address, "disconnect"))
+        if received is not None:
+            metrics.disconnect_handling.observe(time.monotonic() - received)
+
+    def battery_changed(mac_address, percentage):
+        telemetry.record_battery(mac_address, percentage)
+        check_battery(mac_address, percentage)
+
+    def check_battery(mac_address, percentage):
+        threshold = config.get('low_battery_threshold', 15)
+        if percentage <= threshold and mac_address not in low_battery:
+            low_battery.add(mac_address)
+            logger.warning(f"Controller {mac_address} battery is low: {percentage}%",
+                           extra={"mac": mac_address, "event": "low_battery"})
+            command = config.get('low_battery_command')
+            if command:
+                run_actions(mac_address, "low_battery", [command], BLUELIGHT_BATTERY=str(percentage))
+        elif percentage > threshold + LOW_BATTERY_HYSTERESIS:
+            low_battery.discard(mac_address)
+
+    def link_up(adapter, mac_address, received=None):
+        """
+        Records a connection through one adapter. The controller counts as
+        connected from its first link until its last one goes down.
+        """
+        links = connections.setdefault(mac_address, set())
+        if adapter in links:
+            return
+        links.add(adapter)
+        if len(links) == 1:
+            device_connected(mac_address, received)
+        else:
+            logger.info(f"Device {mac_address} also connected on {adapter}", extra={"mac": mac_address, "event": "connected"})
+
+    def link_down(adapter, mac_address, received=None):
+        links = connections.get(mac_address)
+        if not links or adapter not in links:
+            return
+        links.remove(adapter)
+        if not links:
+            del connections[mac_address]
+            device_disconnected(mac_address, received)
+
+    def drop_device(mac_address):
+        """
+        Takes down every link of a controller, e.g. when it is no longer allowed.
+        """
+        for adapter in list(connections.get(mac_address, ())):
+            link_down(adapter, mac_address)
+
+    def device_added(path, device_props):
+        """
+        Adds a device to the path index and handles it if it is already connected.
+        """
+        address = device_props.get('Address')
+        if address is None:
+            return
+        key = (dbus_backend.adapter_name(path.rsplit('/', 1)[0]), address.value)
+        device_paths[path] = key
+        if not is_tracked(*key):
+            return
+        connected = device_props.get('Connected')
+        if connected is not None and connected.value:
+            link_up(*key)
+
+    def device_removed(path):
+        key = device_paths.pop(path, None)
+        if key is not None:
+            link_down(*key)
+
+    def adapter_added(path, adapter_props):
+        name = dbus_backend.adapter_name(path)
+        adapters[name] = {
+            "path": path,
+            "address": adapter_props['Address'].value if 'Address' in adapter_props else None,
+            "powered": adapter_props['Powered'].value if 'Powered' in adapter_props else False,
+            "discovering": adapter_props['Discovering'].value if 'Discovering' in adapter_props else False,
+        }
+        return name
+
+    def adapter_down(name):
+        # BlueZ drops every connection on an adapter that goes away or
+        # powers off; don't rely on a Connected change for each of them
+        for mac_address, links in list(connections.items()):
+            if name in links:
+                link_down(name, mac_address, time.monotonic())
+
+    def adapter_removed(path):
+        name = dbus_backend.adapter_name(path)
+        if adapters.pop(name, None) is None:
+            return
+        logger.warning(f"Bluetooth adapter {name} was removed")
+        adapter_down(name)
+        for device_path, (adapter, _) in list(device_paths.items()):
+            if adapter == name:
+                del device_paths[device_path]
+
+    def adapter_changed(path, changed_properties):
+        name = dbus_backend.adapter_name(path)
+        adapter = adapters.get(name)
+        if adapter is None:
+            return
+        if 'Powered' in changed_properties:
+            adapter['powered'] = changed_properties['Powered'].value
+            if adapter['powered']:
+                logger.info(f"Bluetooth adapter {name} powered on")
             else:
-                display_name = device_name
-
-            # Store the device information for display and selection
-            device_list[str(idx)] = {
-                "device": device,
-                "name": device_name,
-                "manufacturer": manufacturer_name,
-                "address": mac_address
-            }
-            # Display the device information with index
-            console.print(f"[{idx}] {display_name} : {manufacturer_name} : ({mac_address})")
-            idx += 1
-
-        # Add an option to quit
-        console.print(f"[{idx}] [bold red]Quit[/bold red] (Run again to rescan)")
-
-        # Use Rich prompt to select a device
-        selected_idx = Prompt.ask(
-            "[bold yellow]Select the device number you want to connect to[/bold yellow]", 
-            choices=list(device_list.keys()) + [str(idx)]
-        )
-
-        if selected_idx == str(idx):
-            console.print("[bold red]Quitting...[/bold red]")
-            raise typer.Exit()
-
-        # Get selected device information
-        selected_device = device_list[selected_idx]
-        console.print(f"[bold green]Connecting to {selected_device['name']} ({selected_device['address']})...[/bold green]")
-
-        # Attempt to connect to the selected device
+                logger.warning(f"Bluetooth adapter {name} powered off")
+                adapter_down(name)
+        if 'Discovering' in changed_properties:
+            adapter['discovering'] = changed_properties['Discovering'].value
+            logger.info(f"Bluetooth adapter {name} {'started' if adapter['discovering'] else 'stopped'} discovering")
+
+    def controller_status(path, interface_name, changed_properties, received):
+        if interface_name == ADAPTER_INTERFACE:
+            adapter_changed(path, changed_properties)
+            return
+        key = device_paths.get(path)
+        if key is None or not is_tracked(*key):
+            return
+        # Check if 'Connected' property has changed
+        if interface_name == DEVICE_INTERFACE and 'Connected' in changed_properties:
+            metrics.signal_dispatch.observe(time.monotonic() - received)
+            if changed_properties['Connected'].value:
+                link_up(*key, received)
+            else:
+                link_down(*key, received)
+            return
+        if interface_name == DEVICE_INTERFACE:
+            if 'RSSI' in changed_properties:
+                telemetry.record_rssi(key[1], changed_properties['RSSI'].value)
+                # BlueZ only reports RSSI for adverts seen while some client is
+                # discovering, so this is the one sign of a controller waking
+                # up before it connects
+                maybe_prewarm(key[1], "RSSI")
+        elif interface_name == BATTERY_INTERFACE and 'Percentage' in changed_properties:
+            battery_changed(key[1], changed_properties['Percentage'].value)
+        if logger.isEnabledFor(logging.DEBUG):
+            # RSSI and battery updates can arrive several times a second; the
+            # log pipeline rate-limits them per device
+            adapter, mac_address = key
+            changes = ", ".join(f"{name}={value.value}" for name, value in changed_properties.items())
+            logger.debug(f"{mac_address} {interface_name} changed on {adapter}: {changes}",
+                         extra={"mac": mac_address, "event": "properties_changed"})
+
+    def on_bluez_signal(msg):
+        """
+        Routes every BlueZ signal received through the match rules.
+        """
+        received = time.monotonic()
+        if msg.message_type != MessageType.SIGNAL:
+            return
+        if msg.member == 'NameOwnerChanged' and msg.interface == DBUS_INTERFACE:
+            name, old_owner, new_owner = msg.body
+            if name == BLUEZ_SERVICE_NAME:
+                bluez_owner_changed(old_owner, new_owner, received)
+            return
+        if queued_signals is not None:
+            # A snapshot is in flight; apply this on top of it afterwards
+            queued_signals.append(msg)
+            return
+        if msg.member == 'PropertiesChanged' and msg.interface == DBUS_PROPERTIES:
+            if msg.path.startswith(BLUEZ_ROOT_PATH):
+                interface_name, changed_properties, _ = msg.body
+                controller_status(msg.path, interface_name, changed_properties, received)
+        elif msg.member == 'InterfacesAdded' and msg.interface == OBJECT_MANAGER_INTERFACE:
+            path, interfaces = msg.body
+            if ADAPTER_INTERFACE in interfaces:
+                name = adapter_added(path, interfaces[ADAPTER_INTERFACE])
+                logger.info(f"Bluetooth adapter {name} added")
+            if DEVICE_INTERFACE in interfaces:
+                device_props = interfaces[DEVICE_INTERFACE]
+                device_added(path, device_props)
+                key = device_paths.get(path)
+                if key and key[1] not in config['allowed_devices']:
+                    reason = classify_properties(device_props)
+                    if reason is not None:
+                        logger.info(f"New controller {key[1]} ({reason}) is not paired with bluelight; run `bluelight pair` to use it")
+            if BATTERY_INTERFACE in interfaces:
+                # BlueZ adds Battery1 once a connected device reports its level
+                key = device_paths.get(path)
+                percentage = interfaces[BATTERY_INTERFACE].get('Percentage')
+                if key and percentage is not None and is_tracked(*key):
+                    battery_changed(key[1], percentage.value)
+        elif msg.member == 'InterfacesRemoved' and msg.interface == OBJECT_MANAGER_INTERFACE:
+            path, interfaces = msg.body
+            if DEVICE_INTERFACE in interfaces:
+                device_removed(path)
+            if ADAPTER_INTERFACE in interfaces:
+                adapter_removed(path)
+
+    async def refresh_device(path, adapter, mac_address):
+        connected = await get_device_property(path, 'Connected', bus=bus)
+        if connected and is_tracked(adapter, mac_address):
+            link_up(adapter, mac_address)
+
+    def config_changed(new_config):
+        """
+        Applies an edited configuration file to the running monitor.
+        """
+        nonlocal config
+        if new_config == config:
+            # Our own save through the control socket, already applied
+            return
+        old_allowed = set(config.get('allowed_devices', {}))
+        old_timeout = config.get('timeout', 0)
+        old_adapter = config.get('adapter')
+        config = new_config
+        new_allowed = set(config.get('allowed_devices', {}))
+        logger.info("Configuration reloaded")
+
+        # Devices that are no longer allowed release moonlight-qt as if they disconnected
+        for mac_address in old_allowed - new_allowed:
+            drop_device(mac_address)
+            telemetry.forget(mac_address)
+            low_battery.discard(mac_address)
+        if config.get('adapter') != old_adapter:
+            logger.info(f"Monitoring {'adapter ' + config['adapter'] if config.get('adapter') else 'all adapters'}")
+            # Links on adapters no longer selected go down; ones on newly
+            # selected adapters come up
+            for mac_address, links in list(connections.items()):
+                for adapter in list(links):
+                    if not adapter_selected(adapter):
+                        link_down(adapter, mac_address)
+            added = set(config.get('allowed_devices', {}))
+        else:
+            added = new_allowed - old_allowed
+        # Newly allowed devices may already be connected
+        for path, (adapter, mac_address) in device_paths.items():
+            if mac_address in added and is_tracked(adapter, mac_address) and adapter not in connections.get(mac_address, ()):
+                asyncio.create_task(refresh_device(path, adapter, mac_address))
+        if config.get('timeout', 0) != old_timeout:
+            logger.info(f"Disconnect timeout changed to {config.get('timeout', 0)} seconds")
+
+    watcher = store.watch(config_changed)
+
+    def export_metrics():
+        try:
+            metrics.export()
+        except OSError as e:
+            logger.warning(f"Failed to write metrics: {e}")
+
+    async def export_metrics_periodically():
+        # export() skips the write when nothing was observed meanwhile
+        while True:
+            await asyncio.sleep(EXPORT_INTERVAL)
+            export_metrics()
+
+    exporter = asyncio.create_task(export_metrics_periodically())
+
+    # The history write in progress, which shutdown waits for
+    telemetry_write = None
+
+    def write_telemetry(data):
+        # Runs in a worker thread
         try:
-            async with BleakClient(selected_device['address']) as client:
-                if client.is_connected:
-                    console.print(f"[bold green]Successfully connected to {selected_device['name']}![/bold green]")
-
-                    # Mark the device as trusted using `bluetoothctl`
-                    try:
-                        console.print(f"[bold green]Setting {selected_device['address']} as a trusted device...[/bold green]")
-                        # Run `bluetoothctl` command to set device as trusted
-                        subprocess.run(["bluetoothctl", "trust", selected_device['address']], check=True)
-                        console.print(f"[bold green]Device {selected_device['address']} is now trusted![/bold green]")
-                        # Prompt user for a nickname after successful pairing
-                        nickname = Prompt.ask(f"This device paired successfully! Would you like to give it a nickname(25 char max)? (Leave blank to skip)")
-                        if not nickname:
-                            nickname = "No nickname"
-                        nickname = nickname[:25]
-                        update_allowed_devices(selected_device['address'], selected_device['name'], selected_device['manufacturer'], nickname)
-                    except subprocess.CalledProcessError as e:
-                        console.print(f"[bold red]Failed to set {selected_device['address']} as trusted. Error: {e}[/bold red]")
-                else:
-                    console.print(f"[bold red]Failed to connect to {selected_device['name']}.[/bold red]")
-        except BleakError as e:
-            console.print("[bold red]There was an issue making the connection to your device.\nMake sure your device is in discovery mode and try again.[/bold red]")
-            raise typer.Exit()
-        except Exception as e:
-            console.print(f"[bold red]Something else went wrong. Try again. The error is:\n{e}")
-            raise typer.exit()
-        
-    # Run the connection function
-    await connect()
+            save_snapshot(data)
+        except OSError as e:
+            logger.warning(f"Failed to save controller history: {e}")
+            return False
+        return True
+
+    async def save_telemetry():
+        """
+        Snapshots the history on the loop and writes it from a worker
+        thread, so a slow SD card does not hold up D-Bus signals.
+        """
+        nonlocal telemetry_write
+        data = telemetry.snapshot()
+        if data is None:
+            return
+        telemetry_write = asyncio.ensure_future(asyncio.to_thread(write_telemetry, data))
+        # Shielded so that stopping the saver lets the write finish
+        if not await asyncio.shield(telemetry_write):
+            telemetry.dirty = True
+
+    async def save_telemetry_periodically():
+        # Infrequent, and skipped when nothing changed, to spare SD cards
+        while True:
+            await asyncio.sleep(SAVE_INTERVAL)
+            await save_telemetry()
+
+    telemetry_saver = asyncio.create_task(save_telemetry_periodically())
+
+    # Signals received while resync() waits for its snapshot
+    queued_signals = None
+    # The connection the match rules are registered on
+    subscribed_bus = None
+
+    async def subscribe():
+        nonlocal subscribed_bus
+        bus.add_message_handler(on_bluez_signal)
+        for rule in BLUEZ_MATCH_RULES:
+            await add_match(rule, bus=bus)
+        subscribed_bus = bus
+
+    async def resync():
+        """
+        Reconciles the path index and connected devices with a fresh
+        snapshot, emitting only the transitions that actually happened.
+        """
+        nonlocal queued_signals
+        queued_signals = []
+        try:
+            managed_objects = await get_managed_objects(bus=bus)
+        except BaseException:
+            queued_signals = None
+            raise
+        queued, queued_signals = queued_signals, None
+
+        adapters.clear()
+        for path, interfaces in managed_objects.items():
+            if ADAPTER_INTERFACE in interfaces:
+                adapter_added(path, interfaces[ADAPTER_INTERFACE])
+
+        snapshot_paths = {}
+        snapshot_links = set()
+        snapshot_battery = {}
+        for path, interfaces in managed_objects.items():
+            device_props = interfaces.get(DEVICE_INTERFACE)
+            if not device_props or 'Address' not in device_props:
+                continue
+            key = (dbus_backend.adapter_name(path.rsplit('/', 1)[0]), device_props['Address'].value)
+            snapshot_paths[path] = key
+            if not is_tracked(*key):
+                continue
+            connected = device_props.get('Connected')
+            if connected is not None and connected.value:
+                snapshot_links.add(key)
+            percentage = interfaces.get(BATTERY_INTERFACE, {}).get('Percentage')
+            if percentage is not None:
+                snapshot_battery[key[1]] = percentage.value
+        device_paths.clear()
+        device_paths.update(snapshot_paths)
+
+        current_links = {(adapter, mac_address) for mac_address, links in connections.items() for adapter in links}
+        for key in current_links - snapshot_links:
+            link_down(*key)
+        for key in snapshot_links - current_links:
+            link_up(*key)
+        for mac_address, percentage in snapshot_battery.items():
+            # Saved history may already end with this level
+            last = telemetry.device(mac_address).battery.last()
+            if last is None or last[1] != percentage:
+                telemetry.record_battery(mac_address, percentage)
+            check_battery(mac_address, percentage)
+
+        # Signals queued behind the snapshot reply are newer than it
+        for msg in queued:
+            on_bluez_signal(msg)
+
+    # Set when org.bluez gets an owner, to cut a recovery backoff short
+    bluez_appeared = asyncio.Event()
+    recovery = None
+
+    def report_status():
+        systemd.notify(f"STATUS=Monitoring {len(config['allowed_devices'])} controller(s), "
+                       f"{len(connected_devices)} connected")
+
+    async def recover(lost_at):
+        """
+        Reconnects to the bus and waits for BlueZ with exponential backoff,
+        then resyncs.
+
+        Args:
+            lost_at (float): time.monotonic() when BlueZ or the bus was lost,
+                or None when waiting for BlueZ to start at all.
+        """
+        nonlocal bus
+        delay = RECONNECT_INITIAL_DELAY
+        while True:
+            bluez_appeared.clear()
+            try:
+                if not bus.connected:
+                    bus = await dbus_backend.get_bus(bus_address)
+                if subscribed_bus is not bus:
+                    await subscribe()
+                # Checking the name first avoids bus-activating a bluetoothd
+                # that was stopped on purpose
+                if await name_has_owner(BLUEZ_SERVICE_NAME, bus=bus):
+                    await resync()
+                    break
+            except Exception as e:
+                # dbus_next surfaces a dropped connection as several error types
+                logger.warning(f"Reconnecting to BlueZ failed, retrying in {delay:.1f}s: {e}")
+            try:
+                await asyncio.wait_for(bluez_appeared.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        report_status()
+        if lost_at is None:
+            logger.info("BlueZ is running")
+            return
+        elapsed = time.monotonic() - lost_at
+        metrics.recovery.observe(elapsed)
+        logger.info(f"Resynchronised with BlueZ after {elapsed * 1000:.0f} ms; "
+                    f"{len(connected_devices)} allowed device(s) connected",
+                    extra={"event": "resynchronised", "latency": elapsed})
+
+    def start_recovery(lost_at):
+        """
+        Starts recovering unless a recovery is already under way.
+        """
+        nonlocal recovery
+        if recovery is None or recovery.done():
+            recovery = asyncio.create_task(recover(lost_at))
+        return recovery
+
+    def bluez_owner_changed(old_owner, new_owner, received):
+        if new_owner:
+            bluez_appeared.set()
+        if old_owner and not new_owner:
+            logger.warning("BlueZ left the bus, waiting for it to come back")
+            systemd.notify("STATUS=Waiting for BlueZ to come back")
+        elif new_owner:
+            logger.info("BlueZ is on the bus, resynchronising")
+        start_recovery(received)
+
+    # Subscribe before taking the snapshot so no transition falls in between,
+    # then initialize the path index and connected devices from one snapshot
+    await subscribe()
+    if await name_has_owner(BLUEZ_SERVICE_NAME, bus=bus):
+        await resync()
+    else:
+        # Started before bluetoothd, e.g. early at boot; wait for it rather
+        # than exit and go through the unit's restart loop
+        logger.warning("BlueZ is not running yet, waiting for it")
+        systemd.notify("STATUS=Waiting for BlueZ")
+        await start_recovery(None)
+
+    def status():
+        """
+        Reports the monitor's live state to `bluelight status`.
+        """
+        return {
+            "connected": {mac_address: sorted(connections.get(mac_address, ())) for mac_address in sorted(connected_devices)},
+            "allowed_devices": config.get('allowed_devices', {}),
+            "adapter": config.get('adapter'),
+            "adapters": adapters,
+            "timeout": config.get('timeout', 0),
+            "moonlight": {
+                "running": supervisor.is_running,
+                "pid": supervisor.pid,
+                "holders": sorted(supervisor.holders),
+                "prewarmed_for": supervisor.prewarmed_for,
+            },
+            "recovering": recovery is not None and not recovery.done(),
+            "pending_shutdowns": scheduler.pending(),
+            "actions": pipeline.stats(),
+            "battery": {mac_address: device.summary()["battery"] for mac_address, device in telemetry.devices.items()},
+        }
+
+    def history(address=None, tier="raw"):
+        """
+        Reports controller history to `bluelight history`: a summary per
+        controller, or one controller's samples at the given tier.
+        """
+        if address is None:
+            return {mac_address: device.summary() for mac_address, device in telemetry.devices.items()}
+        if tier not in TIER_NAMES:
+            raise ValueError(f"Unknown tier {tier!r}; use one of {', '.join(TIER_NAMES)}")
+        device = telemetry.devices.get(address)
+        if device is None:
+            raise ValueError(f"No history for {address}")
+        return device.history(TIER_NAMES.index(tier))
+
+    # Keeps control-socket edits from interleaving while one is being written
+    config_lock = asyncio.Lock()
+
+    async def update_config(mutate):
+        async with config_lock:
+            # load() returns a copy, so the loop never touches what the
+            # worker thread is writing
+            new_config = store.load()
+            mutate(new_config)
+            await asyncio.to_thread(store.save, new_config)
+            config_changed(store.get())
+
+    async def set_timeout(seconds):
+        await update_config(lambda c: c.__setitem__('timeout', int(seconds)))
+        return config['timeout']
+
+    async def forget_device(address):
+        if address not in config.get('allowed_devices', {}):
+            raise ValueError(f"{address} is not an allowed device")
+        await update_config(lambda c: c['allowed_devices'].pop(address, None))
+        return address
+
+    async def set_adapter(adapter=None):
+        if adapter and not any(adapter == name or (info['address'] or '').upper() == adapter.upper()
+                               for name, info in adapters.items()):
+            raise ValueError(f"Bluetooth adapter {adapter} not found")
+        await update_config(lambda c: c.__setitem__('adapter', adapter or None))
+        return config.get('adapter')
+
+    # Lets the CLI read and change live state without touching the file
+    control = ControlServer({
+        "ping": lambda: "pong",
+        "status": status,
+        "set_timeout": set_timeout,
+        "forget_device": forget_device,
+        "set_adapter": set_adapter,
+        "history": history,
+    })
+    try:
+        await control.start()
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"Control socket unavailable, CLI commands will use the config file: {e}")
+
+    logger.info("Bluetooth monitor started, waiting for device connections...")
+    if ready is not None:
+        ready.set()
+
+    # Under systemd (Type=notify) the unit only becomes active now, so units
+    # ordered after it never see a half-synced monitor
+    try:
+        startup = systemd.process_uptime()
+    except (OSError, ValueError, IndexError):
+        startup = None
+    if startup is not None:
+        metrics.ready.observe(startup)
+        logger.info(f"Ready {startup * 1000:.0f} ms after the process started", extra={"event": "ready", "latency": startup})
+    systemd.notify("READY=1")
+    report_status()
+
+    async def ping_watchdog(interval):
+        # Pinged from the event loop, so a wedged loop gets the unit restarted
+        while True:
+            systemd.notify("WATCHDOG=1")
+            await asyncio.sleep(interval)
+
+    watchdog_interval = systemd.watchdog_interval()
+    watchdog = asyncio.create_task(ping_watchdog(watchdog_interval)) if watchdog_interval else None
+    disconnected = None
+    try:
+        # Run until cancelled, reconnecting whenever the bus connection drops
+        while True:
+            # The shield keeps cancelling this from cancelling the bus's own
+            # disconnect future, which other users of the shared bus await
+            disconnected = asyncio.shield(bus.wait_for_disconnect())
+            await asyncio.wait([disconnected])
+            error = disconnected.exception()
+            logger.warning(f"Lost the system bus connection{f': {error!r}' if error else ''}")
+            await start_recovery(time.monotonic())
+    finally:
+        systemd.notify("STOPPING=1")
+        # The bus is shared and outlives the monitor; stop reacting to its
+        # signals so a BlueZ restart no longer starts a recovery
+        if subscribed_bus is not None:
+            subscribed_bus.remove_message_handler(on_bluez_signal)
+        if disconnected is not None:
+            disconnected.cancel()
+        if watchdog is not None:
+            watchdog.cancel()
+        if recovery is not None:
+            recovery.cancel()
+        await control.close()
+        exporter.cancel()
+        telemetry_saver.cancel()
+        await pipeline.close()
+        watcher.close()
+        scheduler.cancel_all()
+        await supervisor.shutdown()
+        export_metrics()
+        if telemetry_write is not None and not await telemetry_write:
+            telemetry.dirty = True
+        await save_telemetry()
+
 
 if __name__ == '__main__':
     asyncio.run(monitor_bluetooth())
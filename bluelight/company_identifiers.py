@@ -0,0 +1,154 @@
+# bluelight/company_identifiers.py
+
+"""
+Bluetooth SIG company identifier lookup.
+
+company_identifiers.json is the source of truth. It is compiled into
+company_identifiers.bin, a compact index that is memory-mapped and binary
+searched so a lookup never parses the JSON or builds a dict.
+
+Index layout (little-endian):
+    header   4s magic, H version, H reserved, I count
+    ids      count x H, sorted ascending
+    offsets  (count + 1) x I, start of each name in the string table
+    strings  UTF-8 names, concatenated
+
+Rebuild the index after updating the JSON with:
+    python -m bluelight.company_identifiers
+"""
+
+import json
+import mmap
+import struct
+from importlib import resources
+from pathlib import Path
+
+SOURCE_FILENAME = "company_identifiers.json"
+INDEX_FILENAME = "company_identifiers.bin"
+
+MAGIC = b"BLCI"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+ID = struct.Struct("<H")
+OFFSET = struct.Struct("<I")
+
+UNKNOWN_MANUFACTURER = "Unknown Manufacturer"
+
+
+def build_index(source: Path, destination: Path) -> int:
+    """
+    Compiles the JSON company identifier table into the binary index.
+
+    Args:
+        source (Path): Path to company_identifiers.json.
+        destination (Path): Path to write the index to.
+
+    Returns:
+        int: Number of identifiers written.
+    """
+    with open(source, "r") as f:
+        identifiers = {int(k): v for k, v in json.load(f).items()}
+
+    ids = sorted(identifiers)
+    offsets = [0]
+    strings = bytearray()
+    for company_id in ids:
+        strings += identifiers[company_id].encode("utf-8")
+        offsets.append(len(strings))
+
+    with open(destination, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(ids)))
+        f.write(b"".join(ID.pack(company_id) for company_id in ids))
+        f.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+        f.write(strings)
+    return len(ids)
+
+
+class CompanyIndex:
+    """
+    Read-only view over a compiled company identifier index.
+    """
+
+    def __init__(self, buffer):
+        magic, version, _, count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported company identifier index (magic={magic!r}, version={version})")
+        self._buffer = buffer
+        self._count = count
+        self._ids_start = HEADER.size
+        self._offsets_start = self._ids_start + count * ID.size
+        self._strings_start = self._offsets_start + (count + 1) * OFFSET.size
+
+    @classmethod
+    def open(cls, path: Path) -> "CompanyIndex":
+        """
+        Memory-maps an index file. Pages are only read in as lookups touch them.
+        """
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _id_at(self, position: int) -> int:
+        return ID.unpack_from(self._buffer, self._ids_start + position * ID.size)[0]
+
+    def _name_at(self, position: int) -> str:
+        start, end = struct.unpack_from("<II", self._buffer, self._offsets_start + position * OFFSET.size)
+        return bytes(self._buffer[self._strings_start + start:self._strings_start + end]).decode("utf-8")
+
+    def get(self, company_id: int, default=None):
+        """
+        Returns the company name for an identifier, or ``default`` if unknown.
+        """
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._id_at(middle) < company_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._id_at(low) == company_id:
+            return self._name_at(low)
+        return default
+
+
+_index = None
+
+
+def _load_index() -> CompanyIndex:
+    global _index
+    if _index is None:
+        with resources.as_file(resources.files("bluelight") / INDEX_FILENAME) as path:
+            _index = CompanyIndex.open(path)
+    return _index
+
+
+def lookup(company_id: int, default: str = UNKNOWN_MANUFACTURER) -> str:
+    """
+    Returns the name of the company with the given Bluetooth SIG identifier.
+    """
+    return _load_index().get(company_id, default)
+
+
+def manufacturer_name(manufacturer_data, default: str = UNKNOWN_MANUFACTURER) -> str:
+    """
+    Returns the first known company name among the identifiers in an
+    advertisement's manufacturer data.
+
+    Args:
+        manufacturer_data: Mapping (or iterable) of company identifiers, e.g.
+            ``AdvertisementData.manufacturer_data``.
+    """
+    for company_id in manufacturer_data or ():
+        name = lookup(company_id, None)
+        if name is not None:
+            return name
+    return default
+
+
+if __name__ == "__main__":
+    package_dir = Path(__file__).parent
+    count = build_index(package_dir / SOURCE_FILENAME, package_dir / INDEX_FILENAME)
+    print(f"Wrote {count} company identifiers to {package_dir / INDEX_FILENAME}")
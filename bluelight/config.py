@@ -1,47 +1,255 @@
 # bluelight/config.py
 
+import copy
 import json
+import logging
+import os
+import struct
 from pathlib import Path
 
+from bluelight.fileio import write_atomic
+
 # Define the path to the configuration file in the user's home directory
 CONFIG_FILE = Path.home() / '.bluelight_config.json'
 
+# "adapter" names the Bluetooth adapter to pair and monitor on, by name
+# ("hci1") or address; None uses every adapter. "low_battery_command" is a
+# shell command run when a controller's battery drops to
+# "low_battery_threshold" percent. "actions" holds "on_connect" and
+# "on_disconnect" lists run for every controller; see bluelight.actions.
+# "prewarm" starts moonlight-qt as soon as an allowed controller is seen
+# advertising while something else keeps discovery running, stopping it
+# again after "prewarm_window" seconds if it never connects.
+DEFAULT_CONFIG = {
+    "allowed_devices": {},
+    "timeout": 300,
+    "adapter": None,
+    "low_battery_threshold": 15,
+    "low_battery_command": None,
+    "actions": {},
+    "prewarm": False,
+    "prewarm_window": 20,
+}
+
+# How often to check the file when inotify is not available, in seconds
+POLL_INTERVAL = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigStore:
+    """
+    Caches the configuration file in memory and writes it atomically.
+
+    The cached copy is revalidated with a single stat() call, so repeated
+    reads only parse the file when it has actually changed.
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or CONFIG_FILE)
+        self._config = None
+        self._stamp = None
+
+    def _current_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self) -> dict:
+        """
+        Returns the cached configuration, re-reading the file only if it
+        changed on disk. The returned dict is shared; use load() for a copy
+        that is safe to modify.
+        """
+        stamp = self._current_stamp()
+        if self._config is None or stamp != self._stamp:
+            if stamp is None:
+                # Return default configuration if the file doesn't exist
+                config = copy.deepcopy(DEFAULT_CONFIG)
+            else:
+                with open(self.path, 'r') as f:
+                    config = json.load(f)
+            self._config, self._stamp = config, stamp
+        return self._config
+
+    def load(self) -> dict:
+        """
+        Returns a copy of the configuration that the caller may modify.
+        """
+        return copy.deepcopy(self.get())
+
+    def save(self, config: dict):
+        """
+        Writes the configuration to a temporary file in the same directory,
+        fsyncs it and renames it over the old file, so a crash leaves either
+        the old or the new configuration and never a truncated one. The
+        file keeps its mode and owner.
+        """
+        write_atomic(self.path, json.dumps(config, indent=4), durable=True)
+        self._config, self._stamp = copy.deepcopy(config), self._current_stamp()
+
+    def watch(self, callback) -> "ConfigWatcher":
+        """
+        Calls ``callback(config)`` on the running event loop whenever the
+        configuration file changes. Uses inotify where available and falls
+        back to polling the file's stat otherwise.
+        """
+        watcher = ConfigWatcher(self, callback)
+        watcher.start()
+        return watcher
+
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class ConfigWatcher:
+    """
+    Pushes configuration changes to a callback.
+
+    The directory is watched rather than the file, because an atomic save
+    replaces the file's inode.
+    """
+
+    def __init__(self, store: ConfigStore, callback):
+        self.store = store
+        self.callback = callback
+        self._fd = None
+        self._poller = None
+        self._delivered = None
+
+    def start(self):
+        # Imported here so short CLI commands that only read the config stay light
+        import asyncio
+        loop = asyncio.get_running_loop()
+        self._delivered = self.store.get()
+        self._fd = self._inotify_watch(self.store.path.parent)
+        if self._fd is not None:
+            loop.add_reader(self._fd, self._on_inotify)
+        else:
+            self._poller = loop.create_task(self._poll())
+
+    def close(self):
+        import asyncio
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    @staticmethod
+    def _inotify_watch(directory: Path):
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _on_inotify(self):
+        name = os.fsencode(self.store.path.name)
+        relevant = False
+        while True:
+            try:
+                data = os.read(self._fd, 4096)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                if data[offset:offset + length].rstrip(b"\0") == name:
+                    relevant = True
+                offset += length
+        if relevant:
+            self._reload()
+
+    async def _poll(self):
+        import asyncio
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            self._reload()
+
+    def _reload(self):
+        try:
+            config = self.store.get()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable config file {self.store.path}: {e}")
+            return
+        # The store only hands out a new object when the file changed
+        if config is not self._delivered:
+            self._delivered = config
+            self.callback(config)
+
+
+_store = None
+
+
+def get_store() -> ConfigStore:
+    """
+    Returns the shared store for CONFIG_FILE.
+    """
+    global _store
+    if _store is None or _store.path != Path(CONFIG_FILE):
+        _store = ConfigStore(CONFIG_FILE)
+    return _store
+
+
 def load_config():
     """
     Load the configuration from the JSON file.
     If the file doesn't exist, return a default configuration.
     """
-    if CONFIG_FILE.exists():
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        # Return default configuration if the file doesn't exist
-        return {"allowed_devices": {}, "timeout": 300}
+    return get_store().load()
 
 def save_config(config):
     """
     Save the configuration dictionary to the JSON file.
     """
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=4)
+    get_store().save(config)
 
 def update_allowed_devices(device_address: str, name: str, manufacturer: str, nickname:str):
+    add_allowed_devices({device_address: {"name": name, "manufacturer": manufacturer, "nickname": nickname}})
+    print(f"Device {device_address} added to allowed devices.")
+
+
+def add_allowed_devices(devices: dict) -> list:
+    """
+    Adds several devices to the allowed list with a single read and one
+    atomic write, so the monitor sees them all appear at once.
+
+    Args:
+        devices (dict): MAC address -> {"name", "manufacturer", "nickname"}.
+
+    Returns:
+        list: The addresses that were added; ones already allowed are left
+            unchanged.
+    """
     config = load_config()
-    allowed_devices = config.get('allowed_devices', [])
-
-    # Add the new device if it's not already in the list
-    if device_address not in allowed_devices.keys():
-        new_device = {
-            "name": name,
-            "manufacturer": manufacturer,
-            "nickname": nickname
-        }
-        allowed_devices[device_address] = new_device
-        config['allowed_devices'] = allowed_devices
-
-        # Write back to the config file
+    allowed_devices = config.setdefault('allowed_devices', {})
+    added = [address for address in devices if address not in allowed_devices]
+    if added:
+        for address in added:
+            allowed_devices[address] = dict(devices[address])
         save_config(config)
+    return added
 
-    print(f"Device {device_address} added to allowed devices.")
 
-    
\ No newline at end of file
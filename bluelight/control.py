@@ -0,0 +1,194 @@
+# bluelight/control.py
+
+"""
+Unix domain socket RPC between the CLI and the running monitor.
+
+The protocol is one JSON object per line in each direction:
+
+    request:  {"cmd": "status", "args": {}}
+    response: {"ok": true, "result": {...}}  or  {"ok": false, "error": "..."}
+
+The client is plain blocking sockets so short CLI commands do not pay for
+importing asyncio.
+"""
+
+import json
+import os
+import socket
+from pathlib import Path
+
+# How long the CLI waits for the daemon before giving up, in seconds
+CLIENT_TIMEOUT = 2.0
+
+# Longest request line the server accepts
+MAX_REQUEST = 64 * 1024
+
+
+SOCKET_NAME = "bluelight.sock"
+
+# Created by RuntimeDirectory=bluelight in the systemd unit. Unlike
+# /run/user/<uid> it exists from boot, whether or not the user has logged in.
+SERVICE_RUNTIME_DIR = Path("/run/bluelight")
+
+
+def socket_path() -> Path:
+    """
+    Returns the path the monitor listens on: the unit's runtime directory
+    under systemd, $XDG_RUNTIME_DIR when it exists, otherwise a per-user
+    path in /tmp.
+    """
+    # Set by systemd for RuntimeDirectory=
+    runtime_dir = os.getenv("RUNTIME_DIRECTORY")
+    if runtime_dir:
+        return Path(runtime_dir.split(":")[0]) / SOCKET_NAME
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return Path(runtime_dir) / SOCKET_NAME
+    return Path(f"/tmp/bluelight-{os.getuid()}.sock")
+
+
+def socket_paths() -> list:
+    """
+    Returns every path a monitor may be listening on, this process's own
+    socket_path() first. The service binds its runtime directory while a
+    CLI in a login session sees a different environment, so clients try
+    them all.
+    """
+    paths = [socket_path(), SERVICE_RUNTIME_DIR / SOCKET_NAME]
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        paths.append(Path(runtime_dir) / SOCKET_NAME)
+    paths.append(Path(f"/tmp/bluelight-{os.getuid()}.sock"))
+    return list(dict.fromkeys(paths))
+
+
+class DaemonUnavailable(Exception):
+    """
+    Raised when no monitor is listening on the control socket.
+    """
+
+
+class ControlError(Exception):
+    """
+    Raised when the monitor rejects a request.
+    """
+
+
+def connect(paths: list, timeout: float) -> tuple:
+    """
+    Connects to the first of ``paths`` a monitor is listening on.
+
+    Returns:
+        tuple: The connected socket and its path.
+
+    Raises:
+        DaemonUnavailable: If none of them accepts a connection.
+    """
+    for path in paths:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(path))
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+            # Missing, or a stale socket left by a monitor that died
+            sock.close()
+            continue
+        return sock, path
+    raise DaemonUnavailable(f"No bluelight monitor is listening on {' or '.join(str(path) for path in paths)}")
+
+
+def request(command: str, timeout: float = CLIENT_TIMEOUT, path: Path = None, **args):
+    """
+    Sends one request to the running monitor and returns its result.
+
+    Args:
+        path (Path): Only try this socket instead of every socket_paths().
+
+    Raises:
+        DaemonUnavailable: If the monitor is not running.
+        ControlError: If the monitor reports an error.
+    """
+    sock, path = connect([path] if path else socket_paths(), timeout)
+    with sock:
+        data = b""
+        try:
+            sock.sendall(json.dumps({"cmd": command, "args": args}).encode() + b"\n")
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        except (TimeoutError, ConnectionError) as e:
+            raise DaemonUnavailable(f"The bluelight monitor on {path} did not respond") from e
+    if not data:
+        raise DaemonUnavailable(f"The bluelight monitor on {path} closed the connection")
+    response = json.loads(data)
+    if not response.get("ok"):
+        raise ControlError(response.get("error", "unknown error"))
+    return response.get("result")
+
+
+class ControlServer:
+    """
+    Serves requests from the CLI on the control socket.
+
+    ``handlers`` maps command names to callables (or coroutine functions)
+    taking the request's arguments as keywords and returning a
+    JSON-serialisable result.
+    """
+
+    def __init__(self, handlers: dict, path: Path = None):
+        self.handlers = handlers
+        self.path = Path(path or socket_path())
+        self._server = None
+
+    async def start(self):
+        import asyncio
+
+        # A socket file left behind by a crashed monitor would block the bind
+        if self.path.exists():
+            try:
+                request("ping", timeout=0.5, path=self.path)
+            except (DaemonUnavailable, OSError):
+                self.path.unlink()
+            else:
+                raise RuntimeError(f"Another bluelight monitor is already listening on {self.path}")
+        self._server = await asyncio.start_unix_server(self._serve, path=str(self.path), limit=MAX_REQUEST)
+        os.chmod(self.path, 0o600)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def _serve(self, reader, writer):
+        import inspect
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    handler = self.handlers.get(message.get("cmd"))
+                    if handler is None:
+                        raise ControlError(f"Unknown command {message.get('cmd')!r}")
+                    result = handler(**message.get("args", {}))
+                    if inspect.isawaitable(result):
+                        result = await result
+                    response = {"ok": True, "result": result}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # Client went away or sent an oversized line
+            pass
+        finally:
+            writer.close()
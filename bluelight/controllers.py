@@ -0,0 +1,157 @@
+# bluelight/controllers.py
+
+"""
+Classifies Bluetooth devices as game controllers.
+
+A device is matched on, in order of confidence: a known vendor/product ID
+from its modalias, its GAP appearance, its class of device, its icon, a
+HID service UUID, and finally a controller-like name. A HID service only
+counts when the appearance or class of device does not say the device is
+something else, such as a keyboard or mouse. Pairing scans also pass the
+HID service UUIDs to BlueZ so non-HID adverts never reach the process.
+"""
+
+import json
+import re
+
+# HID over GATT (LE) and the classic HID profile (BR/EDR)
+HID_OVER_GATT_UUID = "00001812-0000-1000-8000-00805f9b34fb"
+HID_PROFILE_UUID = "00001124-0000-1000-8000-00805f9b34fb"
+CONTROLLER_SERVICE_UUIDS = [HID_OVER_GATT_UUID, HID_PROFILE_UUID]
+
+# GAP appearance values in the HID category (0x03C0-0x03CF)
+APPEARANCE_HID_CATEGORY = 0x03C0 >> 6
+APPEARANCE_JOYSTICK = 0x03C3
+APPEARANCE_GAMEPAD = 0x03C4
+
+# Class of device: major class Peripheral, minor device type bits
+COD_MAJOR_PERIPHERAL = 0x05
+# Keyboard and pointing device bits of a peripheral's minor class
+COD_PERIPHERAL_KEYBOARD_POINTING = 0xC0
+COD_MINOR_JOYSTICK = 0x01
+COD_MINOR_GAMEPAD = 0x02
+
+CONTROLLER_ICON = "input-gaming"
+CONTROLLER_NAME_HINTS = ("controller", "gamepad", "joystick", "joy-con")
+
+MODALIAS_PATTERN = re.compile(r"v([0-9A-Fa-f]{4})p([0-9A-Fa-f]{4})")
+
+_controller_ids = None
+
+
+def _load_controller_ids() -> dict:
+    global _controller_ids
+    if _controller_ids is None:
+        # Only needed once a device has to be classified
+        from importlib import resources
+        with resources.open_text("bluelight", "controller_ids.json") as file:
+            _controller_ids = json.load(file)
+    return _controller_ids
+
+
+def known_controller(vendor_id: int, product_id: int):
+    """
+    Returns the product name for a vendor/product ID pair in the bundled
+    controller table, or None if it is not listed.
+    """
+    vendor = _load_controller_ids().get(f"{vendor_id:04x}")
+    if vendor is None:
+        return None
+    return vendor["products"].get(f"{product_id:04x}")
+
+
+def parse_modalias(modalias: str):
+    """
+    Extracts the (vendor_id, product_id) pair from a BlueZ modalias such as
+    ``usb:v045Ep0B13d0509``. Returns None if it cannot be parsed.
+    """
+    match = MODALIAS_PATTERN.search(modalias or "")
+    if match is None:
+        return None
+    return int(match.group(1), 16), int(match.group(2), 16)
+
+
+def classify(uuids=(), appearance=None, device_class=None, modalias=None, icon=None, name=None):
+    """
+    Decides whether a device is a game controller.
+
+    Args:
+        uuids: Service UUIDs the device advertises or exposes.
+        appearance (int): GAP appearance value.
+        device_class (int): Classic Bluetooth class of device.
+        modalias (str): BlueZ modalias carrying the vendor and product IDs.
+        icon (str): BlueZ icon name.
+        name (str): Device name.
+
+    Returns:
+        str: A short reason the device matched, or None if it does not look
+        like a controller.
+    """
+    ids = parse_modalias(modalias)
+    if ids is not None:
+        product = known_controller(*ids)
+        if product is not None:
+            return f"known controller ({product})"
+
+    if appearance is not None and appearance >> 6 == APPEARANCE_HID_CATEGORY:
+        if appearance in (APPEARANCE_JOYSTICK, APPEARANCE_GAMEPAD):
+            return "gamepad appearance"
+        # Keyboards, mice and other HID devices say so explicitly
+        if appearance != APPEARANCE_HID_CATEGORY << 6:
+            return None
+
+    # Whether the appearance or class names some other kind of device
+    other_device = appearance is not None and appearance != 0 and appearance >> 6 != APPEARANCE_HID_CATEGORY
+    if device_class is not None and device_class & 0x1FFC:
+        if (device_class >> 8) & 0x1F == COD_MAJOR_PERIPHERAL:
+            if (device_class >> 2) & 0x0F in (COD_MINOR_JOYSTICK, COD_MINOR_GAMEPAD):
+                return "gamepad device class"
+            other_device = other_device or bool(device_class & COD_PERIPHERAL_KEYBOARD_POINTING)
+        else:
+            other_device = True
+
+    if icon == CONTROLLER_ICON:
+        return "gaming icon"
+
+    # Many controllers advertise nothing but HID and a product name
+    if not other_device and any(uuid.lower() in CONTROLLER_SERVICE_UUIDS for uuid in uuids or ()):
+        return "HID service"
+    if name is not None and any(hint in name.lower() for hint in CONTROLLER_NAME_HINTS):
+        return "name"
+    return None
+
+
+def _unwrap(value):
+    # Accept both raw values and dbus_next Variants
+    return getattr(value, "value", value)
+
+
+def classify_properties(props: dict):
+    """
+    Classifies a device from its org.bluez.Device1 properties.
+    """
+    get = lambda key: _unwrap(props.get(key))
+    return classify(
+        uuids=get("UUIDs"),
+        appearance=get("Appearance"),
+        device_class=get("Class"),
+        modalias=get("Modalias"),
+        icon=get("Icon"),
+        name=get("Name") or get("Alias"),
+    )
+
+
+def classify_advertisement(device, advertisement_data):
+    """
+    Classifies a device from a Bleak scan result. On BlueZ the full Device1
+    properties are used when Bleak provides them.
+    """
+    platform_data = getattr(advertisement_data, "platform_data", None)
+    if isinstance(platform_data, tuple) and len(platform_data) == 2 and isinstance(platform_data[1], dict):
+        props = dict(platform_data[1])
+        props.setdefault("UUIDs", advertisement_data.service_uuids)
+        return classify_properties(props)
+    return classify(
+        uuids=advertisement_data.service_uuids,
+        name=device.name or advertisement_data.local_name,
+    )
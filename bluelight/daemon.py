@@ -0,0 +1,67 @@
+# bluelight/daemon.py
+
+"""
+Slim entry point for the resident monitor:
+
+    python -m bluelight.daemon [--bus-address ADDRESS] [--verbose] [--journald | --no-journald]
+
+It does the same as `bluelight run` but loads only dbus_next and the
+monitor core, not typer, rich, bleak or the pairing code, so the process
+that stays up for the machine's lifetime stays small. The systemd unit
+written by `bluelight daemon-start` runs this.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from bluelight.log import setup_logging
+
+
+async def serve(bus_address: str = None):
+    """
+    Runs the monitor until it is cancelled or the process gets SIGTERM.
+    """
+    from bluelight.bluetooth_monitor import monitor_bluetooth
+    # systemd stops the unit with SIGTERM; cancel the monitor so it stops
+    # moonlight-qt and saves its state instead of dying mid-flight
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        await monitor_bluetooth(bus_address=bus_address)
+    except asyncio.CancelledError:
+        pass
+
+
+def run(bus_address: str = None, verbose: bool = False, journald: bool = None):
+    """
+    Sets up logging and runs the monitor in the foreground.
+
+    Args:
+        bus_address (str): D-Bus address to monitor instead of the system bus.
+        verbose (bool): Also log battery, RSSI and other property changes.
+        journald (bool): Log to the systemd journal; None decides from the
+            environment.
+    """
+    # Log from a background thread so slow output never stalls the monitor
+    listener = setup_logging(logging.DEBUG if verbose else logging.INFO, journald=journald)
+    try:
+        asyncio.run(serve(bus_address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bluelight.daemon", description="Run the bluelight monitor.")
+    parser.add_argument("--bus-address", help="D-Bus address to monitor instead of the system bus.")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Also log battery, RSSI and other property changes.")
+    parser.add_argument("--journald", action=argparse.BooleanOptionalAction, default=None,
+                        help="Log to the systemd journal with structured fields. Defaults to on when running under systemd.")
+    options = parser.parse_args(argv)
+    run(options.bus_address, options.verbose, options.journald)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# bluelight/dbus_backend.py
+
+"""
+Talks to BlueZ and systemd over one shared system bus connection.
+
+This replaces forking `bluetoothctl` and `systemctl` for each call. Async
+code awaits the coroutines directly; synchronous CLI code goes through
+run_sync(), which keeps a private event loop so consecutive calls reuse
+the same connection.
+"""
+
+import asyncio
+
+from dbus_next import BusType, Message, MessageType, Variant
+from dbus_next.aio import MessageBus
+from dbus_next.errors import AuthError, InvalidAddressError
+
+BLUEZ_SERVICE_NAME = "org.bluez"
+ADAPTER_INTERFACE = "org.bluez.Adapter1"
+DEVICE_INTERFACE = "org.bluez.Device1"
+BATTERY_INTERFACE = "org.bluez.Battery1"
+OBJECT_MANAGER_INTERFACE = "org.freedesktop.DBus.ObjectManager"
+DBUS_PROPERTIES = "org.freedesktop.DBus.Properties"
+
+DBUS_SERVICE_NAME = "org.freedesktop.DBus"
+DBUS_PATH = "/org/freedesktop/DBus"
+DBUS_INTERFACE = "org.freedesktop.DBus"
+
+SYSTEMD_SERVICE_NAME = "org.freedesktop.systemd1"
+SYSTEMD_PATH = "/org/freedesktop/systemd1"
+SYSTEMD_MANAGER_INTERFACE = "org.freedesktop.systemd1.Manager"
+SYSTEMD_UNIT_INTERFACE = "org.freedesktop.systemd1.Unit"
+
+
+class BackendError(Exception):
+    """
+    Raised when BlueZ or systemd rejects a request, or the bus cannot be
+    reached at all.
+    """
+
+    def __init__(self, message: str, error_name: str = None):
+        super().__init__(message)
+        self.error_name = error_name
+
+
+_buses = {}
+_sync_loop = None
+
+
+async def get_bus(bus_address: str = None) -> MessageBus:
+    """
+    Returns the shared connection for the running event loop, connecting on
+    first use or after the previous connection dropped.
+
+    Args:
+        bus_address (str): D-Bus address to connect to instead of the system
+            bus, e.g. a private bus hosting a stand-in BlueZ.
+
+    Raises:
+        BackendError: If the bus cannot be reached.
+    """
+    loop = asyncio.get_running_loop()
+    bus, bus_loop = _buses.get(bus_address, (None, None))
+    if bus is None or bus_loop is not loop or not bus.connected:
+        try:
+            if bus_address is None:
+                bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+            else:
+                bus = await MessageBus(bus_address=bus_address).connect()
+        except (OSError, EOFError, AuthError, InvalidAddressError) as e:
+            raise BackendError(f"Cannot connect to the {'system' if bus_address is None else bus_address} bus: {e}") from e
+        _buses[bus_address] = (bus, loop)
+    return bus
+
+
+def run_sync(coro):
+    """
+    Runs a backend coroutine from synchronous code.
+    """
+    global _sync_loop
+    if _sync_loop is None or _sync_loop.is_closed():
+        _sync_loop = asyncio.new_event_loop()
+    return _sync_loop.run_until_complete(coro)
+
+
+async def call(destination: str, path: str, interface: str, member: str, signature: str = "", body=None, bus=None):
+    """
+    Calls a D-Bus method and returns the reply body.
+
+    Raises:
+        BackendError: If the call returns a D-Bus error or the connection
+            fails.
+    """
+    bus = bus or await get_bus()
+    try:
+        reply = await bus.call(Message(
+            destination=destination,
+            path=path,
+            interface=interface,
+            member=member,
+            signature=signature,
+            body=body or [],
+        ))
+    except (OSError, EOFError) as e:
+        raise BackendError(f"{interface}.{member} failed: lost the bus connection: {e!r}") from e
+    if reply.message_type == MessageType.ERROR:
+        text = reply.body[0] if reply.body else reply.error_name
+        raise BackendError(f"{interface}.{member} failed: {text}", reply.error_name)
+    return reply.body
+
+
+async def get_managed_objects(bus=None) -> dict:
+    """
+    Returns all BlueZ managed objects in a single round trip.
+    """
+    body = await call(BLUEZ_SERVICE_NAME, "/", OBJECT_MANAGER_INTERFACE, "GetManagedObjects", bus=bus)
+    return body[0]
+
+
+async def add_match(rule: str, bus=None):
+    """
+    Registers a match rule with the bus daemon so matching signals are
+    delivered to this connection.
+    """
+    await call(DBUS_SERVICE_NAME, DBUS_PATH, DBUS_INTERFACE, "AddMatch", "s", [rule], bus=bus)
+
+
+async def name_has_owner(name: str, bus=None) -> bool:
+    """
+    Returns whether a well-known name is currently owned. Unlike calling the
+    service, this never triggers bus activation.
+    """
+    [owned] = await call(DBUS_SERVICE_NAME, DBUS_PATH, DBUS_INTERFACE, "NameHasOwner", "s", [name], bus=bus)
+    return owned
+
+
+async def get_device_property(path: str, name: str, bus=None):
+    """
+    Reads a single org.bluez.Device1 property, or returns None if the device
+    is gone.
+    """
+    try:
+        body = await call(BLUEZ_SERVICE_NAME, path, DBUS_PROPERTIES, "Get", "ss",
+                          [DEVICE_INTERFACE, name], bus=bus)
+    except BackendError:
+        return None
+    return body[0].value
+
+
+def adapter_name(path: str) -> str:
+    """
+    Returns the short name (e.g. "hci0") of an adapter object path.
+    """
+    return path.rsplit("/", 1)[-1]
+
+
+async def list_adapters(bus=None) -> dict:
+    """
+    Returns the Bluetooth adapters, keyed by short name, with their object
+    path, address and Powered/Discovering state.
+    """
+    adapters = {}
+    for path, interfaces in (await get_managed_objects(bus)).items():
+        adapter_props = interfaces.get(ADAPTER_INTERFACE)
+        if adapter_props is None:
+            continue
+        adapters[adapter_name(path)] = {
+            "path": path,
+            "address": adapter_props["Address"].value if "Address" in adapter_props else None,
+            "powered": adapter_props["Powered"].value if "Powered" in adapter_props else False,
+            "discovering": adapter_props["Discovering"].value if "Discovering" in adapter_props else False,
+        }
+    return adapters
+
+
+async def resolve_adapter(adapter: str, bus=None) -> str:
+    """
+    Returns the short name of an adapter given its name or its address.
+    Addresses stay the same when adapters are renumbered across reboots.
+
+    Raises:
+        BackendError: If no such adapter exists.
+    """
+    for name, info in (await list_adapters(bus)).items():
+        if adapter == name or (info["address"] or "").upper() == adapter.upper():
+            return name
+    raise BackendError(f"Bluetooth adapter {adapter} not found", "org.bluez.Error.DoesNotExist")
+
+
+async def find_devices(address: str, adapter: str = None, bus=None) -> list:
+    """
+    Returns the object path and properties of every BlueZ device with the
+    given MAC address. The same device can be known to several adapters;
+    pass an adapter's short name to only look on that one.
+
+    Raises:
+        BackendError: If BlueZ does not know the device.
+    """
+    found = []
+    for path, interfaces in (await get_managed_objects(bus)).items():
+        device_props = interfaces.get(DEVICE_INTERFACE)
+        if not device_props or device_props["Address"].value.upper() != address.upper():
+            continue
+        if adapter is None or adapter_name(device_props["Adapter"].value) == adapter:
+            found.append((path, device_props))
+    if not found:
+        raise BackendError(f"Device {address} is not known to BlueZ", "org.bluez.Error.DoesNotExist")
+    return found
+
+
+async def find_device(address: str, adapter: str = None, bus=None):
+    """
+    Returns the object path and properties of the BlueZ device with the
+    given MAC address, on the given adapter if one is named.
+
+    Raises:
+        BackendError: If BlueZ does not know the device.
+    """
+    return (await find_devices(address, adapter, bus))[0]
+
+
+async def set_trusted(address: str, trusted: bool = True, adapter: str = None, bus=None):
+    """
+    Sets org.bluez.Device1.Trusted for a device.
+    """
+    path, _ = await find_device(address, adapter, bus)
+    await call(BLUEZ_SERVICE_NAME, path, DBUS_PROPERTIES, "Set", "ssv",
+               [DEVICE_INTERFACE, "Trusted", Variant("b", trusted)], bus=bus)
+
+
+async def remove_device(address: str, adapter: str = None, bus=None):
+    """
+    Removes a device from every adapter that knows it (or only the given
+    one), forgetting its pairing.
+    """
+    for path, device_props in await find_devices(address, adapter, bus):
+        await call(BLUEZ_SERVICE_NAME, device_props["Adapter"].value, ADAPTER_INTERFACE,
+                   "RemoveDevice", "o", [path], bus=bus)
+
+
+async def unit_active_state(unit: str, bus=None) -> str:
+    """
+    Returns a systemd unit's ActiveState, or "inactive" if it is not loaded.
+    """
+    try:
+        [unit_path] = await call(SYSTEMD_SERVICE_NAME, SYSTEMD_PATH, SYSTEMD_MANAGER_INTERFACE,
+                                 "GetUnit", "s", [unit], bus=bus)
+    except BackendError as e:
+        if e.error_name == "org.freedesktop.systemd1.NoSuchUnit":
+            return "inactive"
+        raise
+    [state] = await call(SYSTEMD_SERVICE_NAME, unit_path, DBUS_PROPERTIES, "Get", "ss",
+                         [SYSTEMD_UNIT_INTERFACE, "ActiveState"], bus=bus)
+    return state.value
+
+
+async def unit_file_state(unit: str, bus=None) -> str:
+    """
+    Returns a systemd unit file's state (e.g. "enabled", "disabled"), or
+    "not-found" if there is no such unit file.
+    """
+    try:
+        [state] = await call(SYSTEMD_SERVICE_NAME, SYSTEMD_PATH, SYSTEMD_MANAGER_INTERFACE,
+                             "GetUnitFileState", "s", [unit], bus=bus)
+    except BackendError as e:
+        if e.error_name in ("org.freedesktop.DBus.Error.FileNotFound", "org.freedesktop.systemd1.NoSuchUnit"):
+            return "not-found"
+        raise
+    return state
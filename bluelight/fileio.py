@@ -0,0 +1,66 @@
+# bluelight/fileio.py
+
+"""
+Atomic file replacement shared by the config, telemetry and metrics files.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+# Mode of a file written for the first time
+DEFAULT_MODE = 0o644
+
+
+def write_atomic(path: Path, data, mode: int = None, durable: bool = False):
+    """
+    Replaces a file through a temporary file in the same directory, so a
+    crash leaves either the old or the new contents and never a truncated
+    file.
+
+    The new file keeps the old one's mode and, where allowed, its owner, so
+    saving as another user (e.g. the CLI under sudo) does not lock the
+    monitor out of its own files.
+
+    Args:
+        path (Path): The file to replace.
+        data (str | bytes): The new contents.
+        mode (int): Permissions to set instead of the old file's.
+        durable (bool): fsync the file and the rename before returning.
+    """
+    path = Path(path)
+    try:
+        old = os.stat(path)
+    except FileNotFoundError:
+        old = None
+    fd, temp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        # mkstemp always creates the file 0600
+        if mode is None:
+            mode = old.st_mode & 0o7777 if old is not None else DEFAULT_MODE
+        os.fchmod(fd, mode)
+        if old is not None and (old.st_uid, old.st_gid) != (os.geteuid(), os.getegid()):
+            try:
+                os.fchown(fd, old.st_uid, old.st_gid)
+            except PermissionError:
+                # Only root may give a file away; keep ours
+                pass
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if durable:
+        # Make the rename itself durable
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
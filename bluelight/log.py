@@ -0,0 +1,191 @@
+# bluelight/log.py
+
+"""
+Logging for the long-running monitor.
+
+Records are put on a queue by the event loop and written by a background
+thread, so a slow journal or SD card never stalls D-Bus signal dispatch.
+Under systemd the writer speaks journald's native protocol and attaches
+structured fields, passed through ``extra``:
+
+    logger.info(f"Device connected: {mac}", extra={"mac": mac, "event": "connected"})
+
+Nothing here runs at import; the CLI keeps Python's default logging unless
+the monitor calls setup_logging().
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import socket
+import struct
+import time
+
+LOG_FORMAT = '%(asctime)s %(levelname)s:%(message)s'
+
+JOURNAL_SOCKET = "/run/systemd/journal/socket"
+SYSLOG_IDENTIFIER = "bluelight"
+
+# Record attributes accepted through ``extra`` and the journal fields they become
+STRUCTURED_FIELDS = {
+    "mac": "MAC_ADDRESS",
+    "event": "BLUELIGHT_EVENT",
+    "latency": "LATENCY_MS",
+}
+
+# Below WARNING, each call site may log this many records per device in
+# every window; the rest are counted and reported with the next one let through
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_INTERVAL = 10.0
+
+SYSLOG_PRIORITIES = (
+    (logging.CRITICAL, 2),
+    (logging.ERROR, 3),
+    (logging.WARNING, 4),
+    (logging.INFO, 6),
+)
+
+
+def journal_available() -> bool:
+    """
+    Returns True if stderr is connected to the systemd journal, as it is
+    for a service started by systemd, and the native socket is present.
+    """
+    stream = os.getenv("JOURNAL_STREAM")
+    if not stream or not os.path.exists(JOURNAL_SOCKET):
+        return False
+    try:
+        device, inode = (int(part) for part in stream.split(":"))
+        stderr = os.fstat(2)
+    except (ValueError, OSError):
+        return False
+    return (stderr.st_dev, stderr.st_ino) == (device, inode)
+
+
+def encode_journal_fields(fields: dict) -> bytes:
+    """
+    Serialises fields in the journal's native protocol. Values containing a
+    newline use the length-prefixed binary form.
+    """
+    data = bytearray()
+    for name, value in fields.items():
+        value = str(value).encode()
+        if b"\n" in value:
+            data += name.encode() + b"\n" + struct.pack("<Q", len(value)) + value + b"\n"
+        else:
+            data += name.encode() + b"=" + value + b"\n"
+    return bytes(data)
+
+
+class JournaldHandler(logging.Handler):
+    """
+    Sends records straight to journald with their structured fields.
+    """
+
+    def __init__(self, path: str = JOURNAL_SOCKET):
+        super().__init__()
+        self.path = path
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def emit(self, record):
+        try:
+            fields = {
+                "MESSAGE": self.format(record),
+                "PRIORITY": next((priority for level, priority in SYSLOG_PRIORITIES if record.levelno >= level), 7),
+                "SYSLOG_IDENTIFIER": SYSLOG_IDENTIFIER,
+                "LOGGER": record.name,
+                "CODE_FILE": record.pathname,
+                "CODE_LINE": record.lineno,
+                "CODE_FUNC": record.funcName,
+            }
+            for attribute, field in STRUCTURED_FIELDS.items():
+                value = getattr(record, attribute, None)
+                if value is None:
+                    continue
+                if attribute == "latency":
+                    # Recorded in seconds, like the metrics
+                    value = f"{value * 1000:.3f}"
+                fields[field] = value
+            self.socket.sendto(encode_journal_fields(fields), self.path)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.socket.close()
+        super().close()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drops records from a call site that logs more than ``burst`` times per
+    device within ``interval`` seconds. Warnings and errors always pass.
+    """
+
+    def __init__(self, burst: int = RATE_LIMIT_BURST, interval: float = RATE_LIMIT_INTERVAL, max_keys: int = 1024):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.max_keys = max_keys
+        # (file, line, mac) -> [window start, records passed, records dropped]
+        self._windows = {}
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno, getattr(record, "mac", None))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window is not None else 0
+            if window is None and len(self._windows) >= self.max_keys:
+                self._windows.clear()
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+                record.args = None
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+def setup_logging(level: int = logging.INFO, journald: bool = None) -> logging.handlers.QueueListener:
+    """
+    Routes the root logger through a queue to a background writer thread.
+
+    Args:
+        level (int): The root logger's level.
+        journald (bool): Write to the systemd journal with structured fields
+            instead of stderr. By default this is done when stderr is already
+            connected to the journal.
+
+    Returns:
+        QueueListener: The running writer. Call stop() before exiting to
+        flush pending records.
+    """
+    if journald is None:
+        journald = journal_available()
+    if journald:
+        handler = JournaldHandler()
+        # The journal timestamps and prioritises entries itself
+        handler.setFormatter(logging.Formatter('%(message)s'))
+    else:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,34 +1,44 @@
 # bluelight/main.py
 
 import typer
-import asyncio
 import subprocess
-from bluelight.config import load_config, save_config
-from bluelight.bluetooth_monitor import monitor_bluetooth, pair_new_controller
-from rich.console import Console
-from rich.prompt import Prompt
+import sys
 from pathlib import Path
-from bluelight.utils import get_original_user_info, is_service_active, is_service_enabled
+from bluelight.config import load_config, save_config
+
+# Commands import their heavy dependencies (bleak, dbus_next, rich and the
+# monitor) when they run, so short commands like `list` and `timeout` start
+# without loading the Bluetooth stack.
 
 # Create a Typer application instance
 app = typer.Typer()
-console = Console()
-user, home_dir, uid = get_original_user_info()
 # Paths to systemd files
 SERVICE_NAME = "bluelight.service"
 SERVICE_FILE_PATH = f"/etc/systemd/system/{SERVICE_NAME}"
-SERVICE_CONTENT = f"""
+SERVICE_TEMPLATE = """
 [Unit]
 Description=Bluelight Daemon Service
-After=network.target
+# Start once bluetoothd is up instead of racing it at boot
+Wants=bluetooth.target
+After=bluetooth.target dbus.service
 
 [Service]
-ExecStart=bluelight run
+# The monitor reports READY=1 after its first BlueZ sync and pings the
+# watchdog from its event loop; a hung monitor is restarted. It runs
+# through the slim entry point, which leaves out the CLI and pairing code.
+Type=notify
+NotifyAccess=main
+WatchdogSec=30
+ExecStart={python} -m bluelight.daemon
 Restart=always
+RestartSec=2
 User={user}
 Group={user}
 WorkingDirectory={home_dir}
 Environment=XDG_RUNTIME_DIR=/run/user/{uid}
+# /run/bluelight for the control socket; it exists before the user logs in
+RuntimeDirectory=bluelight
+RuntimeDirectoryMode=0700
 #AmbientCapabilities=CAP_NET_ADMIN CAP_NET_RAW
 #NoNewPrivileges=true
 BusName=bluelight
@@ -38,20 +48,46 @@ WantedBy=default.target
 """
 
 
+def get_console():
+    """
+    Returns a Rich console, importing Rich only when output needs it.
+    """
+    from rich.console import Console
+    return Console()
+
+
+def service_content() -> str:
+    """
+    Builds the systemd unit file for the user the service should run as.
+    """
+    from bluelight.utils import get_original_user_info
+    user, home_dir, uid = get_original_user_info()
+    return SERVICE_TEMPLATE.format(user=user, home_dir=home_dir, uid=uid, python=sys.executable)
+
+
 @app.command()
 def daemon_start():
     """
     Creates a systemd service to run bluelight as a daemon on startup.
     """
+    from bluelight.utils import is_service_enabled
+    service_file = Path(SERVICE_FILE_PATH)
+    content = service_content()
     # Check if the service is already enabled
     if is_service_enabled(SERVICE_NAME):
-        typer.echo(f"Service '{SERVICE_NAME}' is already set up and enabled.")
+        if service_file.exists() and service_file.read_text() == content:
+            typer.echo(f"Service '{SERVICE_NAME}' is already set up and enabled.")
+            return
+        # Written by an older version; bring the unit up to date
+        service_file.write_text(content)
+        subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+        subprocess.run(["sudo", "systemctl", "restart", SERVICE_NAME], check=True)
+        typer.echo(f"Service '{SERVICE_NAME}' updated and restarted.")
         return
-    service_file = Path(SERVICE_FILE_PATH)
-    
+
     # Write the service file content
     with open(service_file, 'w') as f:
-        f.write(SERVICE_CONTENT)
+        f.write(content)
     
     # Set permissions and enable service
     subprocess.run(["sudo", "chmod", "644", SERVICE_FILE_PATH], check=True)
@@ -66,6 +102,7 @@ def daemon_stop():
     """
     Removes the systemd service for bluelight and disables it from startup if it exists.
     """
+    from bluelight.utils import is_service_active, is_service_enabled
 
     # Check if the service is active before stopping it
     if is_service_active(SERVICE_NAME):
@@ -98,21 +135,85 @@ def timeout(seconds: int):
     Args:
         seconds (int): Timeout duration in seconds.
     """
-    # Load existing configuration
-    config = load_config()
-    # Update the timeout value
-    config["timeout"] = seconds
-    # Save the updated configuration
-    save_config(config)
+    from bluelight import control
+    try:
+        # The running monitor applies and saves it in place
+        control.request("set_timeout", seconds=seconds)
+    except control.DaemonUnavailable:
+        # Load existing configuration
+        config = load_config()
+        # Update the timeout value
+        config["timeout"] = seconds
+        # Save the updated configuration
+        save_config(config)
+    except control.ControlError as e:
+        get_console().print(f"[bold red]{e}[/bold red]")
+        raise typer.Exit(code=1)
     typer.echo(f"Set timeout to {seconds} seconds")
 
 @app.command()
-def pair():
+def adapter(name: str = typer.Argument(None, help="Adapter to use, by name (e.g. hci1) or address. Use 'all' to use every adapter.")):
+    """
+    Shows the Bluetooth adapters, or chooses the one to pair and monitor on.
+    """
+    from bluelight import control, dbus_backend
+    console = get_console()
+    if name is None:
+        try:
+            adapters = dbus_backend.run_sync(dbus_backend.list_adapters())
+        except dbus_backend.BackendError as e:
+            console.print(f"[bold red]Could not list Bluetooth adapters. Error: {e}[/bold red]")
+            raise typer.Exit(code=1)
+        selected = load_config().get("adapter")
+        if not adapters:
+            typer.echo("No Bluetooth adapters found.")
+            return
+        for adapter_name, info in sorted(adapters.items()):
+            in_use = not selected or selected in (adapter_name, info["address"])
+            flags = ["powered" if info["powered"] else "[bold red]off[/bold red]"]
+            if info["discovering"]:
+                flags.append("discovering")
+            marker = "[bold green]*[/bold green]" if in_use else " "
+            console.print(f"{marker} [bold]{adapter_name}[/bold] ({info['address']}) : {', '.join(flags)}")
+        typer.echo(f"Using {selected if selected else 'every adapter'}.")
+        return
+
+    selected = None if name == "all" else name
+    try:
+        # The running monitor checks the adapter exists and switches over in place
+        control.request("set_adapter", adapter=selected)
+    except control.DaemonUnavailable:
+        if selected is not None:
+            try:
+                dbus_backend.run_sync(dbus_backend.resolve_adapter(selected))
+            except dbus_backend.BackendError as e:
+                console.print(f"[bold red]{e}[/bold red]")
+                raise typer.Exit(code=1)
+        config = load_config()
+        config["adapter"] = selected
+        save_config(config)
+    except control.ControlError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        raise typer.Exit(code=1)
+    typer.echo(f"Pairing and monitoring on {selected if selected else 'every adapter'}")
+
+@app.command()
+def pair(
+    auto: bool = typer.Option(False, "--auto", help="Connect to the first likely controller seen instead of asking."),
+    scan_time: float = typer.Option(10.0, help="Longest time to scan for devices, in seconds."),
+    all_devices: bool = typer.Option(False, "--all", help="Show every nearby device, not just controllers."),
+    adapter: str = typer.Option(None, help="Adapter to scan on, by name (e.g. hci1) or address. Defaults to the configured one."),
+    batch: bool = typer.Option(False, "--batch", help="Pair several controllers from one scan. With --auto, pairs every controller seen."),
+    concurrency: int = typer.Option(3, min=1, help="Most controllers to connect to at once with --batch."),
+):
     """
     Puts the application into pairing mode to pair new controllers.
     """
-    typer.echo("Entering pairing mode. Please make your controller discoverable.")
-    asyncio.run(pair_new_controller())
+    import asyncio
+    from bluelight.pairing import pair_new_controller
+    typer.echo(f"Entering pairing mode. Please make your controller{'s' if batch else ''} discoverable.")
+    asyncio.run(pair_new_controller(auto_select=auto, scan_timeout=scan_time, controllers_only=not all_devices, adapter=adapter,
+                                   batch=batch, concurrency=concurrency))
     typer.echo("Pairing mode complete.")
 
 @app.command()
@@ -120,6 +221,8 @@ def unpair():
     """
     Removes one of the devices from your list.
     """
+    from rich.prompt import Prompt
+    console = get_console()
     config = load_config()
     allowed_devices = config.get("allowed_devices")
     device_list = []
@@ -153,12 +256,21 @@ def unpair():
 
     console.print(f"[bold orange] Removing device {selected_name} ({selected_address})...[/bold orange]")
     allowed_devices.pop(selected_address)
+    from bluelight import dbus_backend
     try:
-        subprocess.run(["bluetoothctl", "remove", selected_address], check=True)
+        dbus_backend.run_sync(dbus_backend.remove_device(selected_address))
         console.print(f"[bold green] Device {selected_name} ({selected_address}) has been successfully removed[/bold green]")
-        config["allowed_devices"] = allowed_devices
-        save_config(config)
-    except subprocess.CalledProcessError as e:
+        from bluelight import control
+        try:
+            # The running monitor forgets it in place and saves the config
+            control.request("forget_device", address=selected_address)
+        except control.DaemonUnavailable:
+            config["allowed_devices"] = allowed_devices
+            save_config(config)
+        except control.ControlError as e:
+            console.print(f"[bold red]The monitor could not forget {selected_address}: {e}[/bold red]")
+            raise typer.Exit(code=1)
+    except dbus_backend.BackendError as e:
         console.print(f"[bold red]Failed to remove {selected_name} ({selected_address}). Error: {e}[/bold red]")
 
 @app.command()
@@ -166,11 +278,18 @@ def list():
     """
     Lists all paired Bluetooth controllers known by bluelight.
     """
-    # Load the current configuration
-    config = load_config()
-    
-    # Retrieve the list of paired devices
-    paired_devices = config.get("allowed_devices", {})
+    from bluelight import control
+    try:
+        # Prefer the running monitor's in-memory view, which knows what is connected
+        live = control.request("status")
+        paired_devices = live["allowed_devices"]
+        connected = set(live["connected"])
+    except control.DaemonUnavailable:
+        # Load the current configuration
+        config = load_config()
+        # Retrieve the list of paired devices
+        paired_devices = config.get("allowed_devices", {})
+        connected = set()
 
     # If there are no paired devices, inform the user
     if not paired_devices:
@@ -179,20 +298,181 @@ def list():
 
     # Display each paired device with its nickname (if available)
     typer.echo("Paired Bluetooth Controllers:")
+    console = get_console()
     for mac_address, device_info in paired_devices.items():
         display_name = device_info.get("name")
         manufacturer_name = device_info.get("manufacturer")
         nickname = device_info.get("nickname")
-        console.print(f"    [bold]{nickname}[/bold] : {display_name} : {manufacturer_name} : ({mac_address})")
+        state = " : [bold green]connected[/bold green]" if mac_address in connected else ""
+        console.print(f"    [bold]{nickname}[/bold] : {display_name} : {manufacturer_name} : ({mac_address}){state}")
+
+@app.command()
+def status():
+    """
+    Shows the running monitor's live state: connected controllers,
+    moonlight-qt and pending shutdowns.
+    """
+    from bluelight import control
+    try:
+        live = control.request("status")
+    except control.DaemonUnavailable:
+        typer.echo("The bluelight monitor is not running. Start it with `bluelight run` or `bluelight daemon-start`.")
+        raise typer.Exit(code=1)
+
+    console = get_console()
+    moonlight = live["moonlight"]
+    if moonlight["running"]:
+        prewarmed = f", prewarmed for {moonlight['prewarmed_for']}" if moonlight.get("prewarmed_for") else ""
+        console.print(f"moonlight-qt: [bold green]running[/bold green] (pid {moonlight['pid']}{prewarmed})")
+    else:
+        console.print("moonlight-qt: [bold]stopped[/bold]")
+    console.print(f"Disconnect timeout: {live['timeout']} seconds")
+    adapters = live.get("adapters", {})
+    if adapters:
+        states = [f"{name} ({'on' if info['powered'] else 'off'}{', discovering' if info['discovering'] else ''})"
+                  for name, info in sorted(adapters.items())]
+        console.print(f"Adapters: {', '.join(states)}; using {live.get('adapter') or 'all'}")
+    if live.get("recovering"):
+        console.print("[yellow]Waiting for BlueZ or the system bus to come back; states may be stale[/yellow]")
+    actions = live.get("actions", {})
+    if actions.get("running") or actions.get("queued"):
+        console.print(f"Actions: {actions['running']} running, {actions['queued']} queued")
+
+    from rich.table import Table
+    table = Table(title="Controllers")
+    for column in ("Nickname", "Name", "Address", "Battery", "State"):
+        table.add_column(column)
+    pending = live["pending_shutdowns"]
+    battery = live.get("battery", {})
+    for mac_address, device_info in live["allowed_devices"].items():
+        if mac_address in live["connected"]:
+            state = f"[bold green]connected[/bold green] ({', '.join(live['connected'][mac_address])})"
+        elif mac_address in pending:
+            state = f"[yellow]disconnected, stopping moonlight-qt in {pending[mac_address]:.0f}s[/yellow]"
+        else:
+            state = "disconnected"
+        level = battery.get(mac_address)
+        table.add_row(device_info.get("nickname", ""), device_info.get("name", ""), mac_address,
+                      f"{level}%" if level is not None else "-", state)
+    console.print(table)
+
+# Characters for the battery trend, lowest to highest
+SPARKS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values) -> str:
+    return "".join(SPARKS[min(len(SPARKS) - 1, max(0, value) * len(SPARKS) // 101)] for value in values)
+
+@app.command()
+def history(
+    address: str = typer.Argument(None, help="Controller to show samples for. Omit for a summary of every controller."),
+    tier: str = typer.Option("raw", help="Sample resolution: raw, minute or hour."),
+    limit: int = typer.Option(20, help="Most recent samples to show per series."),
+):
+    """
+    Shows recorded battery, signal strength and connection history.
+    """
+    from datetime import datetime
+    from bluelight import control
+    from bluelight.telemetry import Telemetry, TIER_NAMES
+    if tier not in TIER_NAMES:
+        typer.echo(f"Unknown tier {tier!r}; use one of {', '.join(TIER_NAMES)}")
+        raise typer.Exit(code=1)
+    try:
+        # The running monitor has samples not yet saved to disk
+        data = control.request("history", address=address, tier=tier)
+    except control.DaemonUnavailable:
+        try:
+            telemetry = Telemetry.load()
+        except ValueError as e:
+            typer.echo(str(e))
+            raise typer.Exit(code=1)
+        if address is None:
+            data = {mac_address: device.summary() for mac_address, device in telemetry.devices.items()}
+        elif address in telemetry.devices:
+            data = telemetry.devices[address].history(TIER_NAMES.index(tier))
+        else:
+            typer.echo(f"No history for {address}")
+            raise typer.Exit(code=1)
+    except control.ControlError as e:
+        typer.echo(str(e))
+        raise typer.Exit(code=1)
+
+    from rich.table import Table
+    console = get_console()
+    allowed_devices = load_config().get("allowed_devices", {})
+
+    def when(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else "-"
+
+    if address is None:
+        if not data:
+            typer.echo("No controller history recorded yet.")
+            return
+        table = Table(title="Controller history")
+        for column in ("Nickname", "Address", "Battery", "RSSI", "Last event"):
+            table.add_column(column)
+        for mac_address, summary in data.items():
+            nickname = allowed_devices.get(mac_address, {}).get("nickname", "")
+            battery = f"{summary['battery']}% at {when(summary['battery_time'])}" if summary["battery"] is not None else "-"
+            rssi = f"{summary['rssi']} dBm" if summary["rssi"] is not None else "-"
+            event = f"{summary['last_event']} at {when(summary['last_event_time'])}" if summary["last_event"] else "-"
+            table.add_row(nickname, mac_address, battery, rssi, event)
+        console.print(table)
+        return
+
+    battery = data["battery"][-limit:]
+    if battery:
+        console.print(f"Battery trend ({tier}): {sparkline(value for _, value in battery)}")
+    for title, samples, unit in (("Battery", battery, "%"), ("RSSI", data["rssi"][-limit:], " dBm"), ("Connections", data["events"][-limit:], "")):
+        table = Table(title=f"{title} ({address})")
+        table.add_column("Time")
+        table.add_column("Value", justify="right")
+        for timestamp, value in samples:
+            table.add_row(when(timestamp), f"{value}{unit}")
+        console.print(table)
+
+@app.command()
+def stats(raw: bool = typer.Option(False, "--raw", help="Print the Prometheus text file as-is.")):
+    """
+    Shows connect-to-launch and disconnect latency recorded by the running monitor.
+    """
+    from bluelight.metrics import METRICS_FILE, parse_histograms, estimate_quantile
+    if not METRICS_FILE.exists():
+        typer.echo(f"No metrics found at {METRICS_FILE}. Is `bluelight run` running?")
+        raise typer.Exit(code=1)
+    text = METRICS_FILE.read_text()
+    if raw:
+        typer.echo(text, nl=False)
+        return
+
+    from rich.table import Table
+    table = Table(title="Bluelight latency (ms)")
+    table.add_column("Metric")
+    for column in ("Count", "Mean", "p50", "p95", "p99"):
+        table.add_column(column, justify="right")
+    for name, histogram in parse_histograms(text).items():
+        count = histogram["count"]
+        cells = [str(count)]
+        if count:
+            cells.append(f"{histogram['sum'] / count * 1000:.2f}")
+            for q in (0.5, 0.95, 0.99):
+                value = estimate_quantile(histogram["bounds"], histogram["counts"], count, q)
+                cells.append(f"<= {value * 1000:g}" if value != float("inf") else "> max")
+        else:
+            cells += ["-"] * 4
+        table.add_row(name.removeprefix("bluelight_").removesuffix("_seconds"), *cells)
+    get_console().print(table)
 
 @app.command()
-def run():
+def run(bus_address: str = typer.Option(None, help="D-Bus address to monitor instead of the system bus."),
+        verbose: bool = typer.Option(False, "--verbose", "-v", help="Also log battery, RSSI and other property changes."),
+        journald: bool = typer.Option(None, "--journald/--no-journald", help="Log to the systemd journal with structured fields. Defaults to on when running under systemd.")):
     """
     Start the Bluetooth monitoring service.
     """
+    from bluelight import daemon
     typer.echo("Starting Bluetooth monitor...")
-    # Run the monitor asynchronously
-    asyncio.run(monitor_bluetooth())
+    daemon.run(bus_address, verbose, journald)
 
 if __name__ == "__main__":
     # Run the Typer app when the script is executed
@@ -0,0 +1,184 @@
+# bluelight/metrics.py
+
+"""
+Fixed-size latency histograms for the monitor.
+
+Observations only bisect a bucket and bump a counter, so they are cheap
+enough to take inside D-Bus callbacks. The histograms are exported in the
+Prometheus text format, which `bluelight stats` reads back.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from bluelight.fileio import write_atomic
+
+# Where the running monitor writes its metrics. Point a node_exporter
+# textfile collector at this file to scrape it.
+METRICS_FILE = Path.home() / '.bluelight_metrics.prom'
+
+# How often the monitor rewrites the metrics file, in seconds
+EXPORT_INTERVAL = 15.0
+
+# Upper bounds in seconds; a final +Inf bucket is implicit
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Recovery includes waiting for bluetoothd to come back, so it runs longer
+RECOVERY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    A Prometheus-style histogram with fixed bucket bounds.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.bounds = tuple(buckets)
+        self.counts = array('Q', [0] * (len(self.bounds) + 1))
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+        """
+        return estimate_quantile(self.bounds, self.counts, self.count, q)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return "\n".join(lines)
+
+
+def estimate_quantile(bounds, counts, total: int, q: float) -> float:
+    if total == 0:
+        return float("nan")
+    target = q * total
+    cumulative = 0
+    for bound, bucket_count in zip(bounds, counts):
+        cumulative += bucket_count
+        if cumulative >= target:
+            return bound
+    return float("inf")
+
+
+class MonitorMetrics:
+    """
+    The latency histograms recorded by monitor_bluetooth.
+    """
+
+    def __init__(self):
+        self.signal_dispatch = Histogram(
+            "bluelight_signal_dispatch_seconds",
+            "Time from receiving a Connected change to dispatching it to the device handler.")
+        self.launch_latency = Histogram(
+            "bluelight_launch_latency_seconds",
+            "Time from receiving Connected=true to moonlight-qt being spawned.")
+        self.disconnect_handling = Histogram(
+            "bluelight_disconnect_handling_seconds",
+            "Time from receiving Connected=false to the shutdown being scheduled.")
+        self.stop_duration = Histogram(
+            "bluelight_stop_seconds",
+            "Time from asking moonlight-qt to stop to the process exiting.")
+        self.recovery = Histogram(
+            "bluelight_recovery_seconds",
+            "Time from losing BlueZ or the system bus to the monitor being back in sync.",
+            buckets=RECOVERY_BUCKETS)
+        self.ready = Histogram(
+            "bluelight_ready_seconds",
+            "Time from the monitor process starting to the initial sync being done.",
+            buckets=RECOVERY_BUCKETS)
+        self.action_duration = Histogram(
+            "bluelight_action_seconds",
+            "Time a configured connect, disconnect or low-battery action ran.",
+            buckets=RECOVERY_BUCKETS)
+        self.prewarm_saved = Histogram(
+            "bluelight_prewarm_saved_seconds",
+            "Head start a prewarmed moonlight-qt had on its controller connecting, i.e. launch latency saved.",
+            buckets=RECOVERY_BUCKETS)
+        self.prewarm_wasted = Histogram(
+            "bluelight_prewarm_wasted_seconds",
+            "Time a prewarmed moonlight-qt ran before being stopped because no controller connected.",
+            buckets=RECOVERY_BUCKETS)
+        # Observations in total at the last export; None until the first
+        self._exported = None
+
+    @property
+    def histograms(self):
+        return [self.signal_dispatch, self.launch_latency, self.disconnect_handling, self.stop_duration, self.recovery, self.ready,
+                self.action_duration, self.prewarm_saved, self.prewarm_wasted]
+
+    def render(self) -> str:
+        return "\n".join(histogram.render() for histogram in self.histograms) + "\n"
+
+    @property
+    def dirty(self) -> bool:
+        """
+        True if anything was observed since the last export. Counts only
+        grow, so their total changes exactly when something was observed.
+        """
+        return sum(histogram.count for histogram in self.histograms) != self._exported
+
+    def export(self, path: Path = None):
+        """
+        Atomically writes the histograms to a Prometheus text file, unless
+        nothing was observed since the last export, to spare SD cards.
+        """
+        if not self.dirty:
+            return
+        observations = sum(histogram.count for histogram in self.histograms)
+        # The textfile collector runs as another user and must be able to read it
+        write_atomic(path or METRICS_FILE, self.render(), mode=0o644)
+        self._exported = observations
+
+
+SAMPLE_PATTERN = re.compile(r'^(\w+?)(_bucket\{le="([^"]+)"\}|_sum|_count) (\S+)$')
+
+
+def parse_histograms(text: str) -> dict:
+    """
+    Parses histograms from Prometheus text format.
+
+    Returns:
+        dict: Maps each histogram name to a dict with ``bounds``, ``counts``
+        (per bucket, not cumulative, excluding +Inf), ``sum`` and ``count``.
+    """
+    histograms = {}
+    help_texts = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, _, help_text = line[len("# HELP "):].partition(" ")
+            help_texts[name] = help_text
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        if match is None:
+            continue
+        name, kind, bound, value = match.groups()
+        histogram = histograms.setdefault(name, {"help": help_texts.get(name, ""), "cumulative": [], "sum": 0.0, "count": 0})
+        if kind == "_sum":
+            histogram["sum"] = float(value)
+        elif kind == "_count":
+            histogram["count"] = int(float(value))
+        elif bound != "+Inf":
+            histogram["cumulative"].append((float(bound), int(float(value))))
+
+    for histogram in histograms.values():
+        cumulative = histogram.pop("cumulative")
+        histogram["bounds"] = [bound for bound, _ in cumulative]
+        histogram["counts"] = [value - previous for (_, value), previous in zip(cumulative, [0] + [v for _, v in cumulative])]
+    return histograms
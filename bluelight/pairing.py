@@ -0,0 +1,368 @@
+# bluelight/pairing.py
+
+"""
+Interactive pairing: scans for controllers, connects to and trusts the
+chosen ones and adds them to the allowed devices.
+
+Kept apart from the monitor so the resident daemon never loads it.
+"""
+
+import asyncio
+from bluelight import dbus_backend
+from bluelight.dbus_backend import BackendError
+from bluelight.config import get_store, update_allowed_devices, add_allowed_devices
+from bluelight.company_identifiers import manufacturer_name
+from bluelight.controllers import classify_advertisement, CONTROLLER_SERVICE_UUIDS
+
+# Default length of the pairing scan window, in seconds
+PAIRING_SCAN_TIMEOUT = 10.0
+
+# Controllers connected at once when pairing several; BlueZ serialises
+# much of connection setup per adapter, so more mostly adds contention
+PAIRING_CONCURRENCY = 3
+
+# Longest a single pairing connection may take, in seconds
+PAIRING_CONNECT_TIMEOUT = 20.0
+
+
+class PairingScan:
+    """
+    Collects advertisements as they arrive during a pairing scan.
+
+    The scan is itself a Rich renderable, so a Live display redraws the
+    table at its own refresh rate instead of on every advertisement.
+    """
+
+    def __init__(self, auto_select: bool = False, controllers_only: bool = False):
+        self.auto_select = auto_select
+        self.controllers_only = controllers_only
+        self.devices = {}
+        self.selected = None
+        self.stopped = asyncio.Event()
+        # Set by freeze(); the numbering the user picks from
+        self.snapshot = None
+
+    def detection_callback(self, device, advertisement_data):
+        if self.snapshot is not None:
+            # Adverts still arriving while discovery stops must not renumber the table
+            return
+        mac_address = device.address
+        entry = self.devices.get(mac_address)
+        if entry is None:
+            # Classify first so filtered-out devices cost no formatting
+            reason = classify_advertisement(device, advertisement_data)
+            if self.controllers_only and reason is None:
+                return
+            # Set device name or use "Unknown Device" if name is not available
+            device_name = device.name or advertisement_data.local_name or "Unknown Device"
+            # Check if device name is the same as the MAC address, which indicates an unknown device
+            if str.join(":", device_name.split("-")) == mac_address:
+                device_name = "Unknown Device"
+            entry = {
+                "device": device,
+                "name": device_name,
+                # Look up the manufacturer in the compiled company identifier index
+                "manufacturer": manufacturer_name(advertisement_data.manufacturer_data),
+                "address": mac_address,
+                "rssi": advertisement_data.rssi,
+                "controller": reason,
+            }
+            self.devices[mac_address] = entry
+        else:
+            entry["device"] = device
+            entry["rssi"] = advertisement_data.rssi
+            if entry["name"] == "Unknown Device" and (device.name or advertisement_data.local_name):
+                entry["name"] = device.name or advertisement_data.local_name
+                entry["controller"] = classify_advertisement(device, advertisement_data)
+
+        # Stop at the first likely controller when auto-selecting
+        if self.auto_select and entry["controller"] and self.selected is None:
+            self.selected = entry
+            self.stopped.set()
+
+    def rows(self) -> list:
+        """
+        Returns the devices seen so far, strongest signal first, or the
+        frozen list once the scan has been frozen.
+        """
+        if self.snapshot is not None:
+            return self.snapshot
+        return sorted(self.devices.values(), key=lambda entry: entry["rssi"] or -999, reverse=True)
+
+    def freeze(self) -> list:
+        """
+        Stops taking advertisements and fixes the order of the rows.
+
+        Returns:
+            list: The rows as they will be numbered from now on.
+        """
+        if self.snapshot is None:
+            self.snapshot = self.rows()
+        return self.snapshot
+
+    def __rich__(self):
+        from rich.table import Table
+
+        table = Table(title=f"Bluetooth devices ({len(self.devices)} found)")
+        table.add_column("#", justify="right")
+        table.add_column("Name")
+        table.add_column("Manufacturer")
+        table.add_column("Address")
+        table.add_column("RSSI", justify="right")
+        table.add_column("Controller")
+        for idx, entry in enumerate(self.rows(), start=1):
+            # Highlight potential controllers
+            name = f"[bold green]{entry['name']}[/bold green]" if entry["controller"] else entry["name"]
+            table.add_row(str(idx), name, entry["manufacturer"], entry["address"], str(entry["rssi"]), entry["controller"] or "")
+        return table
+
+
+def parse_selection(text: str, count: int) -> list:
+    """
+    Parses a list of device numbers such as "1 3", "1,3,5-7" or "all".
+
+    Returns:
+        list: Zero-based indexes in the order given, without duplicates.
+
+    Raises:
+        ValueError: If a part is not a number or range between 1 and count.
+    """
+    if text.strip().lower() == "all":
+        return list(range(count))
+    indexes = []
+    for part in text.replace(",", " ").split():
+        first, _, last = part.partition("-")
+        start, end = int(first), int(last or first)
+        if not 1 <= start <= end <= count:
+            raise ValueError(f"{part} is not between 1 and {count}")
+        indexes.extend(idx - 1 for idx in range(start, end + 1) if idx - 1 not in indexes)
+    if not indexes:
+        raise ValueError("no devices selected")
+    return indexes
+
+
+async def pair_new_controller(auto_select: bool = False, scan_timeout: float = PAIRING_SCAN_TIMEOUT, controllers_only: bool = True,
+                              adapter: str = None, batch: bool = False, concurrency: int = PAIRING_CONCURRENCY):
+    """
+    Connect to a wireless Bluetooth controller using Bleak and set the device as trusted.
+
+    Args:
+        auto_select (bool): Stop scanning and connect as soon as a likely
+            controller is seen instead of asking which device to use.
+        scan_timeout (float): Longest time to scan for, in seconds.
+        controllers_only (bool): Ask BlueZ for HID devices only and hide
+            anything that does not classify as a controller.
+        adapter (str): Adapter to scan and pair on, by name ("hci1") or
+            address. Defaults to the configured adapter, if any.
+        batch (bool): Pair several devices from one scan. With auto_select,
+            every likely controller seen during the window is paired.
+        concurrency (int): Most devices to connect to at once in batch mode.
+    """
+    # Pairing-only dependencies are imported here so the monitor does not load them
+    import sys
+    import typer
+    from rich.prompt import Prompt
+    from rich.console import Console
+    from rich.live import Live
+    from bleak import BleakClient, BleakScanner, BleakError
+
+    console = Console()
+
+    adapter = adapter or get_store().get().get('adapter')
+    if adapter:
+        try:
+            adapter = await dbus_backend.resolve_adapter(adapter)
+        except BackendError as e:
+            console.print(f"[bold red]{e}[/bold red]")
+            raise typer.Exit(code=1)
+    # Only passed when set, so Bleak keeps choosing its default adapter otherwise
+    adapter_args = {"adapter": adapter} if adapter else {}
+
+    async def scan():
+        """
+        Streams advertisements into a live table until the window ends, the
+        user presses Enter or, when auto-selecting, a controller is seen.
+        """
+        # A batch takes every controller seen, so it scans the whole window
+        pairing_scan = PairingScan(auto_select and not batch, controllers_only)
+        loop = asyncio.get_running_loop()
+
+        def on_enter():
+            sys.stdin.readline()
+            pairing_scan.stopped.set()
+
+        if batch:
+            console.print(f"[bold green]Scanning for Bluetooth devices{' on ' + adapter if adapter else ''}... Press Enter once all of them appear.[/bold green]")
+        elif auto_select:
+            console.print(f"[bold green]Scanning for Bluetooth controllers{' on ' + adapter if adapter else ''}... (press Enter to stop)[/bold green]")
+        else:
+            console.print(f"[bold green]Scanning for Bluetooth devices{' on ' + adapter if adapter else ''}... Press Enter once your device appears.[/bold green]")
+        try:
+            loop.add_reader(sys.stdin.fileno(), on_enter)
+            watching_stdin = True
+        except (OSError, ValueError, NotImplementedError):
+            # stdin is not selectable (e.g. not a terminal); scan the full window
+            watching_stdin = False
+        try:
+            # Push the HID filter down into BlueZ so other adverts never arrive
+            service_uuids = CONTROLLER_SERVICE_UUIDS if controllers_only else None
+            async with BleakScanner(detection_callback=pairing_scan.detection_callback, service_uuids=service_uuids, **adapter_args):
+                # Transient: the table the user picks from is printed once the scanner has stopped
+                with Live(pairing_scan, console=console, refresh_per_second=4, transient=True):
+                    try:
+                        await asyncio.wait_for(pairing_scan.stopped.wait(), scan_timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if watching_stdin:
+                loop.remove_reader(sys.stdin.fileno())
+        # Leaving the scanner waits for StopDiscovery, during which callbacks
+        # can still fire; only now is the list final
+        pairing_scan.freeze()
+        if pairing_scan.devices:
+            console.print(pairing_scan)
+        return pairing_scan
+
+    async def connect():
+        pairing_scan = await scan()
+
+        if pairing_scan.selected is not None:
+            selected_device = pairing_scan.selected
+        else:
+            # Numbered exactly as in the table scan() printed
+            rows = pairing_scan.rows()
+            if not rows:
+                console.print("[bold red]No Bluetooth devices found. Please ensure the device is in pairing mode.[/bold red]")
+                raise typer.Exit()
+
+            device_list = {str(idx): entry for idx, entry in enumerate(rows, start=1)}
+            idx = len(rows) + 1
+
+            # Add an option to quit
+            console.print(f"[{idx}] [bold red]Quit[/bold red] (Run again to rescan)")
+
+            # Use Rich prompt to select a device
+            selected_idx = Prompt.ask(
+                "[bold yellow]Select the device number you want to connect to[/bold yellow]", 
+                choices=list(device_list.keys()) + [str(idx)]
+            )
+
+            if selected_idx == str(idx):
+                console.print("[bold red]Quitting...[/bold red]")
+                raise typer.Exit()
+
+            # Get selected device information
+            selected_device = device_list[selected_idx]
+        console.print(f"[bold green]Connecting to {selected_device['name']} ({selected_device['address']})...[/bold green]")
+
+        # Attempt to connect to the selected device
+        try:
+            async with BleakClient(selected_device['device']) as client:
+                if client.is_connected:
+                    console.print(f"[bold green]Successfully connected to {selected_device['name']}![/bold green]")
+
+                    # Mark the device as trusted through BlueZ
+                    try:
+                        console.print(f"[bold green]Setting {selected_device['address']} as a trusted device...[/bold green]")
+                        await dbus_backend.set_trusted(selected_device['address'], adapter=adapter)
+                        console.print(f"[bold green]Device {selected_device['address']} is now trusted![/bold green]")
+                        # Prompt user for a nickname after successful pairing
+                        nickname = Prompt.ask(f"This device paired successfully! Would you like to give it a nickname(25 char max)? (Leave blank to skip)")
+                        if not nickname:
+                            nickname = "No nickname"
+                        nickname = nickname[:25]
+                        update_allowed_devices(selected_device['address'], selected_device['name'], selected_device['manufacturer'], nickname)
+                    except BackendError as e:
+                        console.print(f"[bold red]Failed to set {selected_device['address']} as trusted. Error: {e}[/bold red]")
+                else:
+                    console.print(f"[bold red]Failed to connect to {selected_device['name']}.[/bold red]")
+        except BleakError as e:
+            console.print("[bold red]There was an issue making the connection to your device.\nMake sure your device is in discovery mode and try again.[/bold red]")
+            raise typer.Exit()
+        except Exception as e:
+            console.print(f"[bold red]Something else went wrong. Try again. The error is:\n{e}")
+            raise typer.exit()
+        
+    async def pair_one(entry, slots):
+        """
+        Connects to and trusts one device of a batch.
+
+        Returns:
+            str: None on success, otherwise what went wrong.
+        """
+        async with slots:
+            console.print(f"Connecting to {entry['name']} ({entry['address']})...")
+            try:
+                async with BleakClient(entry['device'], timeout=PAIRING_CONNECT_TIMEOUT) as client:
+                    if not client.is_connected:
+                        return "could not connect"
+                    await dbus_backend.set_trusted(entry['address'], adapter=adapter)
+            except BackendError as e:
+                return f"could not set as trusted: {e}"
+            except (BleakError, asyncio.TimeoutError) as e:
+                return f"could not connect: {e or 'timed out'}"
+            except Exception as e:
+                return f"failed: {e}"
+        return None
+
+    async def connect_batch():
+        pairing_scan = await scan()
+        rows = pairing_scan.rows()
+        if auto_select:
+            selected = [entry for entry in rows if entry["controller"]]
+            if not selected:
+                console.print("[bold red]No controllers found. Please ensure they are in pairing mode.[/bold red]")
+                raise typer.Exit()
+        else:
+            if not rows:
+                console.print("[bold red]No Bluetooth devices found. Please ensure the devices are in pairing mode.[/bold red]")
+                raise typer.Exit()
+            while True:
+                answer = Prompt.ask("[bold yellow]Enter the numbers of the devices to pair, e.g. 1,3-4 or all (blank to quit)[/bold yellow]",
+                                    default="", show_default=False)
+                if not answer.strip():
+                    console.print("[bold red]Quitting...[/bold red]")
+                    raise typer.Exit()
+                try:
+                    selected = [rows[idx] for idx in parse_selection(answer, len(rows))]
+                    break
+                except ValueError as e:
+                    console.print(f"[bold red]Invalid selection: {e}[/bold red]")
+
+        # One scan, then every connection side by side within the limit
+        slots = asyncio.Semaphore(max(1, concurrency))
+        errors = await asyncio.gather(*(pair_one(entry, slots) for entry in selected))
+        paired = [entry for entry, error in zip(selected, errors) if error is None]
+
+        # Nicknames are asked for afterwards so prompts never interleave with progress output
+        new_devices = {}
+        for entry in paired:
+            nickname = Prompt.ask(f"Nickname for {entry['name']} ({entry['address']}, 25 char max)? (Leave blank to skip)")
+            new_devices[entry['address']] = {
+                "name": entry['name'],
+                "manufacturer": entry['manufacturer'],
+                "nickname": (nickname or "No nickname")[:25],
+            }
+        added = add_allowed_devices(new_devices) if new_devices else []
+
+        from rich.table import Table
+        table = Table(title="Pairing results")
+        for column in ("Name", "Address", "Result"):
+            table.add_column(column)
+        for entry, error in zip(selected, errors):
+            if error is not None:
+                result = f"[bold red]{error}[/bold red]"
+            elif entry['address'] in added:
+                result = "[bold green]paired and allowed[/bold green]"
+            else:
+                result = "[bold green]paired[/bold green] (already allowed)"
+            table.add_row(entry['name'], entry['address'], result)
+        console.print(table)
+        if not paired:
+            raise typer.Exit(code=1)
+
+    # Run the connection function
+    if batch:
+        await connect_batch()
+    else:
+        await connect()
@@ -0,0 +1,61 @@
+# bluelight/systemd.py
+
+"""
+The parts of the systemd service protocol the monitor uses: readiness and
+status notifications and watchdog keep-alives over $NOTIFY_SOCKET.
+
+Every function is a no-op outside systemd, so `bluelight run` behaves the
+same in a terminal.
+"""
+
+import os
+import socket
+import time
+
+
+def notify(*assignments: str) -> bool:
+    """
+    Sends state assignments such as "READY=1" to the service manager.
+
+    Returns:
+        bool: True if a notification socket was set and the message was sent.
+    """
+    address = os.getenv("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        # Abstract namespace socket
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto("\n".join(assignments).encode(), address)
+    except OSError:
+        return False
+    return True
+
+
+def watchdog_interval() -> float:
+    """
+    Returns how often to send WATCHDOG=1, in seconds: half the unit's
+    WatchdogSec, or None if the watchdog is not enabled for this process.
+    """
+    usec = os.getenv("WATCHDOG_USEC")
+    pid = os.getenv("WATCHDOG_PID")
+    if not usec or (pid and pid != str(os.getpid())):
+        return None
+    try:
+        return int(usec) / 1e6 / 2
+    except ValueError:
+        return None
+
+
+def process_uptime() -> float:
+    """
+    Returns the seconds since this process was started, which under systemd
+    is when the unit's main process was spawned.
+    """
+    with open(f"/proc/{os.getpid()}/stat") as f:
+        # The command name may contain spaces; fields resume after its ")"
+        fields = f.read().rpartition(")")[2].split()
+    started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    return time.clock_gettime(time.CLOCK_BOOTTIME) - started
@@ -0,0 +1,300 @@
+# bluelight/telemetry.py
+
+"""
+Fixed-size battery, RSSI and connection history for each controller.
+
+Every series lives in preallocated arrays, so memory does not grow however
+long the monitor runs. Samples go into a raw ring; tiers of per-minute and
+per-hour averages keep the longer view in the same fixed space:
+
+    raw     the last 256 changes
+    minute  12 hours of one-minute averages
+    hour    30 days of one-hour averages
+
+The monitor saves the history now and then to a small binary file, which
+`bluelight history` reads when the monitor is not running.
+
+File layout (little-endian):
+    header   4s magic, H version, H device count
+    device   17s MAC address, then battery, RSSI and events
+    series   per tier: a ring, then q bucket, q sum, I count
+    ring     I capacity, I length, I head, capacity x I times, capacity x h values
+"""
+
+import struct
+import time
+from array import array
+from pathlib import Path
+
+from bluelight.fileio import write_atomic
+
+TELEMETRY_FILE = Path.home() / '.bluelight_telemetry.bin'
+
+# How often the monitor saves the history when something changed, in seconds
+SAVE_INTERVAL = 300.0
+
+MAGIC = b"BLTM"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+ADDRESS = struct.Struct("<17s")
+RING_HEADER = struct.Struct("<III")
+ACCUMULATOR = struct.Struct("<qqI")
+
+# (resolution in seconds, capacity); resolution 0 keeps every sample
+TIERS = ((0, 256), (60, 720), (3600, 720))
+TIER_NAMES = ("raw", "minute", "hour")
+
+# Connection events kept per device
+EVENT_CAPACITY = 128
+CONNECTED = 1
+DISCONNECTED = 0
+
+
+class RingBuffer:
+    """
+    Timestamped int16 samples in two preallocated arrays; once full, each
+    new sample overwrites the oldest.
+    """
+
+    # Thousands of rings can be alive at once; no per-instance __dict__
+    __slots__ = ("capacity", "times", "values", "length", "head")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array('I', bytes(4 * capacity))
+        self.values = array('h', bytes(2 * capacity))
+        self.length = 0
+        self.head = 0
+
+    def append(self, timestamp: int, value: int):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.length < self.capacity:
+            self.length += 1
+
+    def last(self):
+        """
+        Returns the newest (time, value) pair, or None if empty.
+        """
+        if self.length == 0:
+            return None
+        idx = (self.head - 1) % self.capacity
+        return self.times[idx], self.values[idx]
+
+    def items(self) -> list:
+        """
+        Returns the samples as (time, value) pairs, oldest first.
+        """
+        start = (self.head - self.length) % self.capacity
+        return [(self.times[(start + n) % self.capacity], self.values[(start + n) % self.capacity])
+                for n in range(self.length)]
+
+    def __len__(self):
+        return self.length
+
+    def dump(self) -> bytes:
+        return RING_HEADER.pack(self.capacity, self.length, self.head) + self.times.tobytes() + self.values.tobytes()
+
+    def load(self, data: bytes, offset: int) -> int:
+        """
+        Restores the ring from dump() output at ``offset`` and returns the
+        offset just past it. A ring saved with another capacity is skipped.
+        """
+        capacity, length, head = RING_HEADER.unpack_from(data, offset)
+        offset += RING_HEADER.size
+        end = offset + capacity * 6
+        if end > len(data):
+            raise ValueError("truncated ring")
+        if capacity == self.capacity and length <= capacity and head < capacity:
+            self.times = array('I', data[offset:offset + capacity * 4])
+            self.values = array('h', data[offset + capacity * 4:end])
+            self.length, self.head = length, head
+        return end
+
+
+class TieredSeries:
+    """
+    A raw ring plus rings of averages at coarser resolutions.
+    """
+
+    __slots__ = ("resolutions", "rings", "accumulators")
+
+    def __init__(self, tiers=TIERS):
+        self.resolutions = [resolution for resolution, _ in tiers]
+        self.rings = [RingBuffer(capacity) for _, capacity in tiers]
+        # Per tier: [bucket number, sum, count] of the bucket being filled
+        self.accumulators = [[0, 0, 0] for _ in tiers]
+
+    def append(self, timestamp: int, value: int):
+        for resolution, ring, accumulator in zip(self.resolutions, self.rings, self.accumulators):
+            if resolution == 0:
+                ring.append(timestamp, value)
+                continue
+            bucket = timestamp // resolution
+            if accumulator[2] and bucket != accumulator[0]:
+                # The previous bucket is complete; store its average
+                ring.append(accumulator[0] * resolution, round(accumulator[1] / accumulator[2]))
+                accumulator[1] = accumulator[2] = 0
+            accumulator[0] = bucket
+            accumulator[1] += value
+            accumulator[2] += 1
+
+    def last(self):
+        return self.rings[0].last()
+
+    def items(self, tier: int = 0) -> list:
+        """
+        Returns a tier's samples, oldest first, including the partial
+        average of the bucket still being filled.
+        """
+        items = self.rings[tier].items()
+        bucket, total, count = self.accumulators[tier]
+        if self.resolutions[tier] and count:
+            items.append((bucket * self.resolutions[tier], round(total / count)))
+        return items
+
+    def dump(self) -> bytes:
+        return b"".join(ring.dump() + ACCUMULATOR.pack(*accumulator)
+                        for ring, accumulator in zip(self.rings, self.accumulators))
+
+    def load(self, data: bytes, offset: int) -> int:
+        for ring, accumulator in zip(self.rings, self.accumulators):
+            offset = ring.load(data, offset)
+            accumulator[:] = ACCUMULATOR.unpack_from(data, offset)
+            offset += ACCUMULATOR.size
+        return offset
+
+
+class DeviceTelemetry:
+    """
+    The battery, RSSI and connection history of one controller.
+    """
+
+    __slots__ = ("battery", "rssi", "events")
+
+    def __init__(self):
+        self.battery = TieredSeries()
+        self.rssi = TieredSeries()
+        self.events = RingBuffer(EVENT_CAPACITY)
+
+    def dump(self) -> bytes:
+        return self.battery.dump() + self.rssi.dump() + self.events.dump()
+
+    def load(self, data: bytes, offset: int) -> int:
+        offset = self.battery.load(data, offset)
+        offset = self.rssi.load(data, offset)
+        return self.events.load(data, offset)
+
+    def summary(self) -> dict:
+        battery = self.battery.last()
+        rssi = self.rssi.last()
+        event = self.events.last()
+        return {
+            "battery": battery[1] if battery else None,
+            "battery_time": battery[0] if battery else None,
+            "rssi": rssi[1] if rssi else None,
+            "last_event": ("connected" if event[1] == CONNECTED else "disconnected") if event else None,
+            "last_event_time": event[0] if event else None,
+        }
+
+    def history(self, tier: int = 0) -> dict:
+        return {
+            "battery": self.battery.items(tier),
+            "rssi": self.rssi.items(tier),
+            "events": [(timestamp, "connected" if value == CONNECTED else "disconnected")
+                       for timestamp, value in self.events.items()],
+        }
+
+
+class Telemetry:
+    """
+    History for every tracked controller, keyed by MAC address.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self.dirty = False
+
+    def device(self, mac_address: str) -> DeviceTelemetry:
+        device = self.devices.get(mac_address)
+        if device is None:
+            device = self.devices[mac_address] = DeviceTelemetry()
+        return device
+
+    def record_battery(self, mac_address: str, percentage: int, timestamp: float = None):
+        self.device(mac_address).battery.append(int(timestamp or time.time()), percentage)
+        self.dirty = True
+
+    def record_rssi(self, mac_address: str, rssi: int, timestamp: float = None):
+        self.device(mac_address).rssi.append(int(timestamp or time.time()), rssi)
+        self.dirty = True
+
+    def record_event(self, mac_address: str, connected: bool, timestamp: float = None):
+        self.device(mac_address).events.append(int(timestamp or time.time()), CONNECTED if connected else DISCONNECTED)
+        self.dirty = True
+
+    def forget(self, mac_address: str):
+        if self.devices.pop(mac_address, None) is not None:
+            self.dirty = True
+
+    def dump(self) -> bytes:
+        parts = [HEADER.pack(MAGIC, VERSION, len(self.devices))]
+        for mac_address, device in self.devices.items():
+            parts.append(ADDRESS.pack(mac_address.encode()))
+            parts.append(device.dump())
+        return b"".join(parts)
+
+    def save(self, path: Path = None):
+        """
+        Atomically writes the history if it changed since the last save.
+        """
+        if not self.dirty:
+            return
+        save_snapshot(self.dump(), path)
+        self.dirty = False
+
+    def snapshot(self) -> bytes:
+        """
+        Returns the history to save if it changed since the last save, or
+        None, and marks it saved. Lets the caller write it with
+        save_snapshot() from another thread while recording goes on.
+        """
+        if not self.dirty:
+            return None
+        self.dirty = False
+        return self.dump()
+
+    @classmethod
+    def load(cls, path: Path = None) -> "Telemetry":
+        """
+        Reads saved history, or returns an empty one if there is none.
+
+        Raises:
+            ValueError: If the file is not a telemetry file or is truncated.
+        """
+        telemetry = cls()
+        path = Path(path or TELEMETRY_FILE)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return telemetry
+        try:
+            magic, version, count = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a bluelight telemetry file")
+            offset = HEADER.size
+            for _ in range(count):
+                [address] = ADDRESS.unpack_from(data, offset)
+                offset = telemetry.device(address.decode()).load(data, offset + ADDRESS.size)
+        except struct.error as e:
+            raise ValueError(f"{path} is truncated") from e
+        telemetry.dirty = False
+        return telemetry
+
+
+def save_snapshot(data: bytes, path: Path = None):
+    """
+    Atomically writes history taken with Telemetry.snapshot().
+    """
+    write_atomic(path or TELEMETRY_FILE, data)
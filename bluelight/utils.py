@@ -2,7 +2,6 @@ import getpass
 import pwd
 from pathlib import Path
 import os
-import subprocess
 
 def get_original_user_info() -> tuple:
     """
@@ -30,8 +29,11 @@ def is_service_active(service_name: str) -> bool:
     Returns:
         bool: True if the service is active, False otherwise.
     """
-    result = subprocess.run(["systemctl", "is-active", service_name], capture_output=True, text=True)
-    return result.stdout.strip() == "active"
+    from bluelight import dbus_backend
+    try:
+        return dbus_backend.run_sync(dbus_backend.unit_active_state(service_name)) == "active"
+    except dbus_backend.BackendError:
+        return False
 
 def is_service_enabled(service_name: str) -> bool:
     """
@@ -43,5 +45,8 @@ def is_service_enabled(service_name: str) -> bool:
     Returns:
         bool: True if the service is enabled, False otherwise.
     """
-    result = subprocess.run(["systemctl", "is-enabled", service_name], capture_output=True, text=True)
-    return result.stdout.strip() == "enabled"
\ No newline at end of file
+    from bluelight import dbus_backend
+    try:
+        return dbus_backend.run_sync(dbus_backend.unit_file_state(service_name)) == "enabled"
+    except dbus_backend.BackendError:
+        return False
\ No newline at end of file
@@ -0,0 +1,131 @@
+# tests/conftest.py
+
+import asyncio
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS))
+
+from fake_bluez import FakeBlueZ, PrivateBus  # noqa: E402
+
+from bluelight import config, control, dbus_backend, metrics, telemetry  # noqa: E402
+from bluelight.bluetooth_monitor import monitor_bluetooth  # noqa: E402
+from bluelight.metrics import MonitorMetrics  # noqa: E402
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """
+    Points every file the monitor reads or writes, and its control socket,
+    at a temporary directory, and puts a stand-in moonlight-qt on PATH.
+    """
+    monkeypatch.setattr(config, "CONFIG_FILE", tmp_path / ".bluelight_config.json")
+    monkeypatch.setattr(telemetry, "TELEMETRY_FILE", tmp_path / ".bluelight_telemetry.bin")
+    monkeypatch.setattr(metrics, "METRICS_FILE", tmp_path / ".bluelight_metrics.prom")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    for name in ("RUNTIME_DIRECTORY", "NOTIFY_SOCKET", "WATCHDOG_USEC"):
+        monkeypatch.delenv(name, raising=False)
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    (bindir / "moonlight-qt").write_text("#!/bin/sh\nexec sleep 3600\n")
+    (bindir / "moonlight-qt").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bindir}:{os.environ['PATH']}")
+    return tmp_path
+
+
+class Monitor:
+    """
+    A monitor_bluetooth task running against a FakeBlueZ on a private bus.
+    """
+
+    def __init__(self, address: str, bluez: FakeBlueZ):
+        self.address = address
+        self.bluez = bluez
+        self.metrics = MonitorMetrics()
+        self.task = None
+
+    async def start(self):
+        ready = asyncio.Event()
+        self.task = asyncio.create_task(monitor_bluetooth(bus_address=self.address, metrics=self.metrics, ready=ready))
+        ready_wait = asyncio.ensure_future(ready.wait())
+        await asyncio.wait([ready_wait, self.task], timeout=10, return_when=asyncio.FIRST_COMPLETED)
+        ready_wait.cancel()
+        if self.task.done():
+            self.task.result()
+        assert ready.is_set(), "monitor did not become ready"
+
+    async def status(self) -> dict:
+        return await asyncio.to_thread(control.request, "status", path=control.socket_path())
+
+    async def wait_for(self, predicate, timeout: float = 5.0) -> dict:
+        """
+        Polls the monitor's status until ``predicate(status)`` holds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            status = await self.status()
+            if predicate(status):
+                return status
+            if loop.time() > deadline:
+                raise AssertionError(f"timed out waiting for the monitor, last status: {status}")
+            await asyncio.sleep(0.05)
+
+    async def cancel(self):
+        """
+        Cancels the monitor, leaving the shared bus connection and BlueZ up.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def stop(self):
+        await self.cancel()
+        bus = dbus_backend._buses.pop(self.address, (None, None))[0]
+        if bus is not None and bus.connected:
+            bus.disconnect()
+            await bus.wait_for_disconnect()
+        if self.bluez.bus is not None:
+            await self.bluez.stop()
+
+
+@pytest.fixture
+def run_monitor(home):
+    """
+    Returns a runner for test scenarios: ``run_monitor(scenario, devices,
+    **config)`` starts a FakeBlueZ with the given (address, connected)
+    devices, allows them all, starts the monitor and awaits
+    ``scenario(monitor)``.
+    """
+    if shutil.which("dbus-daemon") is None:
+        pytest.skip("dbus-daemon is needed to run the stand-in BlueZ")
+
+    def run(scenario, devices, **overrides):
+        async def main():
+            async with PrivateBus() as address:
+                bluez = FakeBlueZ(address)
+                for mac_address, connected in devices:
+                    bluez.add_device(mac_address, connected=connected)
+                await bluez.start()
+                settings = dict(config.DEFAULT_CONFIG, timeout=0)
+                settings["allowed_devices"] = {mac_address: {} for mac_address, _ in devices}
+                settings.update(overrides)
+                config.save_config(settings)
+                monitor = Monitor(address, bluez)
+                try:
+                    await monitor.start()
+                    return await scenario(monitor)
+                finally:
+                    await monitor.stop()
+
+        return asyncio.run(asyncio.wait_for(main(), 30))
+
+    return run
@@ -0,0 +1,367 @@
+# tests/test_bluetooth_monitor.py
+
+import asyncio
+import json
+import time
+
+from bluelight import config, control, dbus_backend
+from bluelight.bluetooth_monitor import (DISCONNECT_DEBOUNCE, PREWARM_COOLDOWN, PREWARM_MAX_COOLDOWN, DisconnectScheduler,
+                                         MoonlightSupervisor, prewarm_cooldown)
+from bluelight.metrics import MonitorMetrics
+
+PAD = "AA:00:00:00:00:01"
+OTHER_PAD = "AA:00:00:00:00:02"
+STRANGER = "AA:00:00:00:00:09"
+
+
+# Stands in for moonlight-qt in the supervisor tests
+SLEEPER = ("sleep", "30")
+
+
+def test_scheduler_fires_after_delay():
+    async def main():
+        fired = []
+
+        async def callback(mac_address):
+            fired.append((mac_address, loop.time()))
+
+        loop = asyncio.get_running_loop()
+        scheduler = DisconnectScheduler(callback, debounce=0)
+        started = loop.time()
+        scheduler.schedule(PAD, 0.05)
+        assert set(scheduler.pending()) == {PAD}
+        await asyncio.sleep(0.15)
+        assert [mac_address for mac_address, _ in fired] == [PAD]
+        assert fired[0][1] - started >= 0.05
+        assert scheduler.pending() == {}
+
+    asyncio.run(main())
+
+
+def test_scheduler_cancel_and_rearm():
+    async def main():
+        fired = []
+
+        async def callback(mac_address):
+            fired.append(mac_address)
+
+        scheduler = DisconnectScheduler(callback, debounce=0)
+        scheduler.schedule(PAD, 0.05)
+        assert scheduler.cancel(PAD)
+        assert not scheduler.cancel(PAD)
+        first = scheduler.schedule(OTHER_PAD, 0.05)
+        second = scheduler.schedule(OTHER_PAD, 0.1)
+        assert second > first
+        assert scheduler.deadlines() == {OTHER_PAD: second}
+        await asyncio.sleep(0.2)
+        assert fired == [OTHER_PAD]
+
+    asyncio.run(main())
+
+
+def test_scheduler_debounce_is_a_floor():
+    async def main():
+        async def callback(mac_address):
+            pass
+
+        scheduler = DisconnectScheduler(callback, debounce=10)
+        scheduler.schedule(PAD, 0)
+        assert scheduler.pending()[PAD] > 9
+        scheduler.cancel_all()
+        assert scheduler.pending() == {}
+
+    asyncio.run(main())
+
+
+def test_supervisor_shares_one_process():
+    async def main():
+        metrics = MonitorMetrics()
+        supervisor = MoonlightSupervisor(SLEEPER, metrics=metrics)
+        await supervisor.acquire(PAD, requested_at=asyncio.get_running_loop().time())
+        pid = supervisor.pid
+        assert supervisor.is_running
+        await supervisor.acquire(OTHER_PAD)
+        assert supervisor.pid == pid
+        await supervisor.release(PAD)
+        assert supervisor.is_running
+        assert supervisor.holders == {OTHER_PAD}
+        await supervisor.release(OTHER_PAD)
+        assert not supervisor.is_running
+        assert metrics.stop_duration.count == 1
+
+    asyncio.run(main())
+
+
+def test_supervisor_uses_a_controllers_command():
+    async def main():
+        supervisor = MoonlightSupervisor(("false-command-that-does-not-exist",))
+        await supervisor.acquire(PAD, command=list(SLEEPER))
+        assert supervisor.is_running
+        await supervisor.shutdown()
+        assert not supervisor.is_running
+        assert supervisor.holders == frozenset()
+
+    asyncio.run(main())
+
+
+def test_supervisor_kills_a_client_that_ignores_sigterm():
+    async def main():
+        supervisor = MoonlightSupervisor(("sh", "-c", "trap '' TERM; sleep 30"), stop_grace=0.2)
+        await supervisor.acquire(PAD)
+        # Let the shell install its trap
+        await asyncio.sleep(0.1)
+        await supervisor.release(PAD)
+        assert not supervisor.is_running
+
+    asyncio.run(main())
+
+
+def test_prewarm_claimed_by_connection():
+    async def main():
+        metrics = MonitorMetrics()
+        supervisor = MoonlightSupervisor(SLEEPER, metrics=metrics)
+        assert supervisor.can_prewarm(PAD)
+        assert await supervisor.prewarm(PAD, window=5)
+        pid = supervisor.pid
+        assert supervisor.prewarmed_for == PAD
+        assert not supervisor.can_prewarm(OTHER_PAD)
+        await supervisor.acquire(PAD)
+        assert supervisor.pid == pid
+        assert supervisor.prewarmed_for is None
+        assert metrics.prewarm_saved.count == 1
+        await supervisor.shutdown()
+
+    asyncio.run(main())
+
+
+def test_unused_prewarm_expires_and_cools_down():
+    async def main():
+        metrics = MonitorMetrics()
+        supervisor = MoonlightSupervisor(SLEEPER, metrics=metrics)
+        assert await supervisor.prewarm(PAD, window=0.1)
+        await asyncio.sleep(0.3)
+        assert not supervisor.is_running
+        assert supervisor.prewarmed_for is None
+        assert metrics.prewarm_wasted.count == 1
+        # The same controller is on cooldown, others are not
+        assert not supervisor.can_prewarm(PAD)
+        assert supervisor.can_prewarm(OTHER_PAD)
+
+    asyncio.run(main())
+
+
+def test_prewarm_cooldown_grows_until_the_controller_connects():
+    async def main():
+        supervisor = MoonlightSupervisor(SLEEPER)
+        assert [prewarm_cooldown(misses) for misses in (1, 2, 3)] == [PREWARM_COOLDOWN, PREWARM_COOLDOWN * 2, PREWARM_COOLDOWN * 4]
+        assert prewarm_cooldown(5000) == PREWARM_MAX_COOLDOWN
+        # Three unused prewarms in a row, the last one three minutes ago
+        supervisor._prewarm_misses[PAD] = (time.monotonic() - 180, 3)
+        assert not supervisor.can_prewarm(PAD)
+        await supervisor.acquire(PAD)
+        await supervisor.release(PAD)
+        assert supervisor.can_prewarm(PAD)
+
+    asyncio.run(main())
+
+
+def running(status) -> bool:
+    return status["moonlight"]["running"]
+
+
+def test_connect_starts_moonlight(run_monitor):
+    async def scenario(monitor):
+        status = await monitor.status()
+        assert not running(status)
+        monitor.bluez.set_connected(PAD, True)
+        status = await monitor.wait_for(running)
+        assert status["connected"] == {PAD: ["hci0"]}
+        assert status["moonlight"]["holders"] == [PAD]
+        assert monitor.metrics.launch_latency.count == 1
+
+    run_monitor(scenario, [(PAD, False)])
+
+
+def test_already_connected_at_startup(run_monitor):
+    async def scenario(monitor):
+        status = await monitor.wait_for(running)
+        assert list(status["connected"]) == [PAD]
+
+    run_monitor(scenario, [(PAD, True)])
+
+
+def test_devices_not_allowed_are_ignored(run_monitor):
+    async def scenario(monitor):
+        monitor.bluez.add_device(STRANGER, connected=True)
+        monitor.bluez.set_connected(STRANGER, False)
+        monitor.bluez.set_connected(STRANGER, True)
+        await asyncio.sleep(0.2)
+        status = await monitor.status()
+        assert status["connected"] == {}
+        assert not running(status)
+
+    run_monitor(scenario, [(PAD, False)])
+
+
+def test_disconnect_stops_moonlight_after_timeout(run_monitor):
+    async def scenario(monitor):
+        monitor.bluez.set_connected(PAD, True)
+        await monitor.wait_for(running)
+        monitor.bluez.set_connected(PAD, False)
+        status = await monitor.wait_for(lambda status: PAD in status["pending_shutdowns"])
+        assert status["connected"] == {}
+        # Still running during the debounce
+        assert running(status)
+        status = await monitor.wait_for(lambda status: not running(status), timeout=DISCONNECT_DEBOUNCE + 3)
+        assert status["pending_shutdowns"] == {}
+
+    run_monitor(scenario, [(PAD, False)])
+
+
+def test_moonlight_runs_while_any_controller_is_connected(run_monitor):
+    async def scenario(monitor):
+        monitor.bluez.set_connected(PAD, True)
+        monitor.bluez.set_connected(OTHER_PAD, True)
+        status = await monitor.wait_for(lambda status: len(status["moonlight"]["holders"]) == 2)
+        pid = status["moonlight"]["pid"]
+        monitor.bluez.set_connected(PAD, False)
+        await asyncio.sleep(DISCONNECT_DEBOUNCE + 0.3)
+        status = await monitor.wait_for(lambda status: status["moonlight"]["holders"] == [OTHER_PAD])
+        assert status["moonlight"]["pid"] == pid
+
+    run_monitor(scenario, [(PAD, False), (OTHER_PAD, False)])
+
+
+def test_flap_keeps_the_same_moonlight(run_monitor):
+    async def scenario(monitor):
+        monitor.bluez.set_connected(PAD, True)
+        pid = (await monitor.wait_for(running))["moonlight"]["pid"]
+        for _ in range(5):
+            monitor.bluez.set_connected(PAD, False)
+            monitor.bluez.set_connected(PAD, True)
+        await asyncio.sleep(DISCONNECT_DEBOUNCE + 0.3)
+        status = await monitor.status()
+        assert status["moonlight"]["pid"] == pid
+        assert status["pending_shutdowns"] == {}
+        assert list(status["connected"]) == [PAD]
+        assert monitor.metrics.launch_latency.count == 1
+
+    run_monitor(scenario, [(PAD, False)])
+
+
+def test_resync_after_bluez_restart(run_monitor):
+    async def scenario(monitor):
+        bluez = monitor.bluez
+        bluez.set_connected(PAD, True)
+        await monitor.wait_for(running)
+
+        # Transitions missed while bluetoothd was away
+        await bluez.stop()
+        await monitor.wait_for(lambda status: status["recovering"])
+        bluez.device(PAD)._connected = False
+        bluez.device(OTHER_PAD)._connected = True
+        await bluez.start()
+
+        status = await monitor.wait_for(lambda status: not status["recovering"] and OTHER_PAD in status["connected"])
+        assert list(status["connected"]) == [OTHER_PAD]
+        assert PAD in status["pending_shutdowns"]
+        assert status["moonlight"]["holders"] == [PAD, OTHER_PAD]
+        assert monitor.metrics.recovery.count == 1
+
+    run_monitor(scenario, [(PAD, False), (OTHER_PAD, False)])
+
+
+def test_resync_without_changes_emits_nothing(run_monitor):
+    async def scenario(monitor):
+        bluez = monitor.bluez
+        bluez.set_connected(PAD, True)
+        pid = (await monitor.wait_for(running))["moonlight"]["pid"]
+        await bluez.stop()
+        await monitor.wait_for(lambda status: status["recovering"])
+        await bluez.start()
+        status = await monitor.wait_for(lambda status: not status["recovering"])
+        assert status["connected"] == {PAD: ["hci0"]}
+        assert status["pending_shutdowns"] == {}
+        assert status["moonlight"]["pid"] == pid
+
+    run_monitor(scenario, [(PAD, False)])
+
+
+def test_cancelled_monitor_leaves_the_shared_bus_alone(run_monitor, caplog):
+    async def scenario(monitor):
+        bus = dbus_backend._buses[monitor.address][0]
+        await monitor.cancel()
+        assert bus.connected
+        caplog.clear()
+        # BlueZ restarting on the bus the monitor used must not wake it up
+        await monitor.bluez.stop()
+        monitor.bluez.device(PAD)._connected = True
+        await monitor.bluez.start()
+        await asyncio.sleep(0.3)
+        assert "BlueZ" not in caplog.text
+        assert not any(task.get_coro().__name__ == "recover" for task in asyncio.all_tasks())
+        # The bus's own disconnect future was not cancelled with the monitor
+        bus.disconnect()
+        await asyncio.wait_for(bus.wait_for_disconnect(), 5)
+
+    run_monitor(scenario, [(PAD, False)])
+
+
+def test_control_commands_update_the_config(run_monitor):
+    async def scenario(monitor):
+        path = control.socket_path()
+        results = await asyncio.gather(
+            asyncio.to_thread(control.request, "set_timeout", path=path, seconds=42),
+            asyncio.to_thread(control.request, "forget_device", path=path, address=OTHER_PAD),
+        )
+        assert results == [42, OTHER_PAD]
+        # Both edits made it to the file, neither overwrote the other
+        saved = json.loads(config.CONFIG_FILE.read_text())
+        assert saved["timeout"] == 42
+        assert list(saved["allowed_devices"]) == [PAD]
+
+    run_monitor(scenario, [(PAD, False), (OTHER_PAD, False)])
+
+
+def test_rssi_prewarms_moonlight(run_monitor):
+    async def scenario(monitor):
+        monitor.bluez.adapters["hci0"].set_discovering(True)
+        monitor.bluez.set_rssi(PAD, -70)
+        status = await monitor.wait_for(lambda status: status["moonlight"]["prewarmed_for"] == PAD)
+        pid = status["moonlight"]["pid"]
+        assert status["connected"] == {}
+
+        # The connection takes over the prewarmed client instead of starting another
+        monitor.bluez.set_connected(PAD, True)
+        status = await monitor.wait_for(lambda status: status["moonlight"]["holders"] == [PAD])
+        assert status["moonlight"]["pid"] == pid
+        assert status["moonlight"]["prewarmed_for"] is None
+        assert monitor.metrics.prewarm_saved.count == 1
+        assert monitor.metrics.launch_latency.count == 0
+
+    run_monitor(scenario, [(PAD, False)], prewarm=True, prewarm_window=5)
+
+
+def test_unused_prewarm_is_stopped(run_monitor):
+    async def scenario(monitor):
+        monitor.bluez.set_rssi(PAD, -70)
+        await monitor.wait_for(running)
+        status = await monitor.wait_for(lambda status: not running(status))
+        assert status["moonlight"]["prewarmed_for"] is None
+        assert monitor.metrics.prewarm_wasted.count == 1
+        # The controller is on cooldown now
+        monitor.bluez.set_rssi(PAD, -60)
+        await asyncio.sleep(0.2)
+        assert not running(await monitor.status())
+
+    run_monitor(scenario, [(PAD, False)], prewarm=True, prewarm_window=0.3)
+
+
+def test_rssi_does_nothing_without_prewarm(run_monitor):
+    async def scenario(monitor):
+        monitor.bluez.set_rssi(PAD, -70)
+        monitor.bluez.set_rssi(PAD, -65)
+        await asyncio.sleep(0.2)
+        assert not running(await monitor.status())
+
+    run_monitor(scenario, [(PAD, False)])
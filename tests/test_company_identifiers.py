@@ -0,0 +1,50 @@
+# tests/test_company_identifiers.py
+
+import json
+from importlib import resources
+
+from bluelight.company_identifiers import (CompanyIndex, INDEX_FILENAME, SOURCE_FILENAME, UNKNOWN_MANUFACTURER, build_index,
+                                          lookup, manufacturer_name)
+
+
+def test_build_and_search(tmp_path):
+    source = tmp_path / "ids.json"
+    source.write_text(json.dumps({"76": "Apple, Inc.", "6": "Microsoft", "1118": "Nuviz, Inc.", "89": "Nordic Semiconductor ÅSA"}))
+    destination = tmp_path / "ids.bin"
+    assert build_index(source, destination) == 4
+
+    index = CompanyIndex.open(destination)
+    assert len(index) == 4
+    assert index.get(6) == "Microsoft"
+    assert index.get(76) == "Apple, Inc."
+    assert index.get(89) == "Nordic Semiconductor ÅSA"
+    assert index.get(1118) == "Nuviz, Inc."
+    for missing in (0, 7, 1119, 65535):
+        assert index.get(missing) is None
+    assert index.get(7, "nobody") == "nobody"
+
+
+def test_empty_index(tmp_path):
+    source = tmp_path / "ids.json"
+    source.write_text("{}")
+    build_index(source, tmp_path / "ids.bin")
+    assert CompanyIndex.open(tmp_path / "ids.bin").get(6) is None
+
+
+def test_bundled_index_matches_the_json(tmp_path):
+    bundled = resources.files("bluelight")
+    with resources.as_file(bundled / SOURCE_FILENAME) as source:
+        build_index(source, tmp_path / INDEX_FILENAME)
+    # A stale index means the JSON was edited without rebuilding it
+    assert (tmp_path / INDEX_FILENAME).read_bytes() == (bundled / INDEX_FILENAME).read_bytes()
+    # And lookup() reads the bundled index
+    identifiers = json.loads((bundled / SOURCE_FILENAME).read_text())
+    company_id = next(iter(identifiers))
+    assert lookup(int(company_id)) == identifiers[company_id]
+
+
+def test_manufacturer_name():
+    assert manufacturer_name({6: b""}) == "Microsoft"
+    assert manufacturer_name({65535: b"", 76: b""}) == "Apple, Inc."
+    assert manufacturer_name({}) == UNKNOWN_MANUFACTURER
+    assert manufacturer_name(None, default="?") == "?"
@@ -0,0 +1,133 @@
+# tests/test_config.py
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from bluelight import config
+from bluelight.config import ConfigStore, DEFAULT_CONFIG, add_allowed_devices, load_config
+
+
+def test_missing_file_gives_defaults(tmp_path):
+    store = ConfigStore(tmp_path / "config.json")
+    assert store.get() == DEFAULT_CONFIG
+    # Callers may modify load() without touching the defaults
+    store.load()["allowed_devices"]["AA:00:00:00:00:01"] = {}
+    assert DEFAULT_CONFIG["allowed_devices"] == {}
+
+
+def test_save_and_reload(tmp_path):
+    path = tmp_path / "config.json"
+    store = ConfigStore(path)
+    store.save({"allowed_devices": {}, "timeout": 42})
+    assert json.loads(path.read_text())["timeout"] == 42
+    assert ConfigStore(path).get()["timeout"] == 42
+    # No temporary files are left behind
+    assert os.listdir(tmp_path) == ["config.json"]
+
+
+def test_save_keeps_the_mode(tmp_path):
+    path = tmp_path / "config.json"
+    store = ConfigStore(path)
+    store.save({"allowed_devices": {}, "timeout": 1})
+    assert path.stat().st_mode & 0o777 == 0o644
+    path.chmod(0o640)
+    store.save({"allowed_devices": {}, "timeout": 2})
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="only root can give a file away")
+def test_save_keeps_the_owner(tmp_path):
+    path = tmp_path / "config.json"
+    store = ConfigStore(path)
+    store.save({"allowed_devices": {}, "timeout": 1})
+    os.chown(path, 65534, 65534)
+    store.save({"allowed_devices": {}, "timeout": 2})
+    assert (path.stat().st_uid, path.stat().st_gid) == (65534, 65534)
+
+
+def test_get_is_cached_until_the_file_changes(tmp_path):
+    path = tmp_path / "config.json"
+    store = ConfigStore(path)
+    store.save({"allowed_devices": {}, "timeout": 1})
+    first = store.get()
+    assert store.get() is first
+
+    ConfigStore(path).save({"allowed_devices": {}, "timeout": 2})
+    second = store.get()
+    assert second is not first
+    assert second["timeout"] == 2
+
+
+def test_load_returns_a_copy(tmp_path):
+    store = ConfigStore(tmp_path / "config.json")
+    store.save({"allowed_devices": {}, "timeout": 1})
+    copy = store.load()
+    copy["timeout"] = 99
+    assert store.get()["timeout"] == 1
+
+
+def test_watcher_sees_external_edits(tmp_path):
+    async def main():
+        path = tmp_path / "config.json"
+        store = ConfigStore(path)
+        store.save({"allowed_devices": {}, "timeout": 1})
+        changes = []
+        watcher = store.watch(changes.append)
+        try:
+            # Another process replacing the file
+            ConfigStore(path).save({"allowed_devices": {}, "timeout": 5})
+            for _ in range(100):
+                if changes:
+                    break
+                await asyncio.sleep(0.02)
+            assert [change["timeout"] for change in changes] == [5]
+
+            # Unrelated files in the directory are ignored
+            (tmp_path / "other.json").write_text("{}")
+            await asyncio.sleep(0.1)
+            assert len(changes) == 1
+        finally:
+            watcher.close()
+
+    asyncio.run(main())
+
+
+def test_watcher_skips_unreadable_files(tmp_path):
+    async def main():
+        path = tmp_path / "config.json"
+        store = ConfigStore(path)
+        store.save({"allowed_devices": {}, "timeout": 1})
+        changes = []
+        watcher = store.watch(changes.append)
+        try:
+            path.write_text("{not json")
+            await asyncio.sleep(0.1)
+            assert changes == []
+        finally:
+            watcher.close()
+
+    asyncio.run(main())
+
+
+def test_add_allowed_devices_writes_once(home, monkeypatch):
+    add_allowed_devices({"AA:00:00:00:00:01": {"name": "Pad", "manufacturer": "Acme", "nickname": "a"}})
+    saves = []
+    monkeypatch.setattr(config, "save_config", lambda settings: saves.append(settings))
+    added = add_allowed_devices({
+        "AA:00:00:00:00:01": {"name": "Pad", "manufacturer": "Acme", "nickname": "changed"},
+        "AA:00:00:00:00:02": {"name": "Pad 2", "manufacturer": "Acme", "nickname": "b"},
+    })
+    assert added == ["AA:00:00:00:00:02"]
+    assert len(saves) == 1
+    assert saves[0]["allowed_devices"]["AA:00:00:00:00:01"]["nickname"] == "a"
+
+
+def test_add_allowed_devices_skips_the_write_when_nothing_is_new(home):
+    add_allowed_devices({"AA:00:00:00:00:01": {"name": "Pad", "manufacturer": "Acme", "nickname": "a"}})
+    stamp = os.stat(config.CONFIG_FILE).st_mtime_ns
+    assert add_allowed_devices({"AA:00:00:00:00:01": {"name": "Pad", "manufacturer": "Acme", "nickname": "a"}}) == []
+    assert os.stat(config.CONFIG_FILE).st_mtime_ns == stamp
+    assert list(load_config()["allowed_devices"]) == ["AA:00:00:00:00:01"]
@@ -0,0 +1,59 @@
+# tests/test_controllers.py
+
+import pytest
+
+from bluelight.controllers import (
+    HID_OVER_GATT_UUID, HID_PROFILE_UUID, classify, classify_properties, parse_modalias,
+)
+
+
+def test_parse_modalias():
+    assert parse_modalias("usb:v045Ep0B13d0509") == (0x045E, 0x0B13)
+    assert parse_modalias("bluetooth:v054Cp05C4d0100") == (0x054C, 0x05C4)
+    assert parse_modalias("nonsense") is None
+    assert parse_modalias(None) is None
+
+
+@pytest.mark.parametrize("properties, expected", [
+    ({"appearance": 0x03C4}, "gamepad appearance"),
+    ({"appearance": 0x03C3}, "gamepad appearance"),
+    ({"device_class": 0x002508}, "gamepad device class"),
+    ({"icon": "input-gaming"}, "gaming icon"),
+    ({"uuids": [HID_OVER_GATT_UUID], "name": "8BitDo SN30 Pro"}, "HID service"),
+    ({"uuids": [HID_PROFILE_UUID.upper()]}, "HID service"),
+    ({"uuids": [HID_OVER_GATT_UUID], "appearance": 0x03C0}, "HID service"),
+    ({"name": "Xbox Wireless Controller"}, "name"),
+])
+def test_controllers(properties, expected):
+    assert classify(**properties) == expected
+
+
+@pytest.mark.parametrize("properties", [
+    {},
+    {"name": "Headphones"},
+    # HID keyboards and mice
+    {"uuids": [HID_OVER_GATT_UUID], "appearance": 0x03C1, "name": "Keyboard K380"},
+    {"uuids": [HID_OVER_GATT_UUID], "appearance": 0x03C2},
+    {"uuids": [HID_PROFILE_UUID], "device_class": 0x002540},
+    {"uuids": [HID_PROFILE_UUID], "device_class": 0x002580},
+    # A phone offering HID
+    {"uuids": [HID_PROFILE_UUID], "device_class": 0x5A020C},
+    {"uuids": [HID_OVER_GATT_UUID], "appearance": 0x0040},
+])
+def test_non_controllers(properties):
+    assert classify(**properties) is None
+
+
+def test_known_controller_wins():
+    reason = classify(modalias="usb:v045Ep0B13d0509", appearance=0x03C1)
+    assert reason is not None and reason.startswith("known controller")
+
+
+class Variant:
+    def __init__(self, value):
+        self.value = value
+
+
+def test_classify_properties_unwraps_variants():
+    props = {"UUIDs": Variant([HID_OVER_GATT_UUID]), "Alias": Variant("Pad"), "Appearance": Variant(0x03C4)}
+    assert classify_properties(props) == "gamepad appearance"
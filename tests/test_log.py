@@ -0,0 +1,50 @@
+# tests/test_log.py
+
+import logging
+
+from bluelight import log
+from bluelight.log import RateLimitFilter
+
+
+def record(message="RSSI changed", level=logging.DEBUG, lineno=10, mac="AA:00:00:00:00:01"):
+    entry = logging.LogRecord("bluelight", level, "monitor.py", lineno, message, None, None)
+    entry.mac = mac
+    return entry
+
+
+def test_burst_then_drop():
+    limit = RateLimitFilter(burst=3, interval=60)
+    assert [limit.filter(record()) for _ in range(5)] == [True, True, True, False, False]
+
+
+def test_limits_are_per_device_and_call_site():
+    limit = RateLimitFilter(burst=1, interval=60)
+    assert limit.filter(record())
+    assert not limit.filter(record())
+    assert limit.filter(record(mac="AA:00:00:00:00:02"))
+    assert limit.filter(record(lineno=11))
+
+
+def test_warnings_always_pass():
+    limit = RateLimitFilter(burst=1, interval=60)
+    assert all(limit.filter(record(level=logging.WARNING)) for _ in range(5))
+
+
+def test_suppressed_count_is_reported(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(log.time, "monotonic", lambda: now[0])
+    limit = RateLimitFilter(burst=1, interval=10)
+    limit.filter(record())
+    for _ in range(4):
+        assert not limit.filter(record())
+    now[0] += 10
+    entry = record()
+    assert limit.filter(entry)
+    assert entry.getMessage() == "RSSI changed (4 similar messages suppressed)"
+
+
+def test_key_table_is_bounded():
+    limit = RateLimitFilter(burst=1, interval=60, max_keys=8)
+    for n in range(20):
+        limit.filter(record(mac=f"AA:00:00:00:00:{n:02X}"))
+    assert len(limit._windows) <= 8
@@ -0,0 +1,69 @@
+# tests/test_metrics.py
+
+import math
+import stat
+
+from bluelight.metrics import Histogram, MonitorMetrics, parse_histograms
+
+
+def test_observe_and_quantile():
+    histogram = Histogram("test_seconds", "Test.", buckets=(0.1, 1.0))
+    assert math.isnan(histogram.quantile(0.5))
+    for seconds in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(seconds)
+    assert list(histogram.counts) == [2, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == float("inf")
+
+
+def test_render_parses_back():
+    metrics = MonitorMetrics()
+    for seconds in (0.0004, 0.003, 0.003, 0.2, 20.0):
+        metrics.launch_latency.observe(seconds)
+    metrics.recovery.observe(1.5)
+
+    parsed = parse_histograms(metrics.render())
+    assert set(parsed) == {histogram.name for histogram in metrics.histograms}
+    launch = parsed["bluelight_launch_latency_seconds"]
+    assert launch["count"] == 5
+    assert math.isclose(launch["sum"], metrics.launch_latency.sum)
+    assert launch["bounds"] == list(metrics.launch_latency.bounds)
+    # +Inf is left out of the per-bucket counts
+    assert launch["counts"] == list(metrics.launch_latency.counts[:-1])
+    assert launch["help"] == metrics.launch_latency.help_text
+    assert parsed["bluelight_recovery_seconds"]["count"] == 1
+
+
+def test_parse_ignores_other_lines():
+    text = "# TYPE x histogram\nsome_gauge 3\n\nx_count 2\nx_sum 0.5\n"
+    assert parse_histograms(text) == {"x": {"help": "", "sum": 0.5, "count": 2, "bounds": [], "counts": []}}
+
+
+def test_export_writes_atomically(tmp_path):
+    path = tmp_path / "metrics.prom"
+    metrics = MonitorMetrics()
+    metrics.ready.observe(0.2)
+    metrics.export(path)
+    assert parse_histograms(path.read_text())["bluelight_ready_seconds"]["count"] == 1
+    assert [entry.name for entry in tmp_path.iterdir()] == ["metrics.prom"]
+
+
+def test_export_is_world_readable(tmp_path):
+    path = tmp_path / "metrics.prom"
+    MonitorMetrics().export(path)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+
+def test_export_skips_unchanged_metrics(tmp_path):
+    path = tmp_path / "metrics.prom"
+    metrics = MonitorMetrics()
+    metrics.export(path)
+    path.unlink()
+    metrics.export(path)
+    assert not path.exists()
+    metrics.launch_latency.observe(0.1)
+    assert metrics.dirty
+    metrics.export(path)
+    assert parse_histograms(path.read_text())["bluelight_launch_latency_seconds"]["count"] == 1
+    assert not metrics.dirty
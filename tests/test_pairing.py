@@ -0,0 +1,70 @@
+# tests/test_pairing.py
+
+from types import SimpleNamespace
+
+import pytest
+
+from bluelight.controllers import HID_OVER_GATT_UUID
+from bluelight.pairing import PairingScan, parse_selection
+
+
+@pytest.mark.parametrize("text, count, expected", [
+    ("1", 3, [0]),
+    ("1 3", 3, [0, 2]),
+    ("3,1", 3, [2, 0]),
+    ("1,2-4", 5, [0, 1, 2, 3]),
+    ("2, 2-3 3", 3, [1, 2]),
+    ("all", 3, [0, 1, 2]),
+    (" ALL ", 2, [0, 1]),
+])
+def test_parse_selection(text, count, expected):
+    assert parse_selection(text, count) == expected
+
+
+@pytest.mark.parametrize("text", ["0", "4", "2-1", "1-9", "x", "1,,b", "", " , "])
+def test_parse_selection_rejects(text):
+    with pytest.raises(ValueError):
+        parse_selection(text, 3)
+
+
+def advert(address, name, rssi, uuids=()):
+    device = SimpleNamespace(address=address, name=name)
+    data = SimpleNamespace(rssi=rssi, local_name=None, manufacturer_data={}, service_uuids=list(uuids), platform_data=None)
+    return device, data
+
+
+def test_scan_rows_by_signal_strength():
+    scan = PairingScan()
+    scan.detection_callback(*advert("AA:00:00:00:00:01", "Far", -80))
+    scan.detection_callback(*advert("AA:00:00:00:00:02", "Near", -40))
+    scan.detection_callback(*advert("AA:00:00:00:00:01", "Far", -30))
+    assert [entry["name"] for entry in scan.rows()] == ["Far", "Near"]
+
+
+def test_scan_hides_non_controllers():
+    scan = PairingScan(controllers_only=True)
+    scan.detection_callback(*advert("AA:00:00:00:00:01", "Headphones", -40))
+    scan.detection_callback(*advert("AA:00:00:00:00:02", "8BitDo SN30 Pro", -50, [HID_OVER_GATT_UUID]))
+    assert [entry["address"] for entry in scan.rows()] == ["AA:00:00:00:00:02"]
+
+
+def test_auto_select_stops_at_first_controller():
+    scan = PairingScan(auto_select=True)
+    scan.detection_callback(*advert("AA:00:00:00:00:01", "Headphones", -40))
+    assert not scan.stopped.is_set()
+    scan.detection_callback(*advert("AA:00:00:00:00:02", "Wireless Controller", -50))
+    assert scan.stopped.is_set()
+    assert scan.selected["address"] == "AA:00:00:00:00:02"
+
+
+def test_frozen_scan_keeps_its_numbering():
+    scan = PairingScan()
+    scan.detection_callback(*advert("AA:00:00:00:00:01", "One", -50))
+    scan.detection_callback(*advert("AA:00:00:00:00:02", "Two", -60))
+    rows = scan.freeze()
+    # Adverts delivered while discovery stops
+    scan.detection_callback(*advert("AA:00:00:00:00:02", "Two", -10))
+    scan.detection_callback(*advert("AA:00:00:00:00:03", "Three", -5))
+    assert scan.rows() is rows
+    assert [entry["address"] for entry in scan.rows()] == ["AA:00:00:00:00:01", "AA:00:00:00:00:02"]
+    assert rows[1]["rssi"] == -60
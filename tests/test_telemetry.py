@@ -0,0 +1,111 @@
+# tests/test_telemetry.py
+
+import pytest
+
+from bluelight.telemetry import RingBuffer, Telemetry, TieredSeries, HEADER, save_snapshot
+
+
+def test_ring_overwrites_oldest():
+    ring = RingBuffer(3)
+    assert ring.last() is None
+    for n in range(5):
+        ring.append(n, n * 10)
+    assert len(ring) == 3
+    assert ring.items() == [(2, 20), (3, 30), (4, 40)]
+    assert ring.last() == (4, 40)
+
+
+def test_ring_round_trip():
+    ring = RingBuffer(4)
+    for n in range(6):
+        ring.append(n, -n)
+    copy = RingBuffer(4)
+    assert copy.load(ring.dump(), 0) == len(ring.dump())
+    assert copy.items() == ring.items()
+
+
+def test_ring_with_another_capacity_is_skipped():
+    ring = RingBuffer(4)
+    ring.append(1, 1)
+    other = RingBuffer(8)
+    assert other.load(ring.dump(), 0) == len(ring.dump())
+    assert len(other) == 0
+
+
+def test_tiers_average_per_bucket():
+    series = TieredSeries(tiers=((0, 8), (60, 4)))
+    for timestamp, value in ((0, 10), (30, 20), (60, 40), (90, 50), (130, 70)):
+        series.append(timestamp, value)
+    assert series.items(0)[-1] == (130, 70)
+    # Two complete minutes, then the partial one being filled
+    assert series.items(1) == [(0, 15), (60, 45), (120, 70)]
+
+
+def test_telemetry_save_and_load(tmp_path):
+    path = tmp_path / "telemetry.bin"
+    telemetry = Telemetry()
+    telemetry.record_battery("AA:00:00:00:00:01", 80, timestamp=1000)
+    telemetry.record_rssi("AA:00:00:00:00:01", -55, timestamp=1001)
+    telemetry.record_event("AA:00:00:00:00:01", True, timestamp=1002)
+    telemetry.record_battery("AA:00:00:00:00:02", 20, timestamp=1003)
+    telemetry.save(path)
+    assert not telemetry.dirty
+
+    loaded = Telemetry.load(path)
+    assert set(loaded.devices) == {"AA:00:00:00:00:01", "AA:00:00:00:00:02"}
+    summary = loaded.device("AA:00:00:00:00:01").summary()
+    assert summary == {"battery": 80, "battery_time": 1000, "rssi": -55,
+                       "last_event": "connected", "last_event_time": 1002}
+    assert loaded.device("AA:00:00:00:00:01").history() == telemetry.device("AA:00:00:00:00:01").history()
+
+
+def test_save_is_skipped_when_nothing_changed(tmp_path):
+    path = tmp_path / "telemetry.bin"
+    Telemetry().save(path)
+    assert not path.exists()
+
+
+def test_snapshot_marks_the_history_saved(tmp_path):
+    path = tmp_path / "telemetry.bin"
+    telemetry = Telemetry()
+    assert telemetry.snapshot() is None
+    telemetry.record_battery("AA:00:00:00:00:01", 80, timestamp=1000)
+    data = telemetry.snapshot()
+    assert not telemetry.dirty
+    assert telemetry.snapshot() is None
+    # Recording goes on while the snapshot is written
+    telemetry.record_battery("AA:00:00:00:00:01", 70, timestamp=1001)
+    save_snapshot(data, path)
+    assert Telemetry.load(path).device("AA:00:00:00:00:01").summary()["battery"] == 80
+    assert telemetry.dirty
+
+
+def test_size_does_not_grow_with_samples():
+    telemetry = Telemetry()
+    telemetry.record_battery("AA:00:00:00:00:01", 50, timestamp=0)
+    size = len(telemetry.dump())
+    for n in range(5000):
+        telemetry.record_battery("AA:00:00:00:00:01", n % 100, timestamp=n * 30)
+        telemetry.record_rssi("AA:00:00:00:00:01", -(n % 90), timestamp=n * 30)
+    assert len(telemetry.dump()) == size
+
+
+def test_missing_file_is_empty(tmp_path):
+    assert Telemetry.load(tmp_path / "missing.bin").devices == {}
+
+
+def test_foreign_file_is_rejected(tmp_path):
+    path = tmp_path / "telemetry.bin"
+    path.write_bytes(HEADER.pack(b"NOPE", 1, 0))
+    with pytest.raises(ValueError):
+        Telemetry.load(path)
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    path = tmp_path / "telemetry.bin"
+    telemetry = Telemetry()
+    telemetry.record_battery("AA:00:00:00:00:01", 80)
+    telemetry.save(path)
+    path.write_bytes(path.read_bytes()[:200])
+    with pytest.raises(ValueError):
+        Telemetry.load(path)